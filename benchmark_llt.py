@@ -0,0 +1,203 @@
+## @package benchmark_llt.py
+# @brief Benchmark des Luftlinientools mit synthetischen Bezirksdaten (ohne Visum).
+# Misst Laufzeit und Speicherbedarf je Berechnungsschritt von calculate_vfs (Triangulation, Nachbarschaftsgrad,
+# Versorgungszentren, Maskierung) und je Export. Die Ergebnisse werden als JSON gespeichert und können zwischen
+# Programmversionen verglichen werden.
+#
+# Aufruf z.B.:
+#   python benchmark_llt.py --sizes 1000 10000 100000 --distributions uniform hierarchical --output bench.json
+#   python benchmark_llt.py --compare bench_alt.json bench.json
+
+import argparse
+import json
+import logging
+import platform
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import luftlinientool as llt
+
+## Verfügbare Verteilungen der synthetischen Bezirke
+DISTRIBUTIONS = ("uniform", "clustered", "hierarchical")
+
+
+# ====== Synthetische Bezirksdaten =====
+
+## Erzeugt synthetische Bezirksdaten für das Luftlinientool.
+# - uniform: Koordinaten gleichverteilt, Zentralität zufällig (je Stufe um den Faktor ratio häufiger)
+# - clustered: Koordinaten normalverteilt um zufällige Siedlungsschwerpunkte (ca. 500 Bezirke je Schwerpunkt),
+#   Zentralität wie uniform
+# - hierarchical: zentralörtliches System, die Bezirke einer Stufe liegen um die Zentren der höheren Stufen, der
+#   Streuradius nimmt je Stufe ab
+# @param n_zones: Anzahl Bezirke
+# @param distribution: Verteilung (siehe DISTRIBUTIONS)
+# @param n_levels: Anzahl Zentralitätsstufen (TypeNo 0 ... n_levels - 1)
+# @param ratio: Verhältnis der Anzahl Bezirke zweier aufeinanderfolgender Stufen
+# @param extent: Kantenlänge des Untersuchungsgebiets (Koordinateneinheit)
+# @param share_source_target: Anteil der Bezirke, die als Quelle bzw. Ziel berücksichtigt werden
+# @param seed: Startwert des Zufallsgenerators
+# @return: DataFrame mit den Spalten No, Name, XCoord, YCoord, TypeNo, Quelle, Ziel
+def generate_zones(n_zones, distribution="uniform", n_levels=6, ratio=3.0, extent=100000.0,
+                   share_source_target=0.9, seed=0):
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Verteilung {distribution} nicht implementiert")
+
+    rng = np.random.default_rng(seed)
+
+    # Anzahl Bezirke je Stufe, mindestens ein Bezirk je Stufe
+    weights = ratio ** np.arange(n_levels)
+    counts = np.maximum(1, np.floor(weights / weights.sum() * n_zones).astype(int))
+    counts[-1] = max(1, n_zones - counts[:-1].sum())
+    levels = np.repeat(np.arange(n_levels), counts)[:n_zones]
+
+    if distribution == "uniform":
+        coords = rng.uniform(0, extent, (n_zones, 2))
+        levels = rng.permutation(levels)
+    elif distribution == "clustered":
+        n_clusters = max(1, n_zones // 500)
+        centers = rng.uniform(0, extent, (n_clusters, 2))
+        sigma = extent / np.sqrt(n_clusters) / 4
+        coords = centers[rng.integers(n_clusters, size=n_zones)] + rng.normal(0, sigma, (n_zones, 2))
+        levels = rng.permutation(levels)
+    else:
+        coords = np.empty((n_zones, 2))
+        coords[:counts[0]] = rng.uniform(0, extent, (counts[0], 2))
+        n_placed = counts[0]
+        for count in counts[1:]:
+            # Streuradius abhängig von der Anzahl der bisherigen Zentren
+            sigma = extent / np.sqrt(n_placed) / 3
+            parents = rng.integers(n_placed, size=count)
+            coords[n_placed:n_placed + count] = coords[parents] + rng.normal(0, sigma, (count, 2))
+            n_placed += count
+
+    df_zones = pd.DataFrame({"No": np.arange(1, n_zones + 1),
+                             "Name": [f"Bezirk {i}" for i in range(1, n_zones + 1)],
+                             "XCoord": coords[:, 0],
+                             "YCoord": coords[:, 1],
+                             "TypeNo": levels})
+    df_zones["Quelle"] = (rng.random(n_zones) < share_source_target).astype(int)
+    df_zones["Ziel"] = (rng.random(n_zones) < share_source_target).astype(int)
+
+    # identische Koordinaten sind für die Triangulation nicht zulässig
+    return df_zones.drop_duplicates(subset=["XCoord", "YCoord"]).reset_index(drop=True)
+
+
+# ====== Messung =====
+
+## Berechnet alle VFS und führt die Exporte (Streckenliste, Netzdaten, Matrixdateien, Netzdatei) in ein temporäres
+# Verzeichnis aus. Die Kennwerte je Schritt erfasst der MetricsCollector der Instanz.
+# @param calculator: LuftlinienCalculator mit MetricsCollector
+# @param matrix_format: Dateiformat der Matrizen (siehe export_matrix). Voll besetzte Matrizen ("dense") sind nur für
+# kleine Netze sinnvoll
+def benchmark_calculator(calculator, matrix_format="sparse"):
+    calculator.calculate_main()
+
+    with tempfile.TemporaryDirectory() as path_tmp:
+        calculator.path_output = Path(path_tmp)
+        calculator.adj_matrix_to_links()
+        calculator.extract_net()
+        calculator.export_matrix(file_format=matrix_format)
+        calculator.export_net()
+
+
+## Führt den Benchmark für alle Kombinationen aus Anzahl Bezirke und Verteilung aus.
+# @param list_sizes: Liste der Anzahl Bezirke
+# @param list_distributions: Liste der Verteilungen
+# @param max_entfernung: Nachbarschaftsgrad (alle VFS)
+# @param anz_versorger: Anzahl Versorgungszentren (alle VFS)
+# @param trace_memory: Speichermessung über tracemalloc
+# @param seed: Startwert des Zufallsgenerators
+# @param graph: Nachbarschaftsgraph (siehe llt.GRAPHS)
+# @param tile_size: Anzahl Bezirke je Kachel der gekachelten Triangulation, None: ohne Kacheln
+# @return: Dict mit den Metadaten (meta) und den Messwerten (results)
+def run_benchmark(list_sizes, list_distributions, max_entfernung=1, anz_versorger=1, trace_memory=True, seed=0,
+                  graph="delaunay", tile_size=None):
+    import scipy
+
+    list_records = []
+    for distribution in list_distributions:
+        for n_zones in list_sizes:
+            df_zones = generate_zones(n_zones, distribution, seed=seed)
+            info = {"distribution": distribution, "n_zones": len(df_zones),
+                    "max_entfernung": max_entfernung, "anz_versorger": anz_versorger, "graph": graph,
+                    "tile_size": tile_size}
+
+            calculator = llt.LuftlinienCalculator(df_zones, max_entfernung=max_entfernung, anz_versorger=anz_versorger,
+                                                  attr_quelle="Quelle", attr_ziel="Ziel", graph=graph,
+                                                  tile_size=tile_size)
+            calculator.metrics = llt.MetricsCollector(trace_memory=trace_memory)
+            benchmark_calculator(calculator)
+            list_records.extend({**info, **record} for record in calculator.metrics.records)
+
+    meta = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scipy": scipy.__version__,
+            "trace_memory": trace_memory,
+            "seed": seed}
+
+    return {"meta": meta, "results": list_records}
+
+
+## Vergleicht zwei Benchmarkergebnisse (JSON) je Verteilung, Anzahl Bezirke, Schritt und VFS.
+# @param path_old: Datei mit den Ergebnissen der Vergleichsversion
+# @param path_new: Datei mit den Ergebnissen der aktuellen Version
+# @return: DataFrame mit Laufzeit und Speicher beider Versionen sowie dem Verhältnis neu / alt
+def compare_results(path_old, path_new):
+    keys = ["distribution", "n_zones", "stage", "vfs"]
+    list_df = []
+    for path in (path_old, path_new):
+        with open(path, encoding="utf-8") as f:
+            df = pd.DataFrame(json.load(f)["results"])
+        df["vfs"] = df["vfs"].fillna("")
+        list_df.append(df[keys + ["seconds", "peak_bytes"]])
+
+    df_compare = list_df[0].merge(list_df[1], on=keys, how="outer", suffixes=("_old", "_new"))
+    df_compare["ratio_seconds"] = df_compare["seconds_new"] / df_compare["seconds_old"]
+    df_compare["ratio_peak_bytes"] = df_compare["peak_bytes_new"] / df_compare["peak_bytes_old"]
+
+    return df_compare
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Luftlinientool mit synthetischen Bezirksdaten")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Anzahl Bezirke (z.B. 1000 ... 1000000)")
+    parser.add_argument("--distributions", nargs="+", default=list(DISTRIBUTIONS), choices=DISTRIBUTIONS)
+    parser.add_argument("--max-entfernung", type=int, default=1)
+    parser.add_argument("--anz-versorger", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="ohne Speichermessung (tracemalloc)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", default="delaunay", choices=[g for g in llt.GRAPHS if g != "max_length"],
+                        help="Nachbarschaftsgraph")
+    parser.add_argument("--tile-size", type=int, default=None,
+                        help="Anzahl Bezirke je Kachel der gekachelten Triangulation")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_llt.json"))
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("ALT", "NEU"),
+                        help="Vergleich zweier Ergebnisdateien statt Benchmark")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    if args.compare is not None:
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(compare_results(*args.compare))
+    else:
+        # Meldungen des Luftlinientools nur bei Warnungen
+        logging.getLogger().setLevel(logging.WARNING)
+        results = run_benchmark(args.sizes, args.distributions, args.max_entfernung, args.anz_versorger,
+                                trace_memory=not args.no_memory, seed=args.seed, graph=args.graph,
+                                tile_size=args.tile_size)
+        with open(args.output, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+        df_results = pd.DataFrame(results["results"])
+        columns = ["seconds", "peak_bytes", "bytes_written"]
+        df_results[columns] = df_results[columns].astype(float)
+        print(df_results.groupby(["distribution", "n_zones", "stage"], sort=False)[columns].sum())
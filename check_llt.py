@@ -0,0 +1,324 @@
+## @package check_llt.py
+# @brief Prüfung des Luftlinientools mit synthetischen Bezirksdaten (ohne Visum).
+# Vergleicht die dünnbesetzten und gekachelten Berechnungen mit einfachen Referenzberechnungen:
+# - Nachbarschaftsgrad: begrenzte Breitensuche gegen dichte Matrixpotenz
+# - Versorgungszentren: KD-Baum gegen die Suche über alle Versorgungszentren je Bezirk (get_nearest_points_from_set)
+#   sowie ein Versorgungszentrum an Position 0 der Bezirkstabelle
+# - verschachtelte (auch inkrementelle) Triangulation gegen die Triangulation je Stufe
+# - gekachelte gegen ungekachelte Triangulation, auch für regelmäßige Raster und Punkte auf einem Kreis
+# - Matrixexport ($O, $O gzip, npz) gegen die Adjazenz- bzw. Distanzmatrix nach dem Wiedereinlesen
+# Das Skript endet mit Rückgabewert 1, falls eine Prüfung fehlschlägt.
+#
+# Aufruf z.B.:
+#   python check_llt.py
+#   python check_llt.py --n-zones 3000 --seed 1
+
+import argparse
+import gzip
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import luftlinientool as llt
+from benchmark_llt import generate_zones
+
+
+# ====== Referenzberechnungen =====
+
+## Sortiert eine Kantenliste (erste Spalte < zweite Spalte, aufsteigend, ohne Duplikate).
+# @param edges: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante
+# @return: sortiertes Array der Kanten
+def sort_edges(edges):
+    return np.unique(np.sort(np.asarray(edges).reshape(-1, 2), axis=1), axis=0)
+
+
+## Symmetrische Adjazenzmatrix (CSR) aus einer Kantenliste
+# @param edges: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante
+# @param n: Anzahl Punkte
+# @return: symmetrische scipy.sparse.csr_matrix (bool)
+def edges_to_symmetric(edges, n):
+    return llt.upper_csr_to_symmetric(llt.edges_to_upper_csr(edges[:, 0], edges[:, 1], n))
+
+
+## Erreichbarkeit innerhalb von max_steps Schritten über die dichte Matrixpotenz (Referenz).
+# @param matrix_symm: symmetrische Adjazenzmatrix
+# @param max_steps: maximale Entfernung (Schritte)
+# @return: obere Dreiecksmatrix (np.ndarray, bool) der Knotenpaare mit Entfernung 1 ... max_steps
+def reachability_dense(matrix_symm, max_steps):
+    adjacency = matrix_symm.toarray().astype(np.float32)
+    reachable = adjacency > 0
+    power = adjacency
+    for _ in range(1, max_steps):
+        power = ((power @ adjacency) > 0).astype(np.float32)
+        reachable |= power > 0
+
+    return np.triu(reachable, 1)
+
+
+## Ergänzt die Versorgungsverbindungen über die Suche über alle Versorgungszentren je Bezirk (Referenz, entspricht
+# der Bezirksschleife der ursprünglichen Version).
+# @param calculator: LuftlinienCalculator
+# @param matrix: Adjazenzmatrix (obere Dreiecksmatrix, CSR)
+# @param value_vfs: Attributwert der VFS
+# @param anz_versorger: Anzahl der Versorgungszentren je Bezirk
+# @param active_zones: aktive Bezirke (siehe LuftlinienCalculator.get_active_zones)
+# @return: symmetrische Adjazenzmatrix (np.ndarray, bool) inkl. der Versorgungsverbindungen
+def connect_providers_brute_force(calculator, matrix, value_vfs, anz_versorger, active_zones):
+    zones = calculator.zones
+    dense = llt.upper_csr_to_symmetric(matrix).toarray()
+    array_points = zones[["XCoord", "YCoord"]].values
+    idx_provider = np.flatnonzero(((zones[calculator.attr_central_level] < value_vfs)
+                                   & (zones[calculator.attr_is_from_zone] > 0)).values)
+
+    idx_zones = active_zones.loc[active_zones[calculator.attr_is_from_zone] > 0, :].index
+    for zone in idx_zones.difference(idx_provider):
+        is_connected = dense[zone, idx_provider]
+        n_missing = anz_versorger - is_connected.sum()
+        if n_missing <= 0:
+            continue
+        idx_candidates = idx_provider[~is_connected]
+        idx_selected = idx_candidates[llt.get_nearest_points_from_set(*array_points[zone], array_points[idx_candidates],
+                                                                      calculator.formula_dist, n=n_missing)]
+        dense[zone, idx_selected] = True
+        dense[idx_selected, zone] = True
+
+    return dense
+
+
+## Liest eine exportierte Matrix im $O Format (ggf. gzip komprimiert) ein.
+# @param path: Dateipfad (.mtx oder .mtx.gz)
+# @param zone_no: Bezirksnummern in der Reihenfolge der Bezirkstabelle
+# @return: scipy.sparse.csr_matrix (float)
+def read_matrix_mtx(path, zone_no):
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt") as f:
+        values = np.loadtxt(f, skiprows=len(llt.MTX_HEADER.splitlines()), ndmin=2)
+
+    index = pd.Index(zone_no)
+    return sparse.csr_matrix((values[:, 2], (index.get_indexer(values[:, 0].astype(np.int64)),
+                                             index.get_indexer(values[:, 1].astype(np.int64)))),
+                             shape=(len(zone_no), len(zone_no)))
+
+
+## Liest eine exportierte Matrix im npz Format ein.
+# @param path: Dateipfad (.npz)
+# @return: Tupel aus scipy.sparse.csr_matrix und den Bezirksnummern
+def read_matrix_npz(path):
+    with np.load(path) as arrays:
+        data = arrays["data"] if "data" in arrays else np.ones(len(arrays["indices"]), dtype=bool)
+        matrix = sparse.csr_matrix((data, arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"]))
+        return matrix, arrays["zone_no"]
+
+
+## Bezirke auf einem regelmäßigen Raster (vier Punkte je leerem Umkreis)
+# @param n_side: Anzahl Punkte je Seite
+# @param spacing: Rasterabstand
+# @param offset: Koordinaten (x, y) des ersten Punkts
+# @return: Array (n_side^2 x 2) mit den x- & y-Koordinaten
+def grid_points(n_side, spacing=100.0, offset=(0.0, 0.0)):
+    x, y = np.meshgrid(np.arange(n_side) * spacing, np.arange(n_side) * spacing)
+    return np.column_stack([x.ravel(), y.ravel()]) + np.asarray(offset)
+
+
+## Bezirke gleichmäßig auf einem Kreis (alle Punkte auf einem gemeinsamen Umkreis)
+# @param n: Anzahl Punkte
+# @param radius: Radius des Kreises
+# @return: Array (n x 2) mit den x- & y-Koordinaten
+def circle_points(n, radius=1000.0):
+    angles = 2 * np.pi * np.arange(n) / n
+    return np.column_stack([np.cos(angles), np.sin(angles)]) * radius
+
+
+# ====== Prüfungen =====
+# Jede Prüfung gibt eine Liste der Fehlermeldungen zurück (leer, falls alle Vergleiche übereinstimmen).
+
+## Nachbarschaftsgrad: begrenzte Breitensuche (calculate_reachability_k_steps) gegen die dichte Matrixpotenz.
+# @param df_zones: Bezirksdaten (siehe benchmark_llt.generate_zones)
+# @param list_steps: Liste der maximalen Entfernungen
+# @return: Liste der Fehlermeldungen
+def check_k_hop(df_zones, list_steps=(1, 2, 3, 4)):
+    matrix_symm = edges_to_symmetric(llt.delaunay_edges(df_zones[["XCoord", "YCoord"]].values), len(df_zones))
+
+    list_errors = []
+    for max_steps in list_steps:
+        matrix = llt.calculate_reachability_k_steps(matrix_symm, max_steps)
+        if not np.array_equal(matrix.toarray(), reachability_dense(matrix_symm, max_steps)):
+            list_errors.append(f"k_hop: Abweichung für max_steps={max_steps}")
+
+    return list_errors
+
+
+## Versorgungszentren: KD-Baum (connect_providers) gegen die Suche über alle Versorgungszentren je Bezirk.
+# @param df_zones: Bezirksdaten (siehe benchmark_llt.generate_zones)
+# @param formula: Distanzfunktion ("euclidean" oder "haversine")
+# @param list_anz_versorger: Liste der Anzahl Versorgungszentren je Bezirk
+# @return: Liste der Fehlermeldungen
+def check_providers(df_zones, formula="euclidean", list_anz_versorger=(1, 2, 4)):
+    calculator = llt.LuftlinienCalculator(df_zones, max_entfernung=1, anz_versorger=0, attr_quelle="Quelle",
+                                          attr_ziel="Ziel", formula_distance=formula)
+    calculator.calculate_main()
+
+    list_errors = []
+    for vfs, value_vfs in calculator.vfs.items():
+        active_zones = calculator.get_active_zones(value_vfs)
+        matrix = calculator.matrizen_VFS[vfs]
+        for anz_versorger in list_anz_versorger:
+            matrix_kd = calculator.connect_providers(matrix, value_vfs, anz_versorger, active_zones)
+            dense = connect_providers_brute_force(calculator, matrix, value_vfs, anz_versorger, active_zones)
+            if not np.array_equal(llt.upper_csr_to_symmetric(matrix_kd).toarray(), dense):
+                list_errors.append(f"providers ({formula}): Abweichung für {vfs}, anz_versorger={anz_versorger}")
+
+    return list_errors
+
+
+## Versorgungszentrum an Position 0 der Bezirkstabelle. Die ursprüngliche Version hat eine Verbindung zu diesem
+# Bezirk nicht als Anschluss an ein Versorgungszentrum gezählt (Index 0 als Wahrheitswert), seine Nachbarn erhielten
+# dann ein zusätzliches Zentrum. Versorgungszentren sind der Bezirk 0 im Mittelpunkt eines Rings aus 8 Bezirken und
+# der letzte Bezirk außerhalb des Rings. Der Ringbezirk (100, 0) liegt näher am letzten Bezirk, ist aber bereits über
+# die Triangulation mit Bezirk 0 verbunden (die direkte Kante zum letzten Bezirk verdeckt der Bezirk (130, 0)) und
+# erhält daher kein weiteres Versorgungszentrum.
+# @return: Liste der Fehlermeldungen
+def check_provider_first_zone():
+    angles = np.arange(8) * np.pi / 4
+    array_points = np.vstack([[0.0, 0.0], 100 * np.column_stack([np.cos(angles), np.sin(angles)]),
+                              [130.0, 0.0], [160.0, 0.0]])
+    n_zones = len(array_points)
+    df_zones = pd.DataFrame({"No": np.arange(1, n_zones + 1),
+                             "Name": [f"Bezirk {i}" for i in range(1, n_zones + 1)],
+                             "XCoord": array_points[:, 0],
+                             "YCoord": array_points[:, 1],
+                             "TypeNo": 1})
+    df_zones.loc[[0, n_zones - 1], "TypeNo"] = 0
+
+    calculator = llt.LuftlinienCalculator(df_zones, dict_vfs={"VFS 1": 1}, max_entfernung=1, anz_versorger=1)
+    calculator.calculate_main()
+    matrix = calculator.get_matrix_dense("VFS 1")
+
+    list_errors = []
+    if not matrix[1, 0] or matrix[1, n_zones - 1]:
+        list_errors.append("provider first zone: Bezirk 0 wird nicht als Versorgungszentrum gezählt")
+
+    return list_errors
+
+
+## Verschachtelte Triangulation (einmalig und inkrementell) gegen die Triangulation je Stufe.
+# @param df_zones: Bezirksdaten (siehe benchmark_llt.generate_zones)
+# @return: Liste der Fehlermeldungen
+def check_nested(df_zones):
+    list_errors = []
+    for incremental in (False, True):
+        calculator = llt.LuftlinienCalculator(df_zones, max_entfernung=1, anz_versorger=0)
+        calculator.calculate_delaunay_edges_nested(incremental=incremental)
+
+        for value_vfs in sorted(set(calculator.vfs.values())):
+            zones = calculator.zones.loc[calculator.zones[calculator.attr_central_level] <= value_vfs, :]
+            if len(zones) < 3:
+                continue
+            edges = zones.index.values[llt.delaunay_edges(zones[["XCoord", "YCoord"]].values)]
+            if not np.array_equal(sort_edges(calculator.delaunay_edges[value_vfs]), sort_edges(edges)):
+                list_errors.append(f"nested (incremental={incremental}): Abweichung für Stufe {value_vfs}")
+
+    return list_errors
+
+
+## Gekachelte (delaunay_edges_tiled) gegen ungekachelte Triangulation, für zufällige und gehäufte Punkte sowie
+# regelmäßige Raster (auch mit großen Koordinaten) und Punkte auf einem Kreis (die Kacheln widersprechen sich, die
+# Triangulation erfolgt dann ohne Kacheln).
+# @param n_zones: Anzahl Punkte der zufälligen Punktmengen
+# @param seed: Startwert des Zufallsgenerators
+# @param n_tiles: ungefähre Anzahl Kacheln
+# @return: Liste der Fehlermeldungen
+def check_tiled(n_zones, seed=0, n_tiles=9):
+    n_side = int(np.sqrt(n_zones))
+    dict_points = {"uniform": generate_zones(n_zones, "uniform", seed=seed)[["XCoord", "YCoord"]].values,
+                   "clustered": generate_zones(n_zones, "clustered", seed=seed)[["XCoord", "YCoord"]].values,
+                   "grid": grid_points(n_side),
+                   "grid_offset": grid_points(n_side, offset=(3500000.0, 5400000.0)),
+                   "circle": circle_points(n_zones)}
+
+    list_errors = []
+    for name, array_points in dict_points.items():
+        edges = llt.delaunay_edges(array_points)
+        edges_tiled = llt.delaunay_edges(array_points, tile_size=max(3, len(array_points) // n_tiles), n_jobs=2)
+        if not np.array_equal(sort_edges(edges_tiled), sort_edges(edges)):
+            list_errors.append(f"tiled: Abweichung für {name} ({len(edges_tiled)} statt {len(edges)} Kanten)")
+
+    return list_errors
+
+
+## Matrixexport: die exportierten Dateien ($O, $O gzip, npz, Distanzen npz) werden wieder eingelesen und mit den
+# Matrizen der Instanz verglichen.
+# @param df_zones: Bezirksdaten (siehe benchmark_llt.generate_zones)
+# @return: Liste der Fehlermeldungen
+def check_matrix_files(df_zones):
+    calculator = llt.LuftlinienCalculator(df_zones, max_entfernung=2, anz_versorger=1, attr_quelle="Quelle",
+                                          attr_ziel="Ziel")
+    calculator.calculate_main()
+    zone_no = calculator.zones["No"].values.astype(np.int64)
+
+    list_errors = []
+    with tempfile.TemporaryDirectory() as path_tmp:
+        calculator.path_output = Path(path_tmp)
+        list_vfs = list(calculator.vfs)
+        for file_format, compress in (("sparse", False), ("sparse", True), ("npz", False)):
+            list_paths = calculator.export_matrix_file_sparse(list_vfs, file_format=file_format, compress=compress)
+            for vfs, path_mat in zip(list_vfs, list_paths):
+                if file_format == "npz":
+                    matrix, zone_no_file = read_matrix_npz(path_mat)
+                    if not np.array_equal(zone_no_file, zone_no):
+                        list_errors.append(f"{path_mat.name}: Bezirksnummern weichen ab")
+                else:
+                    matrix = read_matrix_mtx(path_mat, zone_no)
+                if (matrix.astype(bool) != calculator.get_matrix_symmetric(vfs)).nnz > 0:
+                    list_errors.append(f"{path_mat.name}: Abweichung nach dem Einlesen")
+
+        list_paths = calculator.export_matrix_file_sparse(list_vfs, file_format="npz", values="distance")
+        for vfs, path_mat in zip(list_vfs, list_paths):
+            matrix, _ = read_matrix_npz(path_mat)
+            if abs(matrix - calculator.get_matrix_distance(vfs)).max() > 1e-9:
+                list_errors.append(f"{path_mat.name}: Abweichung der Distanzen nach dem Einlesen")
+
+    return list_errors
+
+
+## Führt alle Prüfungen aus.
+# @param n_zones: Anzahl Bezirke der synthetischen Bezirksdaten
+# @param seed: Startwert des Zufallsgenerators
+# @return: Dict mit der Liste der Fehlermeldungen je Prüfung
+def run_checks(n_zones=2000, seed=0):
+    df_zones = generate_zones(n_zones, "hierarchical", seed=seed)
+    # Lon/Lat Koordinaten (Grad) für die Haversine Formel
+    df_lonlat = df_zones.assign(XCoord=8.0 + df_zones["XCoord"] / 1e5, YCoord=48.0 + df_zones["YCoord"] / 1e5)
+
+    dict_checks = {"k_hop": lambda: check_k_hop(df_zones),
+                   "providers euclidean": lambda: check_providers(df_zones),
+                   "providers haversine": lambda: check_providers(df_lonlat, formula="haversine"),
+                   "provider first zone": check_provider_first_zone,
+                   "nested": lambda: check_nested(df_zones),
+                   "tiled": lambda: check_tiled(n_zones, seed),
+                   "matrix files": lambda: check_matrix_files(df_zones)}
+
+    dict_errors = {}
+    for name, check in dict_checks.items():
+        dict_errors[name] = check()
+        print(f"{name}: " + ("; ".join(dict_errors[name]) if dict_errors[name] else "OK"))
+
+    return dict_errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prüfung Luftlinientool mit synthetischen Bezirksdaten")
+    parser.add_argument("--n-zones", type=int, default=2000, help="Anzahl Bezirke")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Meldungen des Luftlinientools nur bei Warnungen
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s: %(message)s")
+
+    dict_errors = run_checks(args.n_zones, args.seed)
+    sys.exit(1 if any(dict_errors.values()) else 0)
@@ -5,6 +5,7 @@ import wx
 import luftlinientool as llt
 from pathlib import Path
 import logging
+import threading
 
 # ===== Hilfsfkt =====
 
@@ -68,6 +69,10 @@ class LLTFrame(wx.Frame):
         self.attr_ziel = None
         self.attr_vfs = "TypeNo"
         self.attr_dist_fcn = "euclidean"
+        ## laufende Berechnung bzw. laufender Export (CalculationWorker), None falls keine Aufgabe läuft
+        self.worker = None
+        ## Flag: das Fenster wird nach dem Abbruch der laufenden Aufgabe geschlossen
+        self.close_pending = False
 
         self.__set_layout__()
         self.__set_properties__()
@@ -127,6 +132,9 @@ class LLTFrame(wx.Frame):
         self.toolbar.AddTool(105, 'Info', wx.Bitmap())
         self.toolbar.AddTool(106, 'Filter: eingefügte Strecken', wx.Bitmap())
         self.toolbar.AddTool(107, 'Löschen: eingefügte Strecken', wx.Bitmap())
+        self.toolbar.AddSeparator()
+        self.toolbar.AddTool(108, 'Abbrechen', wx.Bitmap())
+        self.toolbar.EnableTool(108, False)
         self.toolbar.Realize()
 
 
@@ -136,7 +144,10 @@ class LLTFrame(wx.Frame):
         # # toolbar.Realize()
 
         # create a status bar at the bottom of the frame
-        self.CreateStatusBar()
+        # Feld 1: Statustext, Feld 2: Fortschritt der laufenden Berechnung bzw. des laufenden Exports
+        self.statusbar = self.CreateStatusBar(2)
+        self.statusbar.SetStatusWidths([-1, 250])
+        self.gauge = wx.Gauge(self.statusbar, range=1, style=wx.GA_HORIZONTAL | wx.GA_SMOOTH)
 
         # Set noteboook in a sizer to create the layout
         sizer = wx.BoxSizer()
@@ -160,6 +171,9 @@ class LLTFrame(wx.Frame):
         self.toolbar.Bind(wx.EVT_TOOL, self.event_info, id=105)
         self.toolbar.Bind(wx.EVT_TOOL, self.event_filter, id=106)
         self.toolbar.Bind(wx.EVT_TOOL, self.event_delete_links, id=107)
+        self.toolbar.Bind(wx.EVT_TOOL, self.event_cancel, id=108)
+
+        self.statusbar.Bind(wx.EVT_SIZE, self.event_size_statusbar)
 
     def __set_values_vfs_buttons__(self):
         max_value_vfs = int(self.visum.Net.AttValue(f"Max:Zones\{self.attr_vfs}"))
@@ -237,15 +251,97 @@ class LLTFrame(wx.Frame):
     def event_calculate(self, event):
         # Vorgehen
         # 1. Update der vorgegebenen parameter, falls was geändert wurde
-        # 2. berechnen
+        # 2. berechnen (im Hintergrund, Abschluss siehe event_worker_done)
+        if self.llt_calculator is None:
+            return
         self.update_param_vfs()
         # self.llt_calculator.init_results() # bereits in calculate fcn implementiert
-        self.llt_calculator.calculate_main()
 
-        # Statusleiste
-        self.SetStatusText('Berechnung durchgeführt')
+        # Fortschritt je berechneter VFS über den Fortschrittsbeobachter des Calculators (auch bei paralleler
+        # Berechnung und Ergebnissen aus dem Cache)
+        self.start_worker(self.llt_calculator.calculate_main, "Berechnung", 'Berechnung durchgeführt',
+                          n_steps=len(self.llt_calculator.vfs),
+                          progress_stages=("calculate_main",),
+                          discard_on_cancel=True)
+
+    ## Startet eine Aufgabe (Berechnung bzw. Export) im Hintergrund. Während der Aufgabe sind die Eingaben gesperrt,
+    # nur der Abbruch ist möglich.
+    # @param task: Funktion ohne Parameter
+    # @param name_task: Bezeichnung der Aufgabe für die Statusleiste
+    # @param text_done: Statustext nach erfolgreichem Abschluss
+    # @param n_steps: Anzahl der Fortschrittsschritte (Bereich der Fortschrittsanzeige)
+    # @param progress_stages: Schritte des MetricsCollectors, deren Abschluss die Fortschrittsanzeige erhöht, bzw.
+    # Schritte des Fortschrittsbeobachters (calculator.progress), deren done/total die Fortschrittsanzeige bestimmen
+    # @param discard_on_cancel: falls True werden die Ergebnisse bei Abbruch verworfen (init_results)
+    def start_worker(self, task, name_task, text_done, n_steps, progress_stages, discard_on_cancel=False):
+        if self.worker is not None:
+            logging.warning(f"{self.worker.name_task} läuft noch, bitte Abschluss abwarten oder abbrechen")
+            return
+
+        self.worker = CalculationWorker(self, self.llt_calculator, task, name_task, text_done, progress_stages,
+                                        discard_on_cancel)
+        self.gauge.SetRange(max(n_steps, 1))
+        self.gauge.SetValue(0)
+        self.set_running(True)
+        self.SetStatusText(f'{name_task} läuft ...')
+        self.worker.start()
+
+    ## Sperrt bzw. entsperrt die Eingaben während einer laufenden Aufgabe
+    # @param running: True, falls eine Aufgabe läuft
+    def set_running(self, running):
+        for id_tool in range(101, 108):
+            self.toolbar.EnableTool(id_tool, not running)
+        self.toolbar.EnableTool(108, running)
+        self.menu_bar.EnableTop(0, not running)
+        self.tabMain.Enable(not running)
+
+    ## Fortschritt der laufenden Aufgabe (Aufruf über wx.CallAfter aus dem CalculationWorker)
+    # @param text: Statustext
+    # @param n_done: Anzahl abgeschlossener Fortschrittsschritte
+    # @param n_total: optionale Gesamtanzahl der Fortschrittsschritte (Bereich der Fortschrittsanzeige)
+    def event_worker_progress(self, text, n_done, n_total=None):
+        if n_total is not None and n_total != self.gauge.GetRange():
+            self.gauge.SetRange(max(n_total, 1))
+        self.gauge.SetValue(min(n_done, self.gauge.GetRange()))
+        self.SetStatusText(text)
+
+    ## Abschluss der laufenden Aufgabe (Aufruf über wx.CallAfter aus dem CalculationWorker)
+    # @param text: Statustext
+    # @param success: True, falls die Aufgabe vollständig ausgeführt wurde
+    def event_worker_done(self, text, success):
+        self.worker.join()
+        self.worker = None
+        self.gauge.SetValue(self.gauge.GetRange() if success else 0)
+        if self.close_pending:
+            self.Close()
+            return
+
+        self.set_running(False)
+        self.SetStatusText(text)
+
+    def event_cancel(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.SetStatusText(f'{self.worker.name_task} wird abgebrochen ...')
+
+    def event_size_statusbar(self, event):
+        # Fortschrittsanzeige im zweiten Feld der Statusleiste
+        rect = self.statusbar.GetFieldRect(1)
+        self.gauge.SetPosition((rect.x + 2, rect.y + 2))
+        self.gauge.SetSize((rect.width - 4, rect.height - 4))
+        event.Skip()
 
     def event_quit_button(self, event):
+        # Eine laufende Aufgabe wird zuerst abgebrochen, damit die Visuminstanz nicht während eines Exports
+        # freigegeben wird. Das Fenster wird nach dem Abbruch geschlossen (event_worker_done)
+        if self.worker is not None:
+            self.close_pending = True
+            self.worker.cancel()
+            self.SetStatusText(f'{self.worker.name_task} wird abgebrochen, das Fenster wird anschließend geschlossen')
+            if event.CanVeto():
+                event.Veto()
+                return
+
         try:
             if self.visum is not None:
                 self.visum = None  # Freigeben der Visum-Ressource
@@ -297,35 +393,41 @@ class LLTFrame(wx.Frame):
 
     def event_export_results(self, event):
         if self.llt_calculator is not None:
-            self.llt_calculator.export_net(
-                                           links_additive=True)
-            self.llt_calculator.export_matrix()
+            def task():
+                self.llt_calculator.export_net(links_additive=True)
+                self.llt_calculator.export_matrix()
+
+            self.start_worker(task, "Export", 'Ergebnisse exportiert', n_steps=2,
+                              progress_stages=("export_net", "export_matrix"))
 
     def event_export_net(self, event):
         vfs = event.GetEventObject().vfs
 
         if self.llt_calculator is not None:
-            self.llt_calculator.export_net(list_vfs=[vfs],
-                                           links_additive=True)
-            self.llt_calculator.delete_unused_nodes()
+            def task():
+                self.llt_calculator.export_net(list_vfs=[vfs], links_additive=True)
+                self.llt_calculator.delete_unused_nodes()
 
-        self.SetStatusText(f'{vfs}: Net-Datei exportiert und in Visum importiert')
+            self.start_worker(task, f"{vfs}: Export Net-Datei", f'{vfs}: Net-Datei exportiert und in Visum importiert',
+                              n_steps=1, progress_stages=("export_net",))
 
 
     def event_export_mtx(self, event):
         vfs = event.GetEventObject().vfs
 
         if self.llt_calculator is not None:
-            self.llt_calculator.export_matrix(list_vfs=[vfs])
-
-        self.SetStatusText(f'{vfs}: Matrix in Visum geladen')
+            self.start_worker(lambda: self.llt_calculator.export_matrix(list_vfs=[vfs]), f"{vfs}: Export Matrix",
+                              f'{vfs}: Matrix in Visum geladen', n_steps=1, progress_stages=("export_matrix",))
 
     def event_export_master(self, event):
-        self.llt_calculator.export_matrix()
-        self.llt_calculator.export_net(links_additive=True)
-        self.llt_calculator.delete_unused_nodes()
+        if self.llt_calculator is not None:
+            def task():
+                self.llt_calculator.export_matrix()
+                self.llt_calculator.export_net(links_additive=True)
+                self.llt_calculator.delete_unused_nodes()
 
-        self.SetStatusText(f'die kombinierten Ergebnisse wurden in Visum importiert')
+            self.start_worker(task, "Export alle VFS", f'die kombinierten Ergebnisse wurden in Visum importiert',
+                              n_steps=2, progress_stages=("export_matrix", "export_net"))
 
     def event_filter(self, event):
         if self.llt_calculator is not None:
@@ -356,6 +458,124 @@ VFS {self.llt_calculator.vfs}
 Nachbarschaftsgrad je VFS {self.llt_calculator.nachbarschaftsgrad_vfs} 
 Anzahl Versorger je VFS {self.llt_calculator.anz_versorger_vfs}''')
 
+## Führt eine Berechnung bzw. einen Export des LuftlinienCalculators in einem eigenen Thread aus, damit die Oberfläche
+# während der Aufgabe bedienbar bleibt.
+# Der Fortschritt wird über die Callbacks des MetricsCollectors je abgeschlossenem Schritt und VFS sowie über den
+# Fortschrittsbeobachter des Calculators ermittelt und über wx.CallAfter an das Fenster gemeldet. Der Abbruch erfolgt
+# über ein CancellationToken, das der Calculator zwischen den Schritten und in den Schleifen prüft.
+# Die Visuminstanz wird für den Thread über COM gemarshallt: die Visumaufrufe der Exporte werden so im Hauptthread
+# ausgeführt, der währenddessen weiter die Nachrichten der Oberfläche verarbeitet. Aufbau der Matrizen und Schreiben der
+# Dateien laufen im Thread.
+class CalculationWorker(threading.Thread):
+
+    ## Konstruktor, wird im Hauptthread aufgerufen
+    # @param frame: LLTFrame, an das Fortschritt und Abschluss gemeldet werden
+    # @param calculator: LuftlinienCalculator
+    # @param task: Funktion ohne Parameter (Berechnung bzw. Export)
+    # @param name_task: Bezeichnung der Aufgabe für die Statusleiste
+    # @param text_done: Statustext nach erfolgreichem Abschluss
+    # @param progress_stages: Schritte des MetricsCollectors, deren Abschluss als Fortschritt gezählt wird, bzw. Schritte
+    # des Fortschrittsbeobachters, deren done/total als Fortschritt übernommen werden
+    # @param discard_on_cancel: falls True werden die Ergebnisse bei Abbruch oder Fehler verworfen (init_results)
+    def __init__(self, frame, calculator, task, name_task, text_done, progress_stages, discard_on_cancel=False):
+        super().__init__(daemon=True)
+        self.frame = frame
+        self.calculator = calculator
+        self.task = task
+        self.name_task = name_task
+        self.text_done = text_done
+        self.progress_stages = set(progress_stages)
+        self.discard_on_cancel = discard_on_cancel
+        ## Anzahl abgeschlossener Fortschrittsschritte
+        self.n_done = 0
+        ## Gesamtanzahl der Fortschrittsschritte, falls vom Fortschrittsbeobachter gemeldet
+        self.n_total = None
+        ## Abbruch der Aufgabe
+        self.cancel_token = llt.CancellationToken()
+
+        # Visuminstanz für den Thread marshallen (muss im Hauptthread erfolgen)
+        self._stream_visum = None
+        if calculator.visum is not None:
+            import pythoncom
+            self._stream_visum = pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch,
+                                                                                 calculator.visum._oleobj_)
+
+    ## Fordert den Abbruch an
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    ## Callback des MetricsCollectors je abgeschlossenem Schritt (im Thread)
+    # @param record: Dict mit den Kennwerten des Schritts
+    def on_stage(self, record):
+        if record["stage"] in self.progress_stages:
+            self.n_done += 1
+        vfs = f' {record["vfs"]}' if record["vfs"] is not None else ''
+        wx.CallAfter(self.frame.event_worker_progress,
+                     f'{self.name_task}: {record["stage"]}{vfs} abgeschlossen ({record["seconds"]:.1f} s)', self.n_done,
+                     self.n_total)
+
+    ## Fortschrittsbeobachter des Calculators innerhalb der Schritte (im Thread)
+    # @param record: Dict mit stage, vfs, done, total
+    def on_progress(self, record):
+        if record["stage"] in self.progress_stages and record["total"]:
+            # z.B. calculate_main: je berechneter VFS, ohne die aus dem Cache geladenen VFS
+            self.n_done = record["done"]
+            self.n_total = record["total"]
+        vfs = f' {record["vfs"]}' if record["vfs"] is not None else ''
+        wx.CallAfter(self.frame.event_worker_progress,
+                     f'{self.name_task}: {record["stage"]}{vfs} {record["done"]}/{record["total"]}', self.n_done,
+                     self.n_total)
+
+    def run(self):
+        calculator = self.calculator
+        visum = calculator.visum
+        metrics = calculator.metrics
+        progress = calculator.progress
+        cancel_token = calculator.cancel_token
+        success = False
+
+        # Fortschritt über den MetricsCollector, ein vorhandener Collector bleibt erhalten
+        if metrics is None:
+            calculator.metrics = llt.MetricsCollector(trace_memory=False)
+        calculator.metrics.callbacks.append(self.on_stage)
+        calculator.progress = self.on_progress
+        calculator.cancel_token = self.cancel_token
+
+        try:
+            if self._stream_visum is not None:
+                import pythoncom
+                import win32com.client as com
+                pythoncom.CoInitialize()
+                calculator.visum = com.Dispatch(
+                    pythoncom.CoGetInterfaceAndReleaseStream(self._stream_visum, pythoncom.IID_IDispatch))
+
+            self.task()
+            success = True
+            text = self.text_done
+        except llt.CalculationCancelled:
+            text = f'{self.name_task} abgebrochen'
+            logging.warning(text)
+        except Exception as e:
+            text = f'{self.name_task} fehlgeschlagen: {e}'
+            logging.exception(text)
+        finally:
+            calculator.metrics.callbacks.remove(self.on_stage)
+            calculator.metrics = metrics
+            calculator.progress = progress
+            calculator.cancel_token = cancel_token
+            if self._stream_visum is not None:
+                # Proxy der Visuminstanz im Thread freigeben
+                calculator.visum = visum
+                import pythoncom
+                pythoncom.CoUninitialize()
+
+        if not success and self.discard_on_cancel:
+            # unvollständige Ergebnisse verwerfen
+            calculator.init_results()
+
+        wx.CallAfter(self.frame.event_worker_done, text, success)
+
+
 ## Spezifiziert & verwaltet den Tab mit den Eingabe- und Aktionsmöglichkeiten
 class MainTab(wx.Panel):
     def __init__(self, parent):
@@ -589,14 +809,73 @@ class LogTab(wx.Panel):
         self.logger.removeHandler(self.handler)
 
 ## Handler der Logbefehle
+# Die Meldungen werden gepuffert und gesammelt im Hauptthread in das Textfeld geschrieben (ein Aufruf je Block statt
+# je Meldung). Das Textfeld ist auf max_chars Zeichen begrenzt, ältere Meldungen werden entfernt. Lange Meldungen werden
+# gekürzt, läuft der Puffer über, werden die ältesten Meldungen verworfen. Die vollständigen Meldungen enthält das Logfile.
 class WxTextCtrlHandler(logging.Handler):
-    def __init__(self, ctrl):
+
+    ## Konstruktor
+    # @param ctrl: wx.TextCtrl
+    # @param max_chars: maximale Anzahl Zeichen im Textfeld
+    # @param max_record_chars: maximale Anzahl Zeichen je Meldung
+    # @param max_pending: maximale Anzahl noch nicht geschriebener Meldungen
+    def __init__(self, ctrl, max_chars=1000000, max_record_chars=10000, max_pending=1000):
         logging.Handler.__init__(self)
         self.ctrl = ctrl
+        self.max_chars = max_chars
+        self.max_record_chars = max_record_chars
+        self.max_pending = max_pending
+        ## noch nicht geschriebene Meldungen
+        self.pending = []
+        ## Anzahl verworfener Meldungen seit dem letzten Schreiben
+        self.n_dropped = 0
+        self._flush_scheduled = False
 
     def emit(self, record):
-        s = self.format(record) + '\n'
-        wx.CallAfter(self.ctrl.WriteText, s)
+        s = self.format(record)
+        if len(s) > self.max_record_chars:
+            s = s[:self.max_record_chars] + f' ... (gekürzt, {len(s)} Zeichen, siehe Logfile)'
+
+        # emit wird über den Lock des Handlers serialisiert (auch aus dem CalculationWorker)
+        self.pending.append(s + '\n')
+        if len(self.pending) > self.max_pending:
+            del self.pending[0]
+            self.n_dropped += 1
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            wx.CallAfter(self.write_pending)
+
+    ## Schreibt die gepufferten Meldungen in das Textfeld (Hauptthread)
+    def write_pending(self):
+        self.acquire()
+        try:
+            list_pending = self.pending
+            n_dropped = self.n_dropped
+            self.pending = []
+            self.n_dropped = 0
+            self._flush_scheduled = False
+        finally:
+            self.release()
+
+        if not self.ctrl or len(list_pending) == 0:
+            return
+
+        text = ''.join(list_pending)
+        if n_dropped > 0:
+            text = f'... {n_dropped} Meldungen ausgelassen (siehe Logfile)\n' + text
+
+        self.ctrl.Freeze()
+        try:
+            self.ctrl.AppendText(text)
+            # älteste Meldungen entfernen (bis zum Zeilenende)
+            n_excess = self.ctrl.GetLastPosition() - self.max_chars
+            if n_excess > 0:
+                pos_end = self.ctrl.GetRange(n_excess, n_excess + self.max_record_chars).find('\n')
+                self.ctrl.Remove(0, n_excess + pos_end + 1 if pos_end >= 0 else n_excess)
+                self.ctrl.SetInsertionPointEnd()
+        finally:
+            self.ctrl.Thaw()
 
 if __name__ == '__main__':
     app = wx.App()
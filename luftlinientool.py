@@ -5,15 +5,60 @@
 import pandas as pd
 import logging
 import numpy as np
-from scipy.spatial import Delaunay
 from pathlib import Path
 from math import radians
-import win32com.client as com
-import webbrowser
+from contextlib import ExitStack, contextmanager, nullcontext
+import time
+
+# Hinweis: win32com, webbrowser, cProfile, scipy (sparse, spatial), gzip, tracemalloc, json, hashlib und threading werden
+# erst bei Bedarf importiert. Damit kann das Modul auch ohne Visum (z.B. unter Linux) importiert und schnell gestartet
+# werden.
 
 
 # todo update nach Änderung sofort in GUI Event, hier nicht nochmaliges Update
 
+## Dateikopf der exportierten Matrizen ($O Format)
+MTX_HEADER = '''$O
+* Universität Stuttgart
+*
+* Verbindungsfunktionsstufe 5
+*
+* symmetrische Matrix
+*
+* Parameter
+* Nachbarschaftsniveau Z-Z:
+* Nachbarschaftsniveau Z-Z+:
+*
+* Zeitbereich
+0 24
+*
+* Faktor
+*
+1.0
+*
+* VonBezirk NachBezirk Matrixwert
+'''
+
+## Version des Ergebnisspeichers (ResultCache). Bei Änderungen der Berechnung erhöhen, damit alte Einträge nicht
+# mehr verwendet werden.
+CACHE_VERSION = 2
+
+## Dateikopf der exportierten Netzdateien (.net)
+NET_HEADER = '''$VISION
+* Universität Stuttgart Fakultät 2 Bau+Umweltingenieurwissenschaften Stuttgart
+* 08/23/22
+* 
+* Table: Version block
+* 
+$VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT
+13;Net;ENG;KM
+
+'''
+
+## Umrechnung der Distanz (siehe calculate_edge_lengths) in die Längeneinheit der Netzdateien (km, siehe NET_HEADER).
+# euclidean: Koordinaten in m (projizierte Koordinaten in Visum), haversine: km
+NET_LENGTH_FACTOR = {"euclidean": 0.001, "haversine": 1.0}
+
 # ====== allgemeine, nützliche FUnktionen =====
 
 ## Öffnet eine Visuminstanz falls nicht bereits offen
@@ -29,6 +74,7 @@ def open_visum(path, version=240):
         name = Visum.UserPreferences.DocumentName
     except NameError:
         # falls nicht - Öffne eine Visuminstanz
+        import win32com.client as com
         logging.info('initialize visum instance')
         Visum = com.Dispatch(f"Visum.Visum.{version}")
         logging.info('open visum file: {}'.format(path))
@@ -55,13 +101,776 @@ def write_object_to_net(object, df_object_attributes_to_write, file):
 
 
 ## Überprüft eine Matrif auf Symmetrie
-# @param[in] matrix: Matrix, die auf Symmetrie getestet werden soll
+# @param[in] matrix: Matrix (dicht oder scipy.sparse), die auf Symmetrie getestet werden soll
 # @param[in] tol: Toleranz für erlaubte Abweichung, default 1e-8
 # @return: True oder False
 def is_symmetric(matrix, tol=1e-8):
+    from scipy import sparse
+
+    if sparse.issparse(matrix):
+        # Dünnbesetzt: Vergleich der Einträge in O(Anzahl Einträge), ohne Typumwandlung der Matrix
+        matrix = sparse.csr_matrix(matrix)
+        if matrix.dtype == bool:
+            return (matrix != matrix.T).nnz == 0
+        diff = matrix - matrix.T
+        return diff.nnz == 0 or abs(diff).max() < tol
     # Anwendung der Maximums-Norm für die Diff zwischen der Matrix und der Transponierten
     # Norm > 0 -> keine Symmetrie
-    return np.linalg.norm(matrix.astype(int) - matrix.T.astype(int), np.Inf) < tol
+    return np.linalg.norm(matrix.astype(int) - matrix.T.astype(int), np.inf) < tol
+
+
+## Überprüft, ob alle Einträge einer dünnbesetzten Matrix oberhalb der Diagonalen liegen.
+# Der Test erfolgt direkt auf den CSR Arrays in O(Anzahl Einträge).
+# @param[in] matrix: scipy.sparse Matrix
+# @return: True oder False
+def is_upper_triangular(matrix):
+    from scipy import sparse
+
+    matrix = sparse.csr_matrix(matrix)
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+    return not np.any(matrix.indices[matrix.data != 0] <= rows[matrix.data != 0])
+
+
+## Erstellt aus ungerichteten Kanten die obere Dreiecksmatrix (CSR) einer Adjazenzmatrix
+# Die Kanten werden auf i < j normiert, Duplikate zusammengefasst und Schleifen (i = i) entfernt.
+# @param[in] idx_from: Vektor der Zeilenindizes
+# @param[in] idx_to: Vektor der Spaltenindizes
+# @param[in] n: Anzahl der Bezirke (Dimension der Matrix)
+# @return: scipy.sparse.csr_matrix (bool) mit Einträgen nur oberhalb der Diagonalen
+def edges_to_upper_csr(idx_from, idx_to, n):
+    from scipy import sparse
+
+    idx_from = np.asarray(idx_from, dtype=np.int64)
+    idx_to = np.asarray(idx_to, dtype=np.int64)
+
+    rows = np.minimum(idx_from, idx_to)
+    cols = np.maximum(idx_from, idx_to)
+    is_edge = rows != cols
+
+    matrix = sparse.csr_matrix((np.ones(is_edge.sum(), dtype=bool), (rows[is_edge], cols[is_edge])),
+                               shape=(n, n), dtype=bool)
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+
+    return matrix
+
+
+## Ermittelt die eindeutigen, ungerichteten Kanten einer Triangulation in einem vektorisierten Schritt.
+# Jedes Dreieck (p1, p2, p3) liefert die Kanten p1-p2, p1-p3, p2-p3. Die Kanten werden auf i < j normiert und
+# Duplikate (gemeinsame Kanten benachbarter Dreiecke) entfernt.
+# @param[in] simplices: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke, z.B. Delaunay.simplices
+# @return: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante, sortiert, erste Spalte < zweite Spalte
+def triangles_to_edges(simplices):
+    simplices = np.asarray(simplices, dtype=np.int64)
+    if len(simplices) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    edges = np.concatenate([simplices[:, [0, 1]], simplices[:, [0, 2]], simplices[:, [1, 2]]])
+    edges.sort(axis=1)
+
+    return np.unique(edges, axis=0)
+
+
+## Scherung der Koordinaten für die ebene Triangulation. Bei entarteten Punktmengen (mehr als drei Punkte auf einem
+# leeren Umkreis, z.B. regelmäßige Raster) ist die Delaunay-Triangulation nicht eindeutig und hängt von der
+# Reihenfolge in Qhull ab. Nach der geringen Scherung x + 2^-20 * y liegen solche Punkte auf einer Ellipse und nicht
+# mehr auf einem Kreis, die Triangulation ist eindeutig. Geraden bleiben erhalten und die Abbildung ist für alle
+# Teilmengen (Kacheln, Stufen) gleich. Die Punkte werden für die Genauigkeit von Qhull um origin verschoben.
+# Anmerkung: Eindeutig bis zur Genauigkeit von Qhull, d.h. nicht für Raster mit einem Abstand unter ca. 1e-4 der
+# Ausdehnung oder sehr viele Punkte auf einem gemeinsamen Kreis.
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] origin: Ursprung (x, y) der Verschiebung. Default None: Mittelpunkt der Ausdehnung von array_points
+# @return: Array mit den verschobenen und gescherten x- & y-Koordinaten
+def shear_points(array_points, origin=None):
+    array_points = np.asarray(array_points, dtype=float)
+    if origin is None:
+        origin = (array_points.min(axis=0) + array_points.max(axis=0)) / 2 if len(array_points) > 0 else np.zeros(2)
+
+    points = array_points - origin
+    points[:, 0] += 2.0 ** -20 * points[:, 1]
+
+    return points
+
+
+## Delaunay Triangulation einer Punktmenge, eben (scipy.spatial.Delaunay der gescherten Punkte, siehe shear_points)
+# oder sphärisch für Lon/Lat Koordinaten (siehe spherical_delaunay_simplices).
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] spherical: falls True wird auf der Einheitskugel trianguliert
+# @return: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke
+def delaunay_simplices(array_points, spherical=False):
+    array_points = np.asarray(array_points, dtype=float)
+    if spherical:
+        return spherical_delaunay_simplices(array_points[:, 0], array_points[:, 1])
+
+    from scipy.spatial import Delaunay
+    return Delaunay(shear_points(array_points)).simplices
+
+
+## Umkreise von Dreiecken (vektorisiert)
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] simplices: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke
+# @return center, radius: Array (Anzahl Dreiecke x 2) der Mittelpunkte und Vektor der Radien (inf für entartete Dreiecke)
+def triangle_circumcircles(array_points, simplices):
+    a = array_points[simplices[:, 0]]
+    b = array_points[simplices[:, 1]] - a
+    c = array_points[simplices[:, 2]] - a
+    d = 2 * (b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
+    b2 = (b ** 2).sum(axis=1)
+    c2 = (c ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ux = (c[:, 1] * b2 - b[:, 1] * c2) / d
+        uy = (b[:, 0] * c2 - c[:, 0] * b2) / d
+    radius = np.hypot(ux, uy)
+    radius[~np.isfinite(radius)] = np.inf
+
+    return a + np.column_stack([ux, uy]), radius
+
+
+## Inkreistest (vektorisiert): positiv, falls der Punkt p innerhalb des Umkreises des Dreiecks (a, b, c) liegt, 0 auf
+# dem Umkreis
+# @param[in] a, b, c: Eckpunkte der Dreiecke (Array Anzahl x 2 oder einzelner Punkt)
+# @param[in] p: zu prüfende Punkte (Array Anzahl x 2)
+# @return: Vektor mit der Determinante des Inkreistests (unabhängig vom Umlaufsinn des Dreiecks)
+def incircle(a, b, c, p):
+    a, b, c = (np.atleast_2d(x) - p for x in (a, b, c))
+    orientation = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    det = ((a ** 2).sum(axis=1) * (b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
+           + (b ** 2).sum(axis=1) * (c[:, 0] * a[:, 1] - c[:, 1] * a[:, 0])
+           + (c ** 2).sum(axis=1) * (a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]))
+
+    return det * np.sign(orientation)
+
+
+## Innenwinkel der Dreiecke (vektorisiert)
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] simplices: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke
+# @return: Array (Anzahl Dreiecke x 3) mit dem Winkel (Bogenmaß) an den Eckpunkten
+def triangle_angles(array_points, simplices):
+    angles = np.empty(simplices.shape)
+    for i in range(3):
+        p = array_points[simplices[:, i]]
+        u = array_points[simplices[:, (i + 1) % 3]] - p
+        v = array_points[simplices[:, (i + 2) % 3]] - p
+        angles[:, i] = np.arctan2(np.abs(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]), (u * v).sum(axis=1))
+
+    return angles
+
+
+## Abstand von Punkten zu einem achsenparallelen Rechteck (vektorisiert, 0 innerhalb)
+# @param[in] points: Array (Anzahl x 2) der Punkte
+# @param[in] rect_min, rect_max: untere linke und obere rechte Ecke des Rechtecks
+# @return: Vektor der Abstände
+def distance_to_rect(points, rect_min, rect_max):
+    return np.hypot(*np.maximum(np.maximum(rect_min - points, points - rect_max), 0).T)
+
+
+## Prüft, ob Dreiecke eine Triangulation der Punktmenge bilden, d.h. die konvexe Hülle genau einfach und ohne
+# Überlappung überdecken und alle Punkte Eckpunkte sind. Bedingungen (Aufwand O(n log n)):
+# - alle Punkte sind Eckpunkte, höchstens 3n - 6 Kanten, jede Kante gehört zu höchstens zwei Dreiecken
+# - die gegenüberliegenden Eckpunkte einer Kante zweier Dreiecke liegen auf verschiedenen Seiten der Kante
+# - Kanten nur eines Dreiecks liegen auf dem Rand der konvexen Hülle
+# - die Summe der Dreiecksflächen entspricht der Fläche der konvexen Hülle
+# Die Überdeckung ändert sich dann nur am Rand der Hülle und ist wegen der Flächensumme überall einfach.
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] simplices: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke, ohne Duplikate
+# @param[in] hull_points: Punkte mit derselben konvexen Hülle wie array_points (z.B. die Eckpunkte der Hüllen von
+# Teilmengen), damit keine Hülle über alle Punkte berechnet werden muss
+# @param[in] tol: Toleranz relativ zur Ausdehnung bzw. Fläche der Hülle
+# @return: True oder False
+def is_valid_triangulation(array_points, simplices, hull_points, tol=1e-9):
+    from scipy.spatial import ConvexHull, QhullError
+
+    n = len(array_points)
+    if len(simplices) == 0 or np.bincount(simplices.ravel(), minlength=n).min() == 0:
+        return False
+    try:
+        hull = ConvexHull(hull_points)
+    except QhullError:
+        return False
+
+    # Kanten aller Dreiecke mit dem gegenüberliegenden Eckpunkt, sortiert nach Kante
+    edges = np.sort(np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [2, 0]]]), axis=1)
+    opposite = np.concatenate([simplices[:, 2], simplices[:, 0], simplices[:, 1]])
+    keys = edges[:, 0].astype(np.int64) * n + edges[:, 1]
+    order = np.argsort(keys, kind="stable")
+    keys, edges, opposite = keys[order], edges[order], opposite[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    count = np.diff(np.r_[first, len(keys)])
+    if len(first) > max(3 * n - 6, 3) or count.max() > 2:
+        return False
+
+    def side(idx, idx_points):
+        a, b, p = array_points[edges[idx, 0]], array_points[edges[idx, 1]], array_points[idx_points]
+        return (b[:, 0] - a[:, 0]) * (p[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (p[:, 0] - a[:, 0])
+
+    idx_pairs = first[count == 2]
+    if np.any(side(idx_pairs, opposite[idx_pairs]) * side(idx_pairs, opposite[idx_pairs + 1]) >= 0):
+        return False
+
+    # Randkanten: Abstand des Kantenmittelpunkts zur Hüllkante im selben Sektor (Winkel zum Schwerpunkt der Hülle)
+    vertices = hull.points[hull.vertices]
+    center = vertices.mean(axis=0)
+    angles = np.arctan2(vertices[:, 1] - center[1], vertices[:, 0] - center[0])
+    start = np.argmin(angles)
+    vertices, angles = np.roll(vertices, -start, axis=0), np.roll(angles, -start)
+    idx_single = first[count == 1]
+    middle = (array_points[edges[idx_single, 0]] + array_points[edges[idx_single, 1]]) / 2
+    pos = np.searchsorted(angles, np.arctan2(middle[:, 1] - center[1], middle[:, 0] - center[0])) - 1
+    a, b = vertices[np.mod(pos, len(vertices))], vertices[np.mod(pos + 1, len(vertices))]
+    extent = np.ptp(vertices, axis=0).max()
+    distance = (((b[:, 0] - a[:, 0]) * (middle[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (middle[:, 0] - a[:, 0]))
+                / np.hypot(*(b - a).T))
+    if np.any(np.abs(distance) > tol * extent):
+        return False
+
+    # Flächensumme
+    a, b, c = (array_points[simplices[:, i]] for i in range(3))
+    area = np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])).sum() / 2
+
+    return bool(abs(area - hull.volume) <= tol * hull.volume)
+
+
+## Delaunay-Kanten einer Punktmenge, eben oder sphärisch (siehe delaunay_simplices). Mit tile_size werden große
+# Punktmengen gekachelt trianguliert (siehe delaunay_edges_tiled, nur eben).
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] spherical: falls True wird auf der Einheitskugel trianguliert
+# @param[in] tile_size: optionale Anzahl Punkte je Kachel. Default None: eine Triangulation aller Punkte
+# @param[in] n_jobs: Anzahl Threads der gekachelten Triangulation
+# @param[in] progress: optionale Funktion progress(done, total) je Kachel
+# @return: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante, erste Spalte < zweite Spalte
+def delaunay_edges(array_points, spherical=False, tile_size=None, n_jobs=1, progress=None):
+    if tile_size is not None and not spherical and len(array_points) > tile_size:
+        return delaunay_edges_tiled(array_points, tile_size, n_jobs, progress=progress)
+
+    return triangles_to_edges(delaunay_simplices(array_points, spherical))
+
+
+## Gekachelte Delaunay Triangulation für sehr große Punktmengen (eben). Liefert die Kanten der globalen
+# Triangulation (mit shear_points, bis auf sehr viele Punkte auf einem Kreis identisch zu delaunay_edges ohne
+# Kacheln), der Speicherbedarf ist durch die Kachelgröße begrenzt.
+# Die Punkte werden über Quantile in Spalten (x) und je Spalte in Kacheln (y) mit je ca. tile_size Punkten eingeteilt.
+# Die Rechtecke und konvexen Hüllen der Kacheln dienen als räumlicher Index, KD-Bäume werden nur je Kachel für den
+# Inkreistest aufgebaut, es gibt keine globale Struktur über alle Punkte.
+# Jede Kachel wird mit einem Überlappungsbereich (halo, Anteil der Kachelausdehnung) trianguliert. Übernommen werden
+# die Dreiecke mit mindestens einem Eckpunkt der Kachel, deren Umkreis keinen Punkt der Gesamtmenge enthält:
+# - der Umkreis liegt innerhalb des Überlappungsbereichs (alle Punkte darin sind bekannt) oder
+# - der Inkreistest der Punkte der Kacheln, die der Umkreis schneidet, findet keinen Punkt.
+# Diese Dreiecke sind global Delaunay-Dreiecke. Fehlt an einem Punkt der Kachel gegenüber der Soll-Winkelsumme
+# mindestens π/3, werden die gefundenen Punkte in den Umkreisen ergänzt bzw. der Überlappungsbereich verdoppelt und
+# die Kachel erneut trianguliert. Die Soll-Winkelsumme ist 2π bzw. der Innenwinkel auf der lokalen konvexen Hülle,
+# falls deren beiden Kanten auch Kanten der globalen Hülle sind (kein Punkt jenseits der Kante). Jedes Dreieck hat
+# einen Winkel ≥ π/3 und wird damit spätestens von der Kachel dieses Eckpunkts gefunden, die Vereinigung der Kacheln
+# ergibt die globale Triangulation.
+# Bei sehr vielen Punkten auf einem Kreis reicht die Scherung nicht aus und die Kacheln können unterschiedliche
+# Dreiecke wählen. Die Vereinigung wird daher mit is_valid_triangulation geprüft, ist sie ungültig, wird mit einer
+# Warnung ohne Kacheln trianguliert.
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] tile_size: Anzahl Punkte je Kachel
+# @param[in] n_jobs: Anzahl Threads, die die Kacheln parallel triangulieren
+# @param[in] halo: anfänglicher Überlappungsbereich als Anteil der Kachelausdehnung
+# @param[in] progress: optionale Funktion progress(done, total), die nach jeder Kachel aufgerufen wird. Ein Abbruch
+# erfolgt über eine Ausnahme in der Funktion (z.B. CalculationCancelled)
+# @return: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante, sortiert, erste Spalte < zweite Spalte
+def delaunay_edges_tiled(array_points, tile_size=50000, n_jobs=1, halo=0.1, progress=None):
+    from concurrent.futures import ThreadPoolExecutor
+    from scipy.spatial import ConvexHull, Delaunay, QhullError, cKDTree
+
+    array_points = np.asarray(array_points, dtype=float)
+    n = len(array_points)
+
+    # Kacheln: Spalten nach x, je Spalte Kacheln nach y mit je ca. tile_size Punkten
+    order_x = np.argsort(array_points[:, 0], kind="stable")
+    tile_of = np.empty(n, dtype=np.int32)
+    list_tiles = []
+    n_columns = int(np.ceil(np.sqrt(np.ceil(n / tile_size))))
+    for column in np.array_split(order_x, n_columns):
+        column = column[np.argsort(array_points[column, 1], kind="stable")]
+        for idx_tile in np.array_split(column, int(np.ceil(len(column) / tile_size))):
+            tile_of[idx_tile] = len(list_tiles)
+            list_tiles.append(np.sort(idx_tile))
+    del order_x
+
+    # Rechtecke und Eckpunkte der konvexen Hülle der Kacheln (gescherte Koordinaten, Ursprung wie für die Gesamtmenge)
+    origin = (array_points.min(axis=0) + array_points.max(axis=0)) / 2
+    tiles_min = np.empty((len(list_tiles), 2))
+    tiles_max = np.empty((len(list_tiles), 2))
+    list_hulls = []
+    for no_tile, idx_tile in enumerate(list_tiles):
+        points = shear_points(array_points[idx_tile], origin)
+        tiles_min[no_tile] = points.min(axis=0)
+        tiles_max[no_tile] = points.max(axis=0)
+        try:
+            vertices = ConvexHull(points).vertices
+        except QhullError:
+            vertices = np.arange(len(points))[np.lexsort((points[:, 1], points[:, 0]))][[0, -1]]
+        # Richtungswinkel der Kanten (gegen den Uhrzeigersinn aufsteigend) ab der ersten Kante
+        edges = np.roll(points[vertices], -1, axis=0) - points[vertices]
+        angles = np.arctan2(edges[:, 1], edges[:, 0])
+        list_hulls.append((idx_tile[vertices], points[vertices], angles[0], np.mod(angles - angles[0], 2 * np.pi)))
+    global_min = tiles_min.min(axis=0)
+    global_max = tiles_max.max(axis=0)
+    extent = global_max - global_min
+    spacing = np.sqrt(np.prod(extent) / n) if np.prod(extent) > 0 else extent.max() / n
+
+    def points_in_box(box_min, box_max):
+        list_idx = []
+        for no_tile in np.flatnonzero(np.all(tiles_min <= box_max, axis=1) & np.all(tiles_max >= box_min, axis=1)):
+            idx_tile = list_tiles[no_tile]
+            points = shear_points(array_points[idx_tile], origin)
+            list_idx.append(idx_tile[np.all((points >= box_min) & (points <= box_max), axis=1)])
+
+        return np.concatenate(list_idx)
+
+    def is_circle_known(center, radius, box_min, box_max):
+        # Umkreis ohne Schnitt mit den Streifen der Gesamtausdehnung außerhalb des Überlappungsbereichs
+        list_strips = []
+        if box_min[0] > global_min[0]:
+            list_strips.append((global_min, np.array([box_min[0], global_max[1]])))
+        if box_max[0] < global_max[0]:
+            list_strips.append((np.array([box_max[0], global_min[1]]), global_max))
+        if box_min[1] > global_min[1]:
+            list_strips.append((global_min, np.array([global_max[0], box_min[1]])))
+        if box_max[1] < global_max[1]:
+            list_strips.append((np.array([global_min[0], box_max[1]]), global_max))
+
+        is_known = np.isfinite(radius)
+        for rect_min, rect_max in list_strips:
+            is_known &= distance_to_rect(center, rect_min, rect_max) >= radius
+
+        return is_known
+
+    def find_conflicts(centers, radii, vertices, lines, inner, idx_local):
+        # Punkte (max. 7 je Konflikt, nicht in idx_local) innerhalb der Umkreise (Mittelpunkt, Radius, Eckpunkte je
+        # Dreieck) bzw. jenseits der Hüllkanten (Array Anzahl x 2 x 2, Innenseite mit dem Punkt inner).
+        # Je Umkreis sind die nächsten Punkte zum Mittelpunkt (KD-Baum je Kachel) entscheidend, je Hüllkante die
+        # Eckpunkte der konvexen Hülle der Kacheln.
+        list_conflict, list_idx, list_key = [], [], []
+
+        # Kacheln vollständig innerhalb eines Umkreises: Eckpunkte der Hülle der Kachel außerhalb idx_local genügen
+        is_found = np.zeros(len(centers), dtype=bool)
+        for no_tile, (idx_hull, points_hull, _, _) in enumerate(list_hulls):
+            distance_max = np.hypot(*np.maximum(np.abs(centers - tiles_min[no_tile]),
+                                                np.abs(centers - tiles_max[no_tile])).T)
+            no_circles = np.flatnonzero(~is_found & (distance_max < radii * (1 - 1e-9)))
+            is_other = ~np.isin(idx_hull, idx_local)
+            if len(no_circles) == 0 or not is_other.any():
+                continue
+            idx_hull, points_hull = idx_hull[is_other], points_hull[is_other]
+            distance = np.hypot(centers[no_circles, None, 0] - points_hull[None, :, 0],
+                                centers[no_circles, None, 1] - points_hull[None, :, 1])
+            col = np.argsort(distance, axis=1)[:, :3]
+            list_conflict.append(np.repeat(no_circles, col.shape[1]))
+            list_idx.append(idx_hull[col].ravel())
+            list_key.append(np.take_along_axis(distance, col, axis=1).ravel())
+            is_found[no_circles] = True
+
+        # übrige Kacheln nach Abstand, Konflikte mit gefundenen Punkten werden nicht weiter geprüft
+        normals = np.column_stack([lines[:, 0, 1] - lines[:, 1, 1], lines[:, 1, 0] - lines[:, 0, 0]])
+        normals *= np.sign((normals * (inner - lines[:, 0])).sum(axis=1))[:, None]
+        offsets = (normals * lines[:, 0]).sum(axis=1)
+        is_found_line = np.zeros(len(lines), dtype=bool)
+        for no_tile in np.argsort(distance_to_rect(inner, tiles_min, tiles_max), kind="stable"):
+            idx_tile = list_tiles[no_tile]
+            no_circles = np.flatnonzero(~is_found & (distance_to_rect(centers, tiles_min[no_tile], tiles_max[no_tile])
+                                                     < radii))
+            if len(no_circles) > 0:
+                points = shear_points(array_points[idx_tile], origin)
+                distance, nearest = cKDTree(points).query(centers[no_circles], k=min(7, len(points)))
+                distance, nearest = distance.reshape(len(no_circles), -1), nearest.reshape(len(no_circles), -1)
+                row, col = np.nonzero(distance < radii[no_circles, None] * (1 + 1e-9))
+                no_circle, idx = no_circles[row], nearest[row, col]
+                is_inside = incircle(*vertices[no_circle].transpose(1, 0, 2), points[idx]) > 0
+                is_inside &= ~np.isin(idx_tile[idx], idx_local)
+                list_conflict.append(no_circle[is_inside])
+                list_idx.append(idx_tile[idx[is_inside]])
+                list_key.append(distance[row, col][is_inside])
+                is_found[no_circle[is_inside]] = True
+
+            # Seite der Ecken des Rechtecks und des äußersten Hüllpunkts der Kachel (Binärsuche über die
+            # Kantenwinkel, mit Nachbarn): < 0 jenseits der Hüllkante
+            corners = np.array([tiles_min[no_tile], tiles_max[no_tile], [tiles_min[no_tile, 0], tiles_max[no_tile, 1]],
+                                [tiles_max[no_tile, 0], tiles_min[no_tile, 1]]])
+            no_lines = np.flatnonzero(~is_found_line & (normals @ corners.T < offsets[:, None]).any(axis=1))
+            idx_hull, points_hull, angle_first, angles_hull = list_hulls[no_tile]
+            angle = np.arctan2(-normals[no_lines, 1], -normals[no_lines, 0]) + np.pi / 2 - angle_first
+            pos = np.searchsorted(angles_hull, np.mod(angle, 2 * np.pi))[:, None] + np.arange(-1, 2)
+            col = np.mod(pos, len(idx_hull))
+            side = (normals[no_lines, None, :] * points_hull[col]).sum(axis=2) - offsets[no_lines, None]
+            is_beyond = (side < 0) & ~np.isin(idx_hull[col], idx_local)
+            row, col = np.nonzero(is_beyond)
+            col = np.mod(pos[row, col], len(idx_hull))
+            no_line = no_lines[row]
+            is_found_line[no_line] = True
+            list_conflict.append(len(centers) + no_line)
+            list_idx.append(idx_hull[col])
+            list_key.append(side[is_beyond])
+
+        conflict = np.concatenate(list_conflict)
+        idx = np.concatenate(list_idx)
+        key = np.concatenate(list_key)
+        is_other = ~np.isin(idx, idx_local)
+        conflict, idx, key = conflict[is_other], idx[is_other], key[is_other]
+
+        # je Konflikt die 7 Punkte am weitesten innerhalb des Umkreises bzw. jenseits der Hüllkante
+        order = np.lexsort((key, conflict))
+        conflict, idx = conflict[order], idx[order]
+        is_first = np.arange(len(conflict)) - np.searchsorted(conflict, conflict) < 7
+        has_conflict = np.zeros(len(centers) + len(lines), dtype=bool)
+        has_conflict[conflict] = True
+
+        return conflict[is_first], idx[is_first], has_conflict[:len(centers)], has_conflict[len(centers):]
+
+    def triangulate_tile(no_tile):
+        size = np.maximum(tiles_max[no_tile] - tiles_min[no_tile], spacing)
+        factor = halo
+        idx_extra = np.empty(0, dtype=np.int64)
+        # global bestätigte Dreiecke (sortierte Punktindizes) der vorherigen Iterationen
+        set_certified = set()
+        while True:
+            box_min = tiles_min[no_tile] - factor * size
+            box_max = tiles_max[no_tile] + factor * size
+            is_global = bool(np.all(box_min <= global_min) and np.all(box_max >= global_max))
+
+            # Punkte im Überlappungsbereich und der Konfliktbereiche der vorherigen Iterationen
+            idx_local = np.union1d(points_in_box(box_min, box_max), idx_extra)
+            points = shear_points(array_points[idx_local], origin)
+            try:
+                tri = Delaunay(points)
+            except QhullError:
+                if is_global:
+                    raise
+                factor *= 2
+                continue
+
+            is_own = tile_of[idx_local] == no_tile
+            simplices = tri.simplices[is_own[tri.simplices].any(axis=1)]
+            if is_global:
+                return np.sort(idx_local[simplices], axis=1)
+
+            # Dreiecke mit leerem Umkreis innerhalb des Überlappungsbereichs
+            center, radius = triangle_circumcircles(points, simplices)
+            is_empty = is_circle_known(center, radius, box_min, box_max)
+            keys = np.sort(idx_local[simplices], axis=1)
+            if set_certified:
+                idx_open = np.flatnonzero(~is_empty)
+                is_empty[idx_open] = [tuple(key) in set_certified for key in keys[idx_open].tolist()]
+            angles = triangle_angles(points, simplices)
+
+            def angle_deficit(angle_expected):
+                is_counted = is_empty[:, None] & is_own[simplices]
+                angle_sum = np.bincount(simplices[is_counted], weights=angles[is_counted], minlength=len(idx_local))
+                return np.where(is_own, angle_expected - angle_sum, 0)
+
+            angle_expected = np.full(len(idx_local), 2 * np.pi)
+            is_incomplete = angle_deficit(angle_expected) >= np.pi / 3 - 1e-6
+            if not is_incomplete.any():
+                return keys[is_empty]
+
+            # exakte Prüfung der übrigen Dreiecke an unvollständigen Punkten und der Kanten der lokalen Hülle
+            idx_circles = np.flatnonzero(~is_empty & np.isfinite(radius) & is_incomplete[simplices].any(axis=1))
+            hull_edges = tri.convex_hull
+            hull_edges = hull_edges[is_incomplete[hull_edges].any(axis=1)]
+            conflict, idx_new, has_conflict_circles, has_conflict_lines = find_conflicts(
+                center[idx_circles], radius[idx_circles], points[simplices[idx_circles]], points[hull_edges],
+                points.mean(axis=0), idx_local)
+            is_empty[idx_circles[~has_conflict_circles]] = True
+            set_certified.update(map(tuple, keys[idx_circles[~has_conflict_circles]].tolist()))
+
+            # Innenwinkel an Punkten, deren beide Kanten der lokalen Hülle auch globale Hüllkanten sind
+            edges_global = hull_edges[~has_conflict_lines]
+            vertices = np.concatenate([edges_global[:, 0], edges_global[:, 1]])
+            neighbours = np.concatenate([edges_global[:, 1], edges_global[:, 0]])
+            order = np.argsort(vertices, kind="stable")
+            vertices, neighbours = vertices[order], neighbours[order]
+            is_pair = np.flatnonzero(vertices[1:] == vertices[:-1])
+            angle_expected[vertices[is_pair]] = triangle_angles(
+                points, np.column_stack([vertices[is_pair], neighbours[is_pair], neighbours[is_pair + 1]]))[:, 0]
+
+            is_incomplete = angle_deficit(angle_expected) >= np.pi / 3 - 1e-6
+            if not is_incomplete.any():
+                return keys[is_empty]
+
+            # gefundene Punkte an weiterhin unvollständigen Punkten ergänzen (wie beim Einfügen nach Bowyer-Watson).
+            # Ohne neue Punkte oder bei mehr Zusatzpunkten als die Kachelgröße wird der Überlappungsbereich verdoppelt.
+            is_relevant = np.concatenate([is_incomplete[simplices[idx_circles]].any(axis=1),
+                                          is_incomplete[hull_edges].any(axis=1)])
+            n_extra = len(idx_extra)
+            idx_extra = np.union1d(idx_extra, idx_new[is_relevant[conflict]])
+            if len(idx_extra) == n_extra or len(idx_extra) > tile_size:
+                idx_extra = np.empty(0, dtype=np.int64)
+                factor *= 2
+
+    list_simplices = []
+    pool = ThreadPoolExecutor(max_workers=max(1, n_jobs))
+    try:
+        for simplices in pool.map(triangulate_tile, range(len(list_tiles))):
+            list_simplices.append(simplices)
+            if progress is not None:
+                progress(len(list_simplices), len(list_tiles))
+    finally:
+        # bei Abbruch keine weiteren Kacheln triangulieren
+        pool.shutdown(cancel_futures=True)
+
+    # Dreiecke mehrerer Kacheln nur einmal. Widersprechen sich die Kacheln (z.B. bei sehr vielen Punkten auf einem
+    # Kreis unterhalb der Genauigkeit der Scherung), ist die Vereinigung keine Triangulation: dann ohne Kacheln
+    simplices = np.unique(np.concatenate(list_simplices), axis=0)
+    del list_simplices
+    if not is_valid_triangulation(shear_points(array_points, origin), simplices,
+                                  np.concatenate([hull[1] for hull in list_hulls])):
+        logging.warning("Die gekachelte Triangulation ist nicht eindeutig (z.B. viele Punkte auf einem Kreis), "
+                        "es wird ohne Kacheln trianguliert")
+        return triangles_to_edges(delaunay_simplices(array_points))
+
+    return triangles_to_edges(simplices)
+
+
+## Delaunay Triangulation verschachtelter Punktmengen (Stufe 1 ⊂ Stufe 2 ⊂ ...).
+# Stufen ohne neue Punkte übernehmen die Kanten der vorherigen Stufe. Im inkrementellen Modus wird die
+# Triangulation einmalig von Qhull aufgebaut und je Stufe um die neuen Punkte ergänzt (Qhull add_points), sonst wird
+# je Stufe neu trianguliert. Das Ergänzen ist nur bei kleinen Netzen schneller, da Qhull dabei je Aufruf die
+# gesamte Triangulation nachbearbeitet.
+# @param[in] array_points: Array mit den x- & y-Koordinaten aller Punkte, sortiert nach Stufe (aufsteigend)
+# @param[in] list_n_points: Anzahl der Punkte je Stufe (kumuliert, aufsteigend)
+# @param[in] incremental: falls True wird die Triangulation inkrementell ergänzt (nur eben und ohne tile_size)
+# @param[in] spherical: falls True wird auf der Einheitskugel trianguliert (siehe delaunay_simplices)
+# @param[in] progress: optionale Funktion progress(done, total), die nach jeder Stufe aufgerufen wird. Ein Abbruch
+# erfolgt über eine Ausnahme in der Funktion (z.B. CalculationCancelled)
+# @param[in] tile_size: optionale Anzahl Punkte je Kachel für Stufen mit mehr Punkten (siehe delaunay_edges_tiled)
+# @param[in] n_jobs: Anzahl Threads der gekachelten Triangulation
+# @param[in] progress_tiles: optionale Funktion progress(done, total) je Kachel
+# @return: Liste mit den Kanten (Array Anzahl Kanten x 2, Indizes in array_points) je Stufe. None, falls für die Stufe
+# keine Triangulation möglich ist (weniger als 3 Punkte oder alle Punkte auf einer Geraden)
+def delaunay_edges_nested(array_points, list_n_points, incremental=False, spherical=False, progress=None,
+                          tile_size=None, n_jobs=1, progress_tiles=None):
+    from scipy.spatial import Delaunay, QhullError
+
+    tri = None
+    n_prev = -1
+    edges = None
+    list_edges = []
+    origin = None
+    try:
+        for n in list_n_points:
+            if n == n_prev:
+                # keine neuen Punkte in der Stufe
+                pass
+            elif n < 3:
+                edges = None
+            elif tri is not None:
+                # neue Punkte der Stufe ergänzen
+                tri.add_points(shear_points(array_points[tri.npoints:n], origin))
+                edges = triangles_to_edges(tri.simplices)
+            elif incremental and not spherical and tile_size is None:
+                try:
+                    # Scherung mit dem Mittelpunkt aller Stufen
+                    origin = (array_points.min(axis=0) + array_points.max(axis=0)) / 2
+                    tri = Delaunay(shear_points(array_points[:n], origin), incremental=True)
+                    edges = triangles_to_edges(tri.simplices)
+                except QhullError:
+                    edges = None
+            else:
+                try:
+                    edges = delaunay_edges(array_points[:n], spherical, tile_size, n_jobs, progress_tiles)
+                except QhullError:
+                    edges = None
+            n_prev = n
+            list_edges.append(edges)
+
+            if progress is not None:
+                progress(len(list_edges), len(list_n_points))
+    finally:
+        if tri is not None:
+            tri.close()
+
+    return list_edges
+
+
+## Erzeugt aus der oberen Dreiecksmatrix die vollständige, symmetrische Adjazenzmatrix
+# @param[in] matrix_upper: obere Dreiecksmatrix (scipy.sparse)
+# @return: symmetrische scipy.sparse.csr_matrix (bool)
+def upper_csr_to_symmetric(matrix_upper):
+    matrix = (matrix_upper + matrix_upper.T).tocsr().astype(bool)
+    matrix.sort_indices()
+
+    return matrix
+
+
+## Vereinigt die Kanten mehrerer oberer Dreiecksmatrizen (z.B. mehrerer VFS) zu einer Kantenliste.
+# Je Kante wird eine Bitmaske der Matrizen gebildet, in denen die Kante enthalten ist (Bit i = Matrix i, max. 64).
+# @param[in] list_matrices: Liste oberer Dreiecksmatrizen (scipy.sparse) gleicher Dimension
+# @return idx_from, idx_to, mask: Vektoren der Kanten (idx_from < idx_to, sortiert) und Bitmaske (uint64) je Kante
+def merge_upper_csr_edges(list_matrices):
+    if len(list_matrices) > 64:
+        raise ValueError("Es werden maximal 64 VFS unterstützt")
+    if len(list_matrices) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+
+    n = list_matrices[0].shape[1]
+    list_keys = []
+    list_bits = []
+    for pos, matrix in enumerate(list_matrices):
+        matrix = matrix.tocoo()
+        list_keys.append(matrix.row.astype(np.int64) * n + matrix.col)
+        list_bits.append(np.full(matrix.nnz, np.uint64(1) << np.uint64(pos), dtype=np.uint64))
+
+    keys, idx_key = np.unique(np.concatenate(list_keys), return_inverse=True)
+    mask = np.zeros(len(keys), dtype=np.uint64)
+    np.bitwise_or.at(mask, idx_key, np.concatenate(list_bits))
+    idx_from, idx_to = np.divmod(keys, n)
+
+    return idx_from, idx_to, mask
+
+
+## Bestimmt je Kante die Position der kleinsten (nach Namen sortierten) VFS in der Bitmaske.
+# @param[in] mask: Bitmaske (uint64) je Kante, Bit i = list_vfs[i]
+# @param[in] list_vfs: Liste der VFS-Namen in Reihenfolge der Bits
+# @return: Vektor mit der Position in list_vfs je Kante (-1 falls keine VFS gesetzt ist)
+def mask_to_min_vfs_position(mask, list_vfs):
+    position = np.full(len(mask), -1, dtype=np.int64)
+    # absteigend nach Namen überschreiben -> zuletzt bleibt die kleinste VFS stehen
+    for pos in sorted(range(len(list_vfs)), key=lambda i: list_vfs[i], reverse=True):
+        position[(mask >> np.uint64(pos)) & np.uint64(1) > 0] = pos
+
+    return position
+
+
+## Bitmaske einer Auswahl von VFS
+# @param[in] list_vfs_selected: ausgewählte VFS
+# @param[in] list_vfs: Liste der VFS-Namen in Reihenfolge der Bits
+# @return: Bitmaske (np.uint64)
+def vfs_to_mask(list_vfs_selected, list_vfs):
+    mask = np.uint64(0)
+    for vfs in list_vfs_selected:
+        mask |= np.uint64(1) << np.uint64(list_vfs.index(vfs))
+
+    return mask
+
+
+## Ermittelt die Entfernung (Anzahl Schritte) aller innerhalb von max_steps Schritten erreichbaren Knoten über eine
+# begrenzte Breitensuche.
+# Die Breitensuche wird für alle Startknoten gleichzeitig durchgeführt: Die Front besteht aus Paaren
+# (Startknoten, erreichter Knoten), die je Schritt über die CSR-Struktur (indptr/indices) um die Nachbarn erweitert
+# werden. Bereits besuchte Paare werden verworfen. Aufwand O(n * deg^k).
+# @param[in] matrix_symm: symmetrische Adjazenzmatrix (scipy.sparse CSR)
+# @param[in] max_steps: maximale Entfernung (Schritte), höchstens 255
+# @param[in] progress: optionale Funktion progress(done, total), die nach jedem Schritt aufgerufen wird. Ein Abbruch
+# erfolgt über eine Ausnahme in der Funktion (z.B. CalculationCancelled)
+# @return: obere Dreiecksmatrix (scipy.sparse CSR, uint8) mit der Entfernung 1 ... max_steps je Knotenpaar
+def calculate_hop_distances_k_steps(matrix_symm, max_steps, progress=None):
+    from scipy import sparse
+
+    if max_steps > np.iinfo(np.uint8).max:
+        raise ValueError("Die maximale Entfernung ist auf 255 Schritte begrenzt")
+
+    n = matrix_symm.shape[0]
+    indptr = matrix_symm.indptr.astype(np.int64)
+    indices = matrix_symm.indices.astype(np.int64)
+
+    # Start: jeder Knoten erreicht sich selbst (Schlüssel = Start * n + Knoten)
+    front_start = np.arange(n, dtype=np.int64)
+    front_node = front_start.copy()
+    visited = front_start * n + front_node
+    list_keys = []
+    list_steps = []
+
+    for step in range(1, max_steps + 1):
+        # Nachbarn aller Knoten der Front
+        degree = indptr[front_node + 1] - indptr[front_node]
+        if degree.sum() == 0:
+            break
+        offsets = np.arange(degree.sum(), dtype=np.int64) - np.repeat(np.cumsum(degree) - degree, degree)
+        next_node = indices[np.repeat(indptr[front_node], degree) + offsets]
+        next_start = np.repeat(front_start, degree)
+
+        # nur neue Paare bilden die nächste Front
+        keys = np.unique(next_start * n + next_node)
+        keys = keys[~np.isin(keys, visited, assume_unique=True)]
+        if len(keys) == 0:
+            break
+
+        visited = np.union1d(visited, keys)
+        front_start, front_node = np.divmod(keys, n)
+
+        # Paare der oberen Dreiecksmatrix mit der Entfernung des Schritts
+        is_upper = front_start < front_node
+        list_keys.append(keys[is_upper])
+        list_steps.append(np.full(is_upper.sum(), step, dtype=np.uint8))
+
+        if progress is not None:
+            progress(step, max_steps)
+
+    keys = np.concatenate(list_keys) if list_keys else np.zeros(0, dtype=np.int64)
+    steps = np.concatenate(list_steps) if list_steps else np.zeros(0, dtype=np.uint8)
+    idx_from, idx_to = np.divmod(keys, n)
+
+    # je Paar genau ein Eintrag, daher keine Summierung von Duplikaten
+    return sparse.csr_matrix((steps, (idx_from, idx_to)), shape=(n, n), dtype=np.uint8)
+
+
+## Ermittelt die innerhalb von max_steps Schritten erreichbaren Knoten über eine begrenzte Breitensuche
+# (siehe calculate_hop_distances_k_steps).
+# @param[in] matrix_symm: symmetrische Adjazenzmatrix (scipy.sparse CSR)
+# @param[in] max_steps: maximale Entfernung (Schritte)
+# @param[in] progress: optionale Funktion progress(done, total), siehe calculate_hop_distances_k_steps
+# @return: obere Dreiecksmatrix (scipy.sparse CSR, bool) der Knotenpaare mit Entfernung 1 ... max_steps
+def calculate_reachability_k_steps(matrix_symm, max_steps, progress=None):
+    return calculate_hop_distances_k_steps(matrix_symm, max_steps, progress).astype(bool)
+
+
+## Ordnet den Nachbarschaftslisten (CSR-Format) Bezeichnungen zu, z.B. Bezirksnummern oder -namen.
+# @param[in] indptr: Zeiger auf den Beginn der Nachbarschaftsliste je Bezirk
+# @param[in] indices: Indizes der Nachbarn
+# @param[in] labels: Array mit der Bezeichnung je Index
+# @return: Liste mit einem Array der Bezeichnungen der Nachbarn je Bezirk
+def neighbour_lists_to_labels(indptr, indices, labels):
+    return np.split(np.asarray(labels)[indices], indptr[1:-1])
+
+
+## Klassengrenzen des Histogramms der Anzahl Verbindungen je Bezirk (Untergrenzen, letzte Klasse offen)
+DEGREE_BINS = (0, 1, 2, 3, 4, 5, 6, 11, 21, 51, 101)
+
+
+## Kennwerte der Anzahl Verbindungen (Grad) je Bezirk: Histogramm, Bezirke ohne Verbindung und Bezirke mit den
+# meisten Verbindungen. Aufwand linear in der Anzahl der Bezirke.
+# @param[in] degree: Anzahl Verbindungen je Bezirk
+# @param[in] labels: Bezeichnung je Bezirk (z.B. Bezirksnamen)
+# @param[in] is_active: optionale Maske der berücksichtigten Bezirke, default alle Bezirke
+# @param[in] top_n: Anzahl der aufgeführten Bezirke (ohne Verbindung bzw. mit den meisten Verbindungen)
+# @return: Dict mit zones, degree_mean, degree_max, histogram (Klasse -> Anzahl Bezirke, nur besetzte Klassen),
+# isolated (Anzahl Bezirke ohne Verbindung), isolated_zones (Liste der ersten top_n Bezeichnungen) und top_zones
+# (Liste der top_n Tupel Bezeichnung, Anzahl Verbindungen absteigend)
+def summarize_degrees(degree, labels, is_active=None, top_n=5):
+    degree = np.asarray(degree)
+    labels = np.asarray(labels)
+    if is_active is not None:
+        degree = degree[is_active]
+        labels = labels[is_active]
+
+    counts = np.bincount(np.searchsorted(DEGREE_BINS, degree, side="right") - 1, minlength=len(DEGREE_BINS))
+    histogram = {}
+    for lower, upper, count in zip(DEGREE_BINS, DEGREE_BINS[1:] + (None,), counts):
+        if count == 0:
+            continue
+        if upper is None:
+            histogram[f">={lower}"] = int(count)
+        elif upper - lower == 1:
+            histogram[str(lower)] = int(count)
+        else:
+            histogram[f"{lower}-{upper - 1}"] = int(count)
+
+    idx_isolated = np.flatnonzero(degree == 0)
+    # Bezirke mit den meisten Verbindungen ohne vollständige Sortierung
+    idx_top = np.argpartition(-degree, min(top_n, len(degree)) - 1)[:top_n] if len(degree) > 0 else np.zeros(0, int)
+    idx_top = idx_top[np.argsort(-degree[idx_top], kind="stable")]
+
+    return {"zones": len(degree),
+            "degree_mean": float(degree.mean()) if len(degree) > 0 else 0.0,
+            "degree_max": int(degree.max()) if len(degree) > 0 else 0,
+            "histogram": histogram,
+            "isolated": len(idx_isolated),
+            "isolated_zones": labels[idx_isolated[:top_n]].tolist(),
+            "top_zones": [(labels[i], int(degree[i])) for i in idx_top]}
 
 
 ## Berechnung der Distanz zwischen Koordinaten (Lat, Lon)
@@ -139,18 +948,585 @@ def get_nearest_points_from_set(x_point, y_point, array_points, formula, n=None)
     return list_indizes
 
 
+## Projiziert Lon/Lat Koordinaten (Grad) auf die Einheitskugel.
+# Die euklidische Distanz (Sehne) zwischen den Punkten ist monoton zur Großkreisdistanz, daher liefert eine
+# Nächste-Nachbarn-Suche auf den 3D-Punkten dieselbe Reihenfolge wie die Haversine Formel.
+# @param[in] vec_lon: Vektor der x-Koordinaten (Längengrad)
+# @param[in] vec_lat: Vektor der y-Koordinaten (Breitengrad)
+# @return Array (Anzahl Punkte x 3) mit den kartesischen Koordinaten auf der Einheitskugel
+def lonlat_to_unit_sphere(vec_lon, vec_lat):
+    vec_lon = np.radians(np.asarray(vec_lon, dtype=float))
+    vec_lat = np.radians(np.asarray(vec_lat, dtype=float))
+    cos_lat = np.cos(vec_lat)
+
+    return np.column_stack([cos_lat * np.cos(vec_lon), cos_lat * np.sin(vec_lon), np.sin(vec_lat)])
+
+
+## Sphärische Delaunay Triangulation von Lon/Lat Koordinaten (Grad).
+# Die Punkte werden auf die Einheitskugel projiziert, die konvexe Hülle der 3D-Punkte entspricht der Delaunay
+# Triangulation auf der Kugel (Aufwand O(n log n)). Liegen alle Punkte auf einer Halbkugel, enthält die Hülle zusätzlich
+# Dreiecke der "Rückseite", deren Ebene den Ursprung nicht einschließt. Diese werden verworfen, damit verbleiben wie
+# bei der ebenen Triangulation die Dreiecke innerhalb der (sphärischen) konvexen Hülle.
+# Anmerkung: Punkte an den Polen mit unterschiedlichem Längengrad fallen auf denselben Punkt der Kugel.
+# @param[in] vec_lon: Vektor der x-Koordinaten (Längengrad)
+# @param[in] vec_lat: Vektor der y-Koordinaten (Breitengrad)
+# @return: Array (Anzahl Dreiecke x 3) mit den Punktindizes der Dreiecke
+def spherical_delaunay_simplices(vec_lon, vec_lat):
+    from scipy.spatial import ConvexHull
+
+    hull = ConvexHull(lonlat_to_unit_sphere(vec_lon, vec_lat))
+
+    # Hyperebene: normal * x + offset <= 0 innerhalb der Hülle. offset > 0: Ursprung außerhalb -> Rückseite
+    return hull.simplices[hull.equations[:, -1] <= 0]
+
+
+# ====== Nachbarschaftsgraphen =====
+
+## Verfügbare Nachbarschaftsgraphen (siehe LuftlinienCalculator, Parameter graph)
+GRAPHS = ("delaunay", "gabriel", "rng", "knn", "max_length")
+
+## relative Toleranz für Punkte auf dem Rand der Prüfkreise (Gabriel-Graph, Relative Neighbourhood Graph)
+GRAPH_TOLERANCE = 1e-9
+
+
+## Länge je Kante in einem vektorisierten Schritt
+# @param[in] array_points: Array mit den x- & y-Koordinaten der Punkte
+# @param[in] idx_from: Vektor der Punktindizes Anfang
+# @param[in] idx_to: Vektor der Punktindizes Ende
+# @param[in] formula: Distanzfunktion "euclidean" (Koordinateneinheit) oder "haversine" (Lon/Lat in Grad, Länge in km)
+# @return: Vektor mit der Länge je Kante
+def calculate_edge_lengths(array_points, idx_from, idx_to, formula="euclidean"):
+    array_points = np.asarray(array_points, dtype=float)
+    points_from = array_points[idx_from]
+    points_to = array_points[idx_to]
+
+    if formula == "haversine":
+        # approximate radius of earth in km (siehe calculate_distance_coordinates_haversine)
+        R = 6373.0
+        lon1, lat1 = np.radians(points_from[:, 0]), np.radians(points_from[:, 1])
+        lon2, lat2 = np.radians(points_to[:, 0]), np.radians(points_to[:, 1])
+        tmp = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return R * 2 * np.arcsin(np.sqrt(tmp))
+    elif formula == "euclidean":
+        return np.hypot(points_to[:, 0] - points_from[:, 0], points_to[:, 1] - points_from[:, 1])
+    else:
+        raise ValueError(f"Fall Abstandsberechnung ist nicht implementiert: {formula}")
+
+
+## Gabriel-Graph als Teilgraph einer Delaunay Triangulation.
+# Eine Kante p-q ist enthalten, falls der Kreis mit dem Durchmesser p-q keinen weiteren Punkt enthält. Geprüft wird über
+# eine Abfrage des KD-Baums je Kante (nächste Punkte zum Kantenmittelpunkt), Aufwand O(Anzahl Kanten * log n).
+# @param[in] array_points: Array (Anzahl Punkte x Dimension) der Punkte, z.B. x- & y-Koordinaten oder Punkte auf der
+# Einheitskugel (lonlat_to_unit_sphere)
+# @param[in] edges: Array (Anzahl Kanten x 2) mit den Punktindizes der Delaunay-Kanten
+# @param[in] tree: optionaler KD-Baum (scipy.spatial.cKDTree) über array_points
+# @return: Array (Anzahl Kanten x 2) mit den Kanten des Gabriel-Graphen
+def gabriel_edges(array_points, edges, tree=None):
+    array_points = np.asarray(array_points, dtype=float)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if len(edges) == 0:
+        return edges
+    if tree is None:
+        from scipy.spatial import cKDTree
+        tree = cKDTree(array_points)
+
+    points_from = array_points[edges[:, 0]]
+    points_to = array_points[edges[:, 1]]
+    radius = np.linalg.norm(points_to - points_from, axis=1) / 2
+
+    # liegt ein weiterer Punkt im Kreis, ist er näher am Mittelpunkt als die Endpunkte der Kante
+    k = min(3, len(array_points))
+    dist, idx = tree.query((points_from + points_to) / 2, k=k)
+    dist = dist.reshape(-1, k)
+    idx = idx.reshape(-1, k)
+    is_inside = ((idx != edges[:, [0]]) & (idx != edges[:, [1]])
+                 & (dist < radius[:, None] * (1 - GRAPH_TOLERANCE)))
+
+    return edges[~is_inside.any(axis=1)]
+
+
+## Relative Neighbourhood Graph als Teilgraph einer Delaunay Triangulation.
+# Eine Kante p-q ist enthalten, falls kein Punkt r näher an p und an q liegt als p und q zueinander (leere "Linse").
+# Der RNG ist ein Teilgraph des Gabriel-Graphen, daher werden nur dessen Kanten geprüft. Die Punkte der Linse liegen im
+# Kreis um p mit dem Radius |p-q|, sie werden über den KD-Baum gesucht (Anzahl Nachbarn je Durchlauf verdoppelt, bis
+# der Kreis vollständig durchsucht ist).
+# @param[in] array_points: Array (Anzahl Punkte x Dimension) der Punkte (siehe gabriel_edges)
+# @param[in] edges: Array (Anzahl Kanten x 2) mit den Punktindizes der Delaunay-Kanten
+# @param[in] tree: optionaler KD-Baum (scipy.spatial.cKDTree) über array_points
+# @return: Array (Anzahl Kanten x 2) mit den Kanten des Relative Neighbourhood Graph
+def relative_neighbourhood_edges(array_points, edges, tree=None):
+    array_points = np.asarray(array_points, dtype=float)
+    if tree is None:
+        from scipy.spatial import cKDTree
+        tree = cKDTree(array_points)
+
+    edges = gabriel_edges(array_points, edges, tree)
+    n = len(array_points)
+    idx_p = edges[:, 0]
+    idx_q = edges[:, 1]
+    length = np.linalg.norm(array_points[idx_q] - array_points[idx_p], axis=1) * (1 - GRAPH_TOLERANCE)
+
+    is_rng = np.ones(len(edges), dtype=bool)
+    todo = np.arange(len(edges))
+    k = 8
+    while len(todo) > 0:
+        k = min(k, n)
+        dist, idx = tree.query(array_points[idx_p[todo]], k=k)
+        dist = dist.reshape(-1, k)
+        idx = idx.reshape(-1, k)
+
+        # Punkte der Linse: näher an p und an q als die Kantenlänge
+        is_near_p = (dist < length[todo, None]) & (idx != idx_q[todo, None]) & (idx != idx_p[todo, None])
+        dist_q = np.linalg.norm(array_points[idx] - array_points[idx_q[todo], None], axis=-1)
+        in_lune = (is_near_p & (dist_q < length[todo, None])).any(axis=1)
+        is_rng[todo[in_lune]] = False
+
+        # Kreis um p noch nicht vollständig durchsucht
+        todo = todo[~in_lune & (dist[:, -1] < length[todo]) & (k < n)]
+        k *= 2
+
+    return edges[is_rng]
+
+
+## k-Nächste-Nachbarn-Graph über einen KD-Baum: jeder Punkt wird mit seinen k nächstgelegenen Punkten verbunden
+# (ungerichtet, d.h. Vereinigung der Nachbarschaften). Aufwand O(n * k * log n).
+# @param[in] array_points: Array (Anzahl Punkte x Dimension) der Punkte (siehe gabriel_edges)
+# @param[in] k: Anzahl Nachbarn je Punkt
+# @param[in] tree: optionaler KD-Baum (scipy.spatial.cKDTree) über array_points
+# @return: Array (Anzahl Kanten x 2) mit den Punktindizes je Kante, sortiert, erste Spalte < zweite Spalte
+def knn_edges(array_points, k, tree=None):
+    array_points = np.asarray(array_points, dtype=float)
+    n = len(array_points)
+    k = min(int(k) + 1, n)
+    if k < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    if tree is None:
+        from scipy.spatial import cKDTree
+        tree = cKDTree(array_points)
+
+    # k + 1 Nachbarn, der erste ist der Punkt selbst
+    _, idx = tree.query(array_points, k=k)
+    edges = np.column_stack([np.repeat(np.arange(n, dtype=np.int64), k), idx.reshape(-1).astype(np.int64)])
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    edges.sort(axis=1)
+
+    return np.unique(edges, axis=0)
+
+
+# ====== Einlesen der Bezirksdaten aus Dateien =====
+
+## Wandelt die Spalten einer Bezirkstabelle in kompakte Datentypen um.
+# Nummer und ganzzahlige Attribute werden auf den kleinsten Integertyp reduziert, die Koordinaten bleiben float64
+# (Genauigkeit der Triangulation), der Name wird als Text übernommen.
+# @param[in] df_zones: Bezirkstabelle
+# @return: Bezirkstabelle mit kompakten Datentypen und Index 0...n
+def compact_zone_dtypes(df_zones):
+    df_zones = df_zones.reset_index(drop=True)
+    for column in df_zones.columns:
+        if column == "Name":
+            df_zones[column] = df_zones[column].fillna("").astype(str)
+        elif column in ("XCoord", "YCoord"):
+            df_zones[column] = pd.to_numeric(df_zones[column]).astype(np.float64)
+        else:
+            values = pd.to_numeric(df_zones[column])
+            if np.all(np.mod(values, 1) == 0):
+                values = pd.to_numeric(values.astype(np.int64), downcast="integer")
+            df_zones[column] = values
+
+    return df_zones
+
+
+## Liest die Bezirksdaten aus einer CSV Datei (Trennzeichen ; oder , wird aus der Kopfzeile erkannt).
+# @param[in] path: Dateipfad
+# @param[in] attr_zones: Liste der benötigten Spalten
+# @return: Bezirkstabelle
+def read_zones_csv(path, attr_zones):
+    with open(path, encoding="utf-8-sig") as f:
+        sep = ";" if ";" in f.readline() else ","
+
+    return pd.read_csv(path, sep=sep, usecols=attr_zones, encoding="utf-8-sig")[attr_zones]
+
+
+## Liest die Bezirksdaten aus einer Parquet Datei (Arrow, memory-mapped). Benötigt pyarrow.
+# @param[in] path: Dateipfad
+# @param[in] attr_zones: Liste der benötigten Spalten
+# @return: Bezirkstabelle
+def read_zones_parquet(path, attr_zones):
+    import pyarrow.parquet as pq
+    table = pq.read_table(path, columns=attr_zones, memory_map=True)
+
+    return table.to_pandas()[attr_zones]
+
+
+## Liest die Bezirkstabelle ($ZONE) einer Visum Netzdatei (.net).
+# Die Attributnamen werden ohne Beachtung der Groß-/Kleinschreibung zugeordnet (z.B. XCoord -> XCOORD).
+# Es wird nur der Abschnitt der Bezirkstabelle geparst.
+# @param[in] path: Dateipfad
+# @param[in] attr_zones: Liste der benötigten Spalten
+# @param[in] encoding: Zeichenkodierung der Netzdatei, default latin-1
+# @return: Bezirkstabelle
+def read_zones_net(path, attr_zones, encoding="latin-1"):
+    # Suche Kopfzeile und Länge der Bezirkstabelle
+    line_header = None
+    columns = None
+    n_rows = 0
+    with open(path, encoding=encoding) as f:
+        for no_line, line in enumerate(f):
+            if columns is None:
+                if line.upper().startswith("$ZONE:"):
+                    line_header = no_line
+                    columns = line.strip().split(":", 1)[1].split(";")
+            elif line.strip() == "" or line.startswith(("$", "*")):
+                break
+            else:
+                n_rows += 1
+
+    if columns is None:
+        raise ValueError(f"Netzdatei enthält keine Bezirkstabelle: {path}")
+
+    dict_columns = {column.upper(): column for column in columns}
+    missing = [attr for attr in attr_zones if attr.upper() not in dict_columns]
+    if len(missing) > 0:
+        raise KeyError(f"Attribute fehlen in der Bezirkstabelle der Netzdatei: {missing}")
+
+    df_zones = pd.read_csv(path, sep=";", header=None, names=columns, skiprows=line_header + 1, nrows=n_rows,
+                           usecols=[dict_columns[attr.upper()] for attr in attr_zones], encoding=encoding)
+
+    return df_zones.rename(columns={dict_columns[attr.upper()]: attr for attr in attr_zones})[attr_zones]
+
+
+## Zuordnung Dateiendung -> Einlesefunktion. Weitere Formate können ergänzt werden, die Funktion erhält den Dateipfad und
+# die Liste der benötigten Spalten und gibt einen DataFrame zurück.
+ZONE_READERS = {".csv": read_zones_csv,
+                ".parquet": read_zones_parquet,
+                ".net": read_zones_net}
+
+
+## Liest die Bezirksdaten aus einer Datei. Das Format wird über die Dateiendung bestimmt (siehe ZONE_READERS).
+# @param[in] path: Dateipfad (Path/str)
+# @param[in] attr_zones: Liste der benötigten Spalten
+# @return: Bezirkstabelle mit kompakten Datentypen und Index 0...n
+def read_zones(path, attr_zones):
+    path = Path(path)
+    if path.suffix.lower() not in ZONE_READERS:
+        raise ValueError(f"Einlesen der Bezirksdaten ist fehlgeschlagen, Inputformat ist nicht implementiert: {path.suffix}")
+
+    return compact_zone_dtypes(ZONE_READERS[path.suffix.lower()](path, list(attr_zones)))
+
+
 ## Öffnet die Readme Datei
 def show_info(path_scripts: Path = Path.cwd()):
+    import webbrowser
     webbrowser.open(str(path_scripts / "README.md"), new=2)
 
 
 # ===== Klassendefinition ======
+## @class LazyMessage
+# Lognachricht, die erst bei der Ausgabe erzeugt wird, z.B. logging.debug("%s", LazyMessage(fcn, vfs)). Wird die
+# Meldung durch den Loglevel unterdrückt, wird fcn nicht aufgerufen.
+class LazyMessage:
+
+    ## Konstruktor
+    # @param fcn: Funktion, die den Text der Nachricht zurückgibt
+    # @param args: Parameter der Funktion
+    def __init__(self, fcn, *args):
+        self.fcn = fcn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fcn(*self.args))
+
+
+## Ausnahme beim Abbruch einer Berechnung über ein CancellationToken
+class CalculationCancelled(Exception):
+    pass
+
+
+## @class CancellationToken
+# Kooperativer Abbruch einer Berechnung. Das Token kann aus einem anderen Thread (z.B. GUI) gesetzt werden, der
+# LuftlinienCalculator prüft es zu Beginn jedes Schritts und in den Schleifen der Triangulation, des
+# Nachbarschaftsgrads und der Versorgungszentren.
+# Verwendung: calculator.cancel_token = CancellationToken(), Abbruch über cancel_token.cancel().
+class CancellationToken:
+
+    ## Konstruktor
+    def __init__(self):
+        import threading
+
+        self._event = threading.Event()
+
+    ## Fordert den Abbruch an
+    def cancel(self):
+        self._event.set()
+
+    ## Setzt das Token zurück, z.B. für eine erneute Berechnung
+    def reset(self):
+        self._event.clear()
+
+    ## Flag: der Abbruch wurde angefordert
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    ## Löst CalculationCancelled aus, falls der Abbruch angefordert wurde
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CalculationCancelled("Die Berechnung wurde abgebrochen")
+
+
+## @class MetricsCollector
+# Sammelt Kennwerte je Berechnungs- bzw. Exportschritt und VFS: Laufzeit, Spitzenwert Speicher (tracemalloc) und
+# Anzahlen (Bezirke, Kanten, Erweiterungen Nachbarschaftsgrad, verbundene Versorgungszentren, geschriebene
+# Bytes). Jeder abgeschlossene Schritt wird als Dict gespeichert und an die Callbacks übergeben.
+# Verwendung: calculator.metrics = MetricsCollector(), danach calculate_main/Exporte ausführen.
+# Bei verschachtelten Schritten (z.B. extract_net innerhalb von export_net) werden Speicher und Profil nur für den
+# äußeren Schritt erfasst.
+class MetricsCollector:
+
+    ## Konstruktor
+    # @param callbacks: Liste von Funktionen, die mit dem Dict jedes abgeschlossenen Schritts aufgerufen werden
+    # @param trace_memory: falls True wird der Spitzenwert des Speichers je Schritt gemessen (Zuwachs gegenüber dem
+    # Beginn des Schritts). tracemalloc verlängert die Laufzeit, insbesondere der pandas-Schritte. Eine bereits laufende
+    # Messung (z.B. des Aufrufers) wird weder beendet noch zurückgesetzt. Liegt deren bisheriger Spitzenwert über dem
+    # des Schritts, wird der Zuwachs am Ende des Schritts angegeben (untere Schranke)
+    # @param profile: falls True werden die Schritte zusätzlich mit cProfile aufgezeichnet (siehe write_profile)
+    def __init__(self, callbacks=None, trace_memory=True, profile=False):
+        ## Liste der Callbacks
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        ## Flag Speichermessung
+        self.trace_memory = trace_memory
+        ## cProfile.Profile, falls die Profilierung aktiviert ist
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        ## Liste der Kennwerte (ein Dict je Schritt)
+        self.records = []
+        self._depth = 0
+
+    ## Misst einen Schritt (Kontextmanager). Der zurückgegebene Dict kann im Schritt um Anzahlen ergänzt werden.
+    # @param stage: Bezeichnung des Schritts
+    # @param vfs: VFS des Schritts, None für Schritte über alle VFS
+    # @return: Dict für die Anzahlen des Schritts
+    @contextmanager
+    def stage(self, stage, vfs=None):
+        import tracemalloc
+
+        counts = {}
+        is_outer = self._depth == 0
+        # eine bereits laufende Speichermessung (z.B. des Aufrufers) wird nicht beendet und nicht zurückgesetzt
+        start_tracing = is_outer and self.trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        if is_outer and self.trace_memory:
+            current_start, peak_start = tracemalloc.get_traced_memory()
+        if is_outer and self.profiler is not None:
+            self.profiler.enable()
+
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield counts
+            seconds = time.perf_counter() - start
+        finally:
+            self._depth -= 1
+            peak = None
+            if is_outer and self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = peak - current_start if peak > peak_start else max(current - current_start, 0)
+            if start_tracing:
+                tracemalloc.stop()
+            if is_outer and self.profiler is not None:
+                self.profiler.disable()
+
+        self.add_record({"stage": stage, "vfs": vfs, "seconds": seconds, "peak_bytes": peak, **counts})
+
+    ## Speichert die Kennwerte eines Schritts und ruft die Callbacks auf.
+    # @param record: Dict mit den Kennwerten
+    def add_record(self, record):
+        self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    ## Gibt die Kennwerte als Tabelle zurück.
+    # @return: DataFrame mit einer Zeile je Schritt
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+    ## Schreibt einen Bericht (JSON) mit den Kennwerten aller Schritte und der Summe je Schritt.
+    # @param path: Dateipfad
+    # @param meta: optionales Dict mit Angaben zum Lauf (z.B. Parameter, Netzname)
+    def write_report(self, path, meta=None):
+        import json
+
+        summary = {}
+        for record in self.records:
+            total = summary.setdefault(record["stage"], {"seconds": 0.0, "peak_bytes": 0, "count": 0})
+            total["seconds"] += record["seconds"]
+            total["peak_bytes"] = max(total["peak_bytes"], record["peak_bytes"] or 0)
+            total["count"] += 1
+
+        with open(path, mode="w", encoding="utf-8") as f:
+            json.dump({"meta": meta or {}, "summary": summary, "stages": self.records}, f, indent=1,
+                      default=lambda x: x.item() if isinstance(x, np.generic) else str(x))
+
+    ## Schreibt das cProfile-Profil (pstats Format, z.B. für snakeviz).
+    # @param path: Dateipfad
+    def write_profile(self, path):
+        if self.profiler is None:
+            raise ValueError("Die Profilierung ist nicht aktiviert (profile=True)")
+        self.profiler.dump_stats(str(path))
+
+
+## @class ResultCache
+# Persistenter Ergebnisspeicher (Dateien .npz in einem Verzeichnis) für die Adjazenzmatrizen einzelner VFS.
+# Der Schlüssel ist ein Hash über die Eingangsdaten der VFS (siehe LuftlinienCalculator.get_cache_keys), gespeichert
+# wird die obere Dreiecksmatrix kompakt als CSR Arrays (indptr, indices). Bei jedem Treffer wird der Zeitstempel der
+# Datei aktualisiert. Übersteigt die Größe des Verzeichnisses max_bytes, werden die am längsten nicht verwendeten
+# Einträge gelöscht (LRU).
+class ResultCache:
+
+    ## Konstruktor
+    # @param path: Verzeichnis des Caches, wird bei Bedarf angelegt
+    # @param max_bytes: maximale Größe aller Einträge in Bytes. Default: 1 GB
+    def __init__(self, path, max_bytes=2 ** 30):
+        ## Verzeichnis des Caches
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        ## maximale Größe aller Einträge in Bytes
+        self.max_bytes = max_bytes
+        ## Anzahl Treffer
+        self.hits = 0
+        ## Anzahl Fehlzugriffe
+        self.misses = 0
+
+    ## Dateipfad eines Eintrags
+    # @param key: Schlüssel (Hash)
+    # @return: Path
+    def get_path(self, key):
+        return self.path / f"{key}.npz"
+
+    ## Lädt die Adjazenzmatrix eines Eintrags.
+    # @param key: Schlüssel (Hash)
+    # @return: obere Dreiecksmatrix (scipy.sparse CSR, bool) oder None, falls kein (lesbarer) Eintrag existiert
+    def load(self, key):
+        from scipy import sparse
+
+        path = self.get_path(key)
+        try:
+            with np.load(path) as data:
+                n = int(data["n"])
+                indices = data["indices"]
+                matrix = sparse.csr_matrix((np.ones(len(indices), dtype=bool), indices, data["indptr"]), shape=(n, n))
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+
+        # Zeitstempel für die LRU Verdrängung
+        path.touch()
+        self.hits += 1
+
+        return matrix
+
+    ## Speichert die Adjazenzmatrix unter dem Schlüssel und verdrängt ggf. alte Einträge.
+    # @param key: Schlüssel (Hash)
+    # @param matrix: obere Dreiecksmatrix (scipy.sparse CSR)
+    def store(self, key, matrix):
+        from scipy import sparse
+
+        matrix = sparse.csr_matrix(matrix)
+        n = matrix.shape[0]
+        dtype = np.int32 if max(n, matrix.nnz) < np.iinfo(np.int32).max else np.int64
+
+        # erst vollständig schreiben, dann umbenennen: kein unvollständiger Eintrag bei Abbruch
+        path = self.get_path(key)
+        path_tmp = path.with_suffix(".tmp")
+        with open(path_tmp, "wb") as f:
+            np.savez(f, n=n, indptr=matrix.indptr.astype(dtype), indices=matrix.indices.astype(dtype))
+        path_tmp.replace(path)
+
+        self.evict()
+
+    ## Löscht die am längsten nicht verwendeten Einträge, bis die Größe max_bytes nicht mehr übersteigt.
+    def evict(self):
+        list_files = sorted(((f.stat().st_mtime, f.stat().st_size, f) for f in self.path.glob("*.npz")),
+                            key=lambda x: x[0])
+        total = sum(size for _, size, _ in list_files)
+        for _, size, f in list_files:
+            if total <= self.max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+
+    ## Löscht alle Einträge.
+    def clear(self):
+        for f in self.path.glob("*.npz"):
+            f.unlink(missing_ok=True)
+
+
+## @class ProviderIndex
+# Räumlicher Index (KD-Baum) über eine Menge möglicher Versorgungszentren.
+# Ermöglicht die Suche der nächstgelegenen Versorgungszentren für viele Bezirke in einer gebündelten Abfrage.
+class ProviderIndex:
+
+    ## Konstruktor
+    # @param idx_zones: Index der Versorgungszentren in der Bezirkstabelle
+    # @param array_points: Array mit den x- & y-Koordinaten der Versorgungszentren
+    # @param formula: Distanzfunktion ("euclidean" oder "haversine")
+    def __init__(self, idx_zones, array_points, formula="euclidean"):
+        ## Index der Versorgungszentren in der Bezirkstabelle
+        self.idx_zones = np.asarray(idx_zones, dtype=np.int64)
+        ## Distanzfunktion
+        self.formula = formula
+        from scipy.spatial import cKDTree
+        ## KD-Baum über die (ggf. projizierten) Koordinaten
+        self.tree = cKDTree(self.transform(array_points)) if len(self.idx_zones) > 0 else None
+
+    ## Überführt x- & y-Koordinaten in den Raum, in dem die Distanzen euklidisch gesucht werden
+    # @param array_points: Array mit den x- & y-Koordinaten
+    # @return Array mit den Koordinaten für den KD-Baum
+    def transform(self, array_points):
+        array_points = np.asarray(array_points, dtype=float).reshape(-1, 2)
+        if self.formula == "haversine":
+            # Sehnendistanz auf der Einheitskugel
+            return lonlat_to_unit_sphere(array_points[:, 0], array_points[:, 1])
+        elif self.formula == "euclidean":
+            return array_points
+        else:
+            raise ValueError(f"Fall Abstandsberechnung ist nicht implementiert: {self.formula}")
+
+    ## Bestimmt für jeden Punkt die k nächstgelegenen Versorgungszentren (gebündelte Abfrage in Blöcken)
+    # @param array_points: Array mit den x- & y-Koordinaten der Bezirke
+    # @param k: gewünschte Anzahl Versorgungszentren je Bezirk
+    # @param progress: optionale Funktion progress(done, total), die nach jedem Block aufgerufen wird. Ein Abbruch
+    # erfolgt über eine Ausnahme in der Funktion (z.B. CalculationCancelled)
+    # @param chunk_size: Anzahl der Punkte je Block
+    # @return Array (Anzahl Punkte x min(k, Anzahl Versorgungszentren)) mit dem Index der Versorgungszentren in der
+    # Bezirkstabelle, je Zeile aufsteigend nach Entfernung sortiert
+    def query(self, array_points, k, progress=None, chunk_size=100000):
+        k = min(int(k), len(self.idx_zones))
+        if self.tree is None or k < 1:
+            return np.empty((len(array_points), 0), dtype=np.int64)
+
+        array_points = self.transform(array_points)
+        idx = np.empty((len(array_points), k), dtype=np.int64)
+        n_chunks = -(-len(array_points) // chunk_size)
+        for i, start in enumerate(range(0, len(array_points), chunk_size)):
+            _, idx_chunk = self.tree.query(array_points[start:start + chunk_size], k=k)
+            idx[start:start + chunk_size] = np.asarray(idx_chunk).reshape(-1, k)
+            if progress is not None:
+                progress(i + 1, n_chunks)
+
+        return self.idx_zones[idx]
+
+
 ## @class LuftlinienCalculator
 # Die Klasse enthält Attribute und Berechnungsmöglichkeiten um die VFS zwischen Bezirken zu ermitteln
 class LuftlinienCalculator:
 
     ## Konstruktor
-    # @param source: Dateiname (str) oder Visuminstanz
+    # @param source: Dateiname (str/Path, .csv/.parquet/.net, siehe ZONE_READERS), Visuminstanz oder DataFrame mit den Bezirksdaten (ohne Visum, "headless").
+    # Der DataFrame enthält die Spalten No, Name, XCoord, YCoord, attr_vfs sowie ggf. attr_quelle, attr_ziel und IsActive
     # @param attr_vfs: Name des Bezirkattributs, das die Kategorisierung in OZ,MZ,UZ ... enthält. Default: TypeNr
     # @param dict_vfs: Dictionary, das die Attributwerte für die jeweiligen VFS enthält
     # @param max_entfernung: Angabe, bis zu welcher Entfernung, Nachbar angebunden werden
@@ -158,10 +1534,26 @@ class LuftlinienCalculator:
     # @param attr_quelle: Name des Attributs, das angibt, ob der Bezirk als Quelle berücksichtigt wird. Default: None
     # @param attr_ziel: Name des Attributs, das angibt, ob der Bezirk als Ziel berücksichtigt wird. Default: None
     # @param use_filter: gibt an, ob nur aktive Bezirke berücksichtigt werden. Kann nur verwendet werden, wenn source = Visuminstanz
+    # oder DataFrame mit der Spalte IsActive
     # @param formula_distance: definiert die Distanzfunktion für die Ermittlung der Versorgungszentren.
     # Anmerkung: Für die Triangulation werden die Luftlinienverbindungen anhand der euklidischen Distanz ermittelt.
-    # Delaunay-Triangulation funktioniert nur bei einer Projektion der Lat/Lon Koordinaten.
+    # Delaunay-Triangulation funktioniert nur bei einer Projektion der Lat/Lon Koordinaten, alternativ siehe triangulation.
     # @param path_output: optionale Möglichkeit einen Pfad für den Dateiexport anzugeben. Default: None. Dann wird bei bedarf der aktuelle Ordner verwendet.
+    # @param triangulation: "planar" (ebene Delaunay-Triangulation der Koordinaten) oder "spherical" (Delaunay-Triangulation
+    # auf der Kugel für Lon/Lat Koordinaten in Grad, ohne vorherige Projektion)
+    # @param path_cache: optionales Verzeichnis für den persistenten Ergebnisspeicher (siehe ResultCache). Default: None,
+    # dann wird immer gerechnet
+    # @param graph: Nachbarschaftsgraph der gleichrangigen Bezirke (siehe GRAPHS): "delaunay" (Delaunay-Triangulation),
+    # "gabriel" (Gabriel-Graph), "rng" (Relative Neighbourhood Graph), "max_length" (Delaunay-Kanten bis zur Länge
+    # graph_max_length) als Teilgraphen der Triangulation oder "knn" (graph_k nächste Nachbarn je Bezirk, ohne
+    # Triangulation). Die Teilgraphen vermeiden insbesondere die langen Kanten am Rand der Triangulation
+    # @param graph_k: Anzahl Nachbarn je Bezirk für graph="knn"
+    # @param graph_max_length: maximale Kantenlänge für graph="max_length" in der Einheit der Distanzfunktion
+    # (euclidean: Koordinateneinheit, haversine: km)
+    # @param tile_size: optionale Anzahl Bezirke je Kachel. Triangulationen mit mehr Bezirken werden gekachelt
+    # berechnet (siehe delaunay_edges_tiled), der Speicherbedarf ist dann durch die Kachelgröße begrenzt. Default: None,
+    # dann wird immer in einem Schritt trianguliert. Nur für triangulation="planar"
+    # @param tile_jobs: Anzahl Threads der gekachelten Triangulation
     def __init__(self, source,
                  attr_vfs: str = "TypeNo",
                  dict_vfs: dict = {"VFS 0": 0, "VFS 1": 1, "VFS 2": 2, "VFS 3": 3, "VFS 4": 4, "VFS 5": 5},
@@ -171,7 +1563,14 @@ class LuftlinienCalculator:
                  attr_ziel=None,
                  use_filter: bool = False,
                  formula_distance: str = "euclidean",
-                 path_output=None):
+                 path_output=None,
+                 triangulation: str = "planar",
+                 path_cache=None,
+                 graph: str = "delaunay",
+                 graph_k: int = 6,
+                 graph_max_length=None,
+                 tile_size=None,
+                 tile_jobs: int = 1):
 
         ## Flag Debugmodus. Ermöglicht die Durchführung von Zwischenanalysen, die im normalen Programmablauf nicht berücksichtigt werden
         self.debug_mode = False
@@ -198,6 +1597,28 @@ class LuftlinienCalculator:
         ## Abstandsberechnung
         self.formula_dist = formula_distance
 
+        ## Art der Triangulation ("planar" oder "spherical")
+        if triangulation not in ("planar", "spherical"):
+            raise ValueError(f"Triangulation ist nicht implementiert: {triangulation}")
+        self.triangulation = triangulation
+
+        ## Nachbarschaftsgraph (siehe GRAPHS) und dessen Parameter
+        if graph not in GRAPHS:
+            raise ValueError(f"Nachbarschaftsgraph ist nicht implementiert: {graph}")
+        if graph == "max_length" and graph_max_length is None:
+            raise ValueError("Für graph='max_length' muss graph_max_length angegeben werden")
+        self.graph = graph
+        ## Anzahl Nachbarn je Bezirk (graph="knn")
+        self.graph_k = graph_k
+        ## maximale Kantenlänge (graph="max_length")
+        self.graph_max_length = graph_max_length
+
+        ## Anzahl Bezirke je Kachel der gekachelten Triangulation (None: ohne Kacheln) und Anzahl Threads
+        if tile_size is not None and (triangulation == "spherical" or tile_size < 3):
+            raise ValueError("tile_size ist nur für triangulation='planar' und ab 3 Bezirken je Kachel möglich")
+        self.tile_size = tile_size
+        self.tile_jobs = tile_jobs
+
         ##  Vorgabe, bis zu welchem Nachbarschaftsgrad gleichrangige Verbindungen verfolgt werden sollen
         # (ehemals Austauschfkt)
         self.nachbarschaftsgrad_vfs = dict()
@@ -225,7 +1646,24 @@ class LuftlinienCalculator:
 
         # Einlesen der Bezirksdaten
         # Wichtig: Index der Tabelle = 0...n
-        if not isinstance(source, str):
+        if isinstance(source, pd.DataFrame):
+            # ohne Visuminstanz: Bezirksdaten werden direkt übergeben
+            self.visum = None
+            self.zones = source.loc[:, self.attr_zones].reset_index(drop=True)
+            if use_filter and "IsActive" in source.columns:
+                self.zones["IsActive"] = source["IsActive"].values.astype(bool)
+            else:
+                self.zones["IsActive"] = True
+
+            logging.info("%s Bezirke übernommen", len(self.zones))
+        elif isinstance(source, (str, Path)):
+            # ohne Visuminstanz: Bezirksdaten werden aus einer Datei gelesen
+            self.visum = None
+            self.zones = read_zones(source, self.attr_zones)
+            self.zones["IsActive"] = True
+
+            logging.info("%s Bezirke aus %s eingelesen", len(self.zones), source)
+        else:
             ## Visuminstanz
             self.visum = source
             attr_zones = self.attr_zones
@@ -236,9 +1674,6 @@ class LuftlinienCalculator:
             self.zones["IsActive"] = self.zones["No"].isin(set_active_zones)
 
             logging.info("%s Bezirke eingelesen", len(self.zones))
-        else:
-            self.visum = None
-            logging.warning("Einlesen der Bezirksdaten ist fehlgeschlagen, Inputformat ist nicht implementiert")
 
         if attr_quelle is None:
             attr_quelle = 'quelle'
@@ -257,57 +1692,125 @@ class LuftlinienCalculator:
         ## Attribut Zielfilter
         self.attr_is_to_zone = attr_ziel
 
+        ## Räumliche Indizes der Versorgungszentren je Zentralitätsstufe und Distanzfunktion
+        self.provider_indices = {}
+
+        ## optionaler MetricsCollector für die Kennwerte der Berechnungs- und Exportschritte
+        self.metrics = None
+
+        ## optionaler Beobachter des Fortschritts: Funktion, die mit einem Dict (stage, vfs, done, total) aufgerufen
+        # wird, je VFS von calculate_main und je Iteration der Schleifen (Stufen der Triangulation, Schritte des
+        # Nachbarschaftsgrads, Blöcke der Versorgungszentren)
+        self.progress = None
+
+        ## optionales CancellationToken für den Abbruch von Berechnungen und Exporten
+        self.cancel_token = None
+
+        ## optionaler persistenter Ergebnisspeicher (ResultCache)
+        self.cache = ResultCache(path_cache) if path_cache is not None else None
+
         # Init VFS Matrizen
         # Dict mit Matrix je VFS: Anzahl Bezirke x Anzahl Bezirke
         self.init_results()
 
         ## Eingestellte Sprache Visuminstanz
-        self.language = self.visum.GetCurrentLanguage()
+        self.language = self.visum.GetCurrentLanguage() if self.visum is not None else None
 
         # Init dict export
         ## LookupTable Infrastruktur: Dem Bezirk zugeordnete Knotennummer
         self.dict_export_zone2node = {} # Enthält Nummer der Knoten, die für den Bezirk eingefügt werden, um Strecken einfügen zu können
-        ## LookUpTable Infrastruktur: Zuordnung interne Streckennummer zu Streckennummer Visum
-        self.dict_export_links_vfs = {} # Enthält die Strecken (VonKnoten-ZuKnoten
         ## LookUpTable Infrastruktur: Zuordnung Verbingungsfunktionsstufe - Streckentyp Visum
         self.dict_export_linktypes = {}
 
-        ## DataFrame mit den Streckendaten der Luftlinienverbindungen.
+        ## DataFrame mit den Streckendaten der Luftlinienverbindungen (Hin- und Gegenrichtung).
+        # Key: Integer Schlüssel der ungerichteten Kante (Index Von-Bezirk * Anzahl Bezirke + Index Nach-Bezirk),
+        # VFSMask: Bitmaske der enthaltenen VFS in Reihenfolge von list_export_vfs
         self.edges = pd.DataFrame()
+        ## Reihenfolge der VFS in der Bitmaske der Streckentabelle
+        self.list_export_vfs = []
+        ## Zuletzt exportierte Strecken (je ungerichteter Kante eine Zeile, sortiert nach Key) mit Streckennummer,
+        # Knoten und Streckentyp. Grundlage für die stabile Nummerierung und den Delta-Export (export_net_delta)
+        self.exported_links = pd.DataFrame({"Key": np.zeros(0, dtype=np.int64), "No": np.zeros(0, dtype=np.int64),
+                                            "FromNodeNo": np.zeros(0, dtype=np.int64),
+                                            "ToNodeNo": np.zeros(0, dtype=np.int64),
+                                            "TypeNo": np.zeros(0, dtype=np.int64)})
+
+
+    ## Misst einen Schritt über den MetricsCollector der Instanz (siehe MetricsCollector.stage).
+    # Ohne MetricsCollector werden die Anzahlen verworfen.
+    # @param stage: Bezeichnung des Schritts
+    # @param vfs: VFS des Schritts, None für Schritte über alle VFS
+    # @return: Kontextmanager, der ein Dict für die Anzahlen des Schritts liefert
+    def measure_stage(self, stage, vfs=None):
+        # Abbruch zwischen den Schritten
+        self.check_cancelled()
+        if self.metrics is None:
+            return nullcontext({})
+        return self.metrics.stage(stage, vfs)
+
+
+    ## Löst CalculationCancelled aus, falls über das CancellationToken der Instanz der Abbruch angefordert wurde.
+    def check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+
+    ## Meldet den Fortschritt an den Beobachter (progress) und prüft anschließend den Abbruch.
+    # @param stage: Bezeichnung des Schritts
+    # @param vfs: VFS des Schritts, None für Schritte über alle VFS
+    # @param done: Anzahl abgeschlossener Iterationen
+    # @param total: Gesamtanzahl der Iterationen
+    def report_progress(self, stage, vfs=None, done=None, total=None):
+        if self.progress is not None:
+            self.progress({"stage": stage, "vfs": vfs, "done": done, "total": total})
+        self.check_cancelled()
+
+
+    ## Funktion progress(done, total) für die Schleifen der Modulfunktionen (siehe report_progress)
+    # @param stage: Bezeichnung des Schritts
+    # @param vfs: VFS des Schritts
+    # @return: Funktion
+    def get_progress_callback(self, stage, vfs=None):
+        return lambda done, total: self.report_progress(stage, vfs, done, total)
 
 
     ## Übersetzt die Adjazenzmatrizen der gewünschten VFS in eine Streckenliste
+    # Die Strecken werden direkt aus den Einträgen der oberen Dreiecksmatrizen gebildet (Aufwand linear in der Anzahl
+    # der Kanten), die Bezirksnummern über Array-Indizierung zugeordnet.
     # @param list_vfs: Liste der VFS. Falls nicht gegeben, werden alle VFS der Instanz verwendet
-    # @return df_edges: DataFrame mit allen Strecken und ihrer VFS. Achtung: Duplikate werden nicht entfernt
+    # @return df_edges: DataFrame mit allen Strecken (Hin- und Gegenrichtung), der kleinsten VFS (TypeNo) und allen VFS
+    # (ListTypeNo) je Strecke
     def adj_matrix_to_links(self, list_vfs=None):
 
         if list_vfs is None:
             list_vfs = self.vfs.keys()
-
-        list_df_edges = []
-        for vfs in list_vfs:
-            if not is_symmetric(self.matrizen_VFS[vfs]):
-                logging.warning(f"{vfs}: Adjazenzmatrix ist nicht symmetrisch")
-
-            df_edges = pd.DataFrame(self.matrizen_VFS[vfs]).stack().reset_index()
-            df_edges.columns = ["FromNodeNo", "ToNodeNo", "TypeNo"]
-
-            # Filtere Strecken mit True
-            df_edges = df_edges.loc[df_edges["TypeNo"] == True, :]
-
-            # setze Attribut VFS
-            df_edges.loc[:, "TypeNo"] = vfs
-
-            list_df_edges.append(df_edges)
-
-        df_edges = pd.concat(list_df_edges)
-
-        # Nur eine Strecke zwischen zwei Knoten
-        df_edges = df_edges.groupby(["FromNodeNo", "ToNodeNo"]).agg(TypeNo=("TypeNo", min),
-                                                                    ListTypeNo=("TypeNo", list)).reset_index()
-
-        df_edges["FromNodeNo"].replace(self.zones["No"], inplace=True)
-        df_edges["ToNodeNo"].replace(self.zones["No"], inplace=True)
+        list_vfs = list(list_vfs)
+
+        with self.measure_stage("adj_matrix_to_links") as counts:
+            # Vereinigung der Kanten aller VFS, Bit i der Maske = list_vfs[i]
+            idx_from, idx_to, mask_vfs = merge_upper_csr_edges([self.matrizen_VFS[vfs] for vfs in list_vfs])
+
+            # kleinste VFS je Kante (Reihenfolge nach Namen)
+            min_vfs = np.array(list_vfs, dtype=object)[mask_to_min_vfs_position(mask_vfs, list_vfs)]
+
+            # Liste der VFS je Kante, einmalig je vorkommender Maske
+            masks_unique, idx_mask = np.unique(mask_vfs, return_inverse=True)
+            list_masks_vfs = [[vfs for pos, vfs in enumerate(list_vfs) if int(mask) >> pos & 1] for mask in masks_unique]
+
+            # Hin- und Gegenrichtung, sortiert nach Von- und Nach-Knoten
+            from_node = np.concatenate([idx_from, idx_to])
+            to_node = np.concatenate([idx_to, idx_from])
+            idx_edge = np.tile(np.arange(len(idx_from)), 2)
+            order = np.lexsort((to_node, from_node))
+            from_node, to_node, idx_edge = from_node[order], to_node[order], idx_edge[order]
+
+            zone_no = self.zones["No"].values
+            df_edges = pd.DataFrame({"FromNodeNo": zone_no[from_node],
+                                     "ToNodeNo": zone_no[to_node],
+                                     "TypeNo": min_vfs[idx_edge],
+                                     "ListTypeNo": [list(list_masks_vfs[i]) for i in idx_mask[idx_edge]]})
+            counts["edges"] = len(idx_from)
+            counts["links"] = len(df_edges)
 
         return df_edges
 
@@ -317,61 +1820,351 @@ class LuftlinienCalculator:
     # @param use_zone_names: bool, falls True werden die hitnerlegten Bezirksnamen verwendet
     # @return df_set_zones: DataFrame mit list Objekt je Bezirk und einer Spalte, die die Anzahl enthält
     def adj_matrix_to_set_of_connected_zones(self, vfs, use_zone_names=True):
-        # Matrix zu DataFrame
+        indptr, indices = self.get_neighbour_lists(vfs)
+
         if use_zone_names:
-            # Falls Namen verwendet werden sollen, werden die Zeilen & Spalten benannt
-            df = pd.DataFrame(self.matrizen_VFS[vfs], index=self.zones["Name"], columns=self.zones["Name"])
+            # Falls Namen verwendet werden sollen, werden die Zeilen benannt
+            labels = self.zones["Name"].values
+            index = pd.Index(self.zones["Name"])
         else:
-            df = pd.DataFrame(self.matrizen_VFS[vfs])
+            labels = self.zones.index.values
+            index = self.zones.index
 
-        # Erstellt einen DataFrame, der für jede Zeile der Matrix die Spaltennamen enthält, für die der Eintrag True ist
-        df_set_zones = df.mul(df.columns.tolist()).apply(lambda x: set(zone for zone in x if zone), axis=1).to_frame(
-            name="set zones")
+        df_set_zones = pd.DataFrame({"set zones": [set(x) for x in neighbour_lists_to_labels(indptr, indices, labels)]},
+                                    index=index)
         # Ermittelt die Länge jeder Liste
-        df_set_zones["no zones"] = df_set_zones["set zones"].apply(len)
+        df_set_zones["no zones"] = np.diff(indptr)
 
         return df_set_zones
 
 
+    ## Tabelle der verbundenen Bezirke je Bezirk (Bezirksnamen als Text) und deren Anzahl.
+    # Achtung: Aufwand und Speicherbedarf für große Netze, für die Protokollierung siehe get_summary_vfs.
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return: DataFrame (Index Bezirksname) mit den Spalten "set zones" und "no zones"
+    def get_zones_info(self, vfs):
+        indptr, indices = self.get_neighbour_lists(vfs)
+        list_names = neighbour_lists_to_labels(indptr, indices, self.zones["Name"].values.astype(str))
+
+        return pd.DataFrame({"set zones": [",".join(x) for x in list_names], "no zones": np.diff(indptr)},
+                            index=pd.Index(self.zones["Name"]))
+
+
+    ## Tabelle der verbundenen Bezirke je Bezirk als eingerückter Text (siehe get_zones_info)
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return: str
+    def format_zones_info(self, vfs):
+        return '\t' + self.get_zones_info(vfs).to_string().replace('\n', '\n\t')
+
+
+    ## Kennwerte der Verbindungen einer VFS über die aktiven Bezirke der Stufe (siehe summarize_degrees).
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @param top_n: Anzahl der aufgeführten Bezirke
+    # @return: Dict mit den Kennwerten, zusätzlich edges (Anzahl ungerichteter Verbindungen)
+    def get_summary_vfs(self, vfs, top_n=5):
+        indptr, _ = self.get_neighbour_lists(vfs)
+        is_active = ((self.zones[self.attr_central_level] <= self.vfs[vfs]) & (self.zones["IsActive"] > 0)).values
+
+        return {"edges": int(self.matrizen_VFS[vfs].nnz),
+                **summarize_degrees(np.diff(indptr), self.zones["Name"].values.astype(str), is_active, top_n)}
+
+
+    ## Kennwerte der Verbindungen einer VFS als Text für die Protokollierung (siehe get_summary_vfs)
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @param top_n: Anzahl der aufgeführten Bezirke
+    # @return: str
+    def format_summary_vfs(self, vfs, top_n=5):
+        summary = self.get_summary_vfs(vfs, top_n)
+        histogram = ", ".join(f"{key}: {value}" for key, value in summary["histogram"].items())
+        top_zones = ", ".join(f"{name} ({degree})" for name, degree in summary["top_zones"])
+
+        text = (f"{vfs}: {summary['edges']} Verbindungen zwischen {summary['zones']} aktiven Bezirken, "
+                f"Verbindungen je Bezirk Mittel {summary['degree_mean']:.2f} / Max {summary['degree_max']}\n"
+                f"\tHistogramm Verbindungen je Bezirk (Anzahl Bezirke): {histogram}\n"
+                f"\tmeiste Verbindungen: {top_zones}")
+        if summary["isolated"] > 0:
+            text += (f"\n\t{summary['isolated']} Bezirke ohne Verbindung, z.B. "
+                     f"{', '.join(summary['isolated_zones'])}")
+
+        return text
+
+
+    ## Gibt die Nachbarschaftslisten einer VFS im CSR-Format zurück.
+    # Die Nachbarn des Bezirks i (Index der Bezirkstabelle) sind indices[indptr[i]:indptr[i + 1]], aufsteigend sortiert.
+    # Aufwand linear in der Anzahl der Kanten. Bezirksnummern/-namen können anschließend über
+    # neighbour_lists_to_labels zugeordnet werden.
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return indptr, indices: Integer Arrays (Länge Anzahl Bezirke + 1 bzw. 2 x Anzahl Kanten)
+    def get_neighbour_lists(self, vfs):
+        matrix = self.get_matrix_symmetric(vfs)
+
+        return matrix.indptr, matrix.indices
+
+
+    ## Gibt die symmetrische Adjazenzmatrix einer VFS zurück (dünnbesetzt).
+    # Intern wird je VFS nur die obere Dreiecksmatrix gespeichert.
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return: scipy.sparse.csr_matrix (bool)
+    def get_matrix_symmetric(self, vfs):
+        return upper_csr_to_symmetric(self.matrizen_VFS[vfs])
+
+
+    ## Gibt die symmetrische Adjazenzmatrix einer VFS als dichtes Array zurück.
+    # Achtung: Speicherbedarf Anzahl Bezirke x Anzahl Bezirke. Nur verwenden, wenn eine dichte Matrix benötigt wird
+    # (z.B. für Matrix.SetValues in Visum).
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return: np.ndarray (bool)
+    def get_matrix_dense(self, vfs):
+        return self.get_matrix_symmetric(vfs).toarray()
+
+
+    ## Luftliniendistanz der Kanten (vektorisiert) mit der Distanzfunktion der Instanz (formula_dist).
+    # @param idx_from: Vektor der Von-Bezirke (Index der Bezirkstabelle)
+    # @param idx_to: Vektor der Nach-Bezirke (Index der Bezirkstabelle)
+    # @return: Vektor der Distanzen (euclidean: Koordinateneinheit, haversine: km)
+    def get_edge_lengths(self, idx_from, idx_to):
+        return calculate_edge_lengths(self.zones[["XCoord", "YCoord"]].values, idx_from, idx_to, self.formula_dist)
+
+
+    ## Gibt die symmetrische Matrix der Luftliniendistanzen der Verbindungen einer VFS zurück (dünnbesetzt, CSR).
+    # Die Distanzen werden nur für die Kanten der oberen Dreiecksmatrix berechnet, nicht verbundene OD-Paare
+    # sind nicht besetzt.
+    # @param vfs: str, Name der zu betrachtenden VFS
+    # @return: scipy.sparse.csr_matrix (float) mit den Distanzen (siehe get_edge_lengths)
+    def get_matrix_distance(self, vfs):
+        from scipy import sparse
+
+        matrix_upper = self.matrizen_VFS[vfs].tocsr()
+        idx_from = np.repeat(np.arange(matrix_upper.shape[0]), np.diff(matrix_upper.indptr))
+        matrix_upper = sparse.csr_matrix((self.get_edge_lengths(idx_from, matrix_upper.indices),
+                                          matrix_upper.indices, matrix_upper.indptr), shape=matrix_upper.shape)
+        matrix = (matrix_upper + matrix_upper.T).tocsr()
+        matrix.sort_indices()
+
+        return matrix
+
+
     ## Berechnet, welche Nachbarn innerhalb von n Schritten erreicht werden können.
     # @param max_steps: maximale Entfernung (Schritte)
     # @param vfs: zu untersuchende VFS
-    # @return matrix: Adjazenzmatrix für die Erreichbare Nachbarn innerhalb der max-steps
+    # @return matrix: Adjazenzmatrix (obere Dreiecksmatrix, CSR) für die Erreichbare Nachbarn innerhalb der max-steps
     def calculate_reachability_max_steps(self, max_steps, vfs):
 
-        matrix = np.linalg.matrix_power(self.matrizen_VFS[vfs], max_steps)
-        np.fill_diagonal(matrix, 0)
+        # begrenzte Breitensuche über den dünnbesetzten Graphen statt Matrixpotenz
+        matrix = calculate_reachability_k_steps(self.get_matrix_symmetric(vfs), max_steps,
+                                                self.get_progress_callback("k_hop", vfs))
 
         return matrix
 
 
+    ## Gibt den räumlichen Index der möglichen Versorgungszentren für einen Attributwert der Zentralität zurück.
+    # Versorgungszentren sind Quellbezirke mit einer Zentralität kleiner als der Attributwert. Die Indizes werden je
+    # Zentralitätsstufe und Distanzfunktion einmalig erstellt und von allen VFS mit diesem Attributwert verwendet.
+    # @param value_vfs: Attributwert der VFS
+    # @return: ProviderIndex
+    def get_provider_index(self, value_vfs):
+        key = (value_vfs, self.formula_dist)
+        if key not in self.provider_indices:
+            provider = self.zones.loc[(self.zones[self.attr_central_level] < value_vfs)
+                                      & (self.zones[self.attr_is_from_zone] > 0), :]
+            self.provider_indices[key] = ProviderIndex(provider.index.values, provider[["XCoord", "YCoord"]].values,
+                                                       self.formula_dist)
+
+        return self.provider_indices[key]
+
+
+    ## Berechnet die Delaunay-Kanten aller VFS über die verschachtelten Stufen der Zentralität.
+    # Die aktiven Bezirke einer VFS (Zentralität <= Attributwert) sind verschachtelt, daher wird je Attributwert nur
+    # einmal trianguliert, Stufen ohne neue Bezirke übernehmen die Kanten und optional wird die Triangulation
+    # aufsteigend um die Bezirke der nächsten Stufe ergänzt (siehe delaunay_edges_nested).
+    # @param incremental: falls True wird die Triangulation inkrementell ergänzt
+    # @param list_vfs: Liste der VFS, für die trianguliert wird. Falls nicht gegeben, alle VFS der Instanz
+    # Enthält eine Stufe Bezirke mit identischen Koordinaten, werden ab dieser Stufe keine Kanten berechnet
+    # (Abbruch mit Fehlermeldung in calculate_vfs).
+    #  @return Keine Rückgabe. Die Kanten werden je Attributwert in delaunay_edges gespeichert.
+    def calculate_delaunay_edges_nested(self, incremental=False, list_vfs=None):
+        if list_vfs is None:
+            list_vfs = self.vfs.keys()
+
+        # Attributwerte der VFS, für die eine Triangulation benötigt wird (nicht für den k-Nächste-Nachbarn-Graph)
+        list_values = sorted({self.vfs[vfs] for vfs in list_vfs if self.nachbarschaftsgrad_vfs[vfs] > 0})
+        if len(list_values) == 0 or self.graph == "knn":
+            return
+
+        # aktive Bezirke sortiert nach Zentralität
+        zones = self.zones.loc[self.zones["IsActive"] > 0, :]
+        zones = zones.loc[zones[self.attr_central_level] <= list_values[-1], :]
+        zones = zones.sort_values(self.attr_central_level, kind="stable")
+        levels = zones[self.attr_central_level].values
+        array_points = zones[["XCoord", "YCoord"]].values
+
+        # Anzahl Bezirke je Stufe, Abbruch ab der ersten Stufe mit identischen Koordinaten
+        list_n_points = []
+        for value in list_values:
+            n = int(np.searchsorted(levels, value, side="right"))
+            if pd.DataFrame(array_points[:n]).duplicated().any():
+                break
+            list_n_points.append(n)
+
+        list_edges = delaunay_edges_nested(array_points, list_n_points, incremental, self.triangulation == "spherical",
+                                           self.get_progress_callback("triangulation_nested"), self.tile_size,
+                                           self.tile_jobs, self.get_progress_callback("triangulation_tiles"))
+        for value, edges in zip(list_values, list_edges):
+            if edges is not None:
+                # Index der sortierten Bezirke -> Index in der Bezirkstabelle
+                self.delaunay_edges[value] = zones.index.values[edges]
+
+
     ## Berechnet für jede hinterlegte VFS der Instanz die Adjazenzmatrix.
+    # @param incremental: falls True wird eine Triangulation für alle VFS inkrementell aufgebaut, sonst wird je
+    # Attributwert neu trianguliert (siehe calculate_delaunay_edges_nested)
+    # @param n_jobs: Anzahl Prozesse. Bei n_jobs > 1 (None = Anzahl Kerne) werden die VFS parallel in einem Prozesspool
+    # berechnet (siehe calculate_main_parallel)
+    # @param use_cache: falls True und ein Ergebnisspeicher (cache) vorhanden ist, werden VFS mit unveränderten
+    # Eingangsdaten aus dem Speicher geladen und neue Ergebnisse gespeichert
+    # Der Fortschritt wird je VFS an den Beobachter (progress) gemeldet. Bei einem Abbruch über das CancellationToken
+    # (cancel_token) werden alle Ergebnisse der Berechnung verworfen (init_results) und CalculationCancelled ausgelöst.
     #  @return Keine Rückgabe. Die Ergebnisse werden intern gespeichert.
-    def calculate_main(self):
+    def calculate_main(self, incremental=False, n_jobs=1, use_cache=True):
         # Init Ergebnisse
         logging.info(f"Berechnung über alle VFS wird gestartet")
         self.init_results()
         logging.info(f"Adjazenzmatrizen wurden initialisiert")
 
-        # Schleife über alle vfs
-        for vfs in self.vfs:
-            # Berechne die Werte für die VFS
-            self.calculate_vfs(vfs)
+        try:
+            self.calculate_main_vfs(incremental, n_jobs, use_cache)
+        except CalculationCancelled:
+            # unvollständige Ergebnisse verwerfen
+            self.init_results()
+            logging.warning("Die Berechnung wurde abgebrochen, die Ergebnisse wurden verworfen")
+            raise
 
         logging.info("Die Berechnung über alle VFS ist abgeschlossen")
 
 
-    ## Berechnet die Verbindungen einer VFS.
-    # @param vfs: die Verbindungsfunktionsstufe, für die Verbindungen ermittel werden
-    def calculate_vfs(self, vfs):
+    ## Berechnet die Adjazenzmatrizen aller VFS (siehe calculate_main), ohne die Ergebnisse zu initialisieren.
+    # @param incremental: siehe calculate_main
+    # @param n_jobs: siehe calculate_main
+    # @param use_cache: siehe calculate_main
+    def calculate_main_vfs(self, incremental=False, n_jobs=1, use_cache=True):
+        list_vfs = sorted(self.vfs, key=self.vfs.get)
+
+        # Ergebnisse aus dem Cache
+        dict_keys = {}
+        if self.cache is not None and use_cache:
+            with self.measure_stage("cache_load") as counts:
+                dict_keys = self.get_cache_keys()
+                for vfs in list(list_vfs):
+                    matrix = self.cache.load(dict_keys[vfs])
+                    if matrix is not None and matrix.shape == self.matrizen_VFS[vfs].shape:
+                        self.matrizen_VFS[vfs] = matrix
+                        list_vfs.remove(vfs)
+                counts.update(hits=len(self.vfs) - len(list_vfs), misses=len(list_vfs))
+            logging.info(f"{len(self.vfs) - len(list_vfs)} VFS aus dem Cache geladen "
+                         f"(Treffer: {self.cache.hits}, Fehlzugriffe: {self.cache.misses})")
+
+        if len(list_vfs) == 0:
+            pass
+        elif n_jobs is None or n_jobs > 1:
+            # Kennwerte nur für die gesamte Berechnung, die Prozesse haben keinen MetricsCollector
+            with self.measure_stage("calculate_main_parallel"):
+                self.calculate_main_parallel(n_jobs, list_vfs)
+        else:
+            with self.measure_stage("triangulation_nested") as counts:
+                self.calculate_delaunay_edges_nested(incremental, list_vfs)
+                counts["levels"] = len(self.delaunay_edges)
 
-        # Attributswert der Bezirke für die gewählte VFS
-        value_vfs = self.vfs[vfs]
+            # Schleife über alle vfs, aufsteigend nach Attributwert
+            for i, vfs in enumerate(list_vfs):
+                # Berechne die Werte für die VFS
+                self.calculate_vfs(vfs)
+                self.report_progress("calculate_main", vfs, i + 1, len(list_vfs))
 
-        # Attribute der VFS
-        k_nachbar = self.nachbarschaftsgrad_vfs[vfs]
-        anz_versorger = self.anz_versorger_vfs[vfs]
+        # neue Ergebnisse speichern
+        for vfs in list_vfs:
+            if vfs in dict_keys:
+                self.cache.store(dict_keys[vfs], self.matrizen_VFS[vfs])
+
+
+    ## Ermittelt die Schlüssel des Ergebnisspeichers je VFS.
+    # Der Schlüssel ist ein SHA-256 Hash über die Koordinaten, die Zentralität, die Quell-/Zielattribute und den
+    # Filter der Bezirke, die Distanzfunktion, die Triangulation (inkl. Kachelgröße, die gekachelte Triangulation kann
+    # bei Punkten auf einem gemeinsamen Umkreis andere Dreiecke wählen) und den Nachbarschaftsgraph sowie den
+    # Attributwert, den Nachbarschaftsgrad und die Anzahl Versorgungszentren der VFS.
+    # @return: Dict VFS -> Schlüssel (str)
+    def get_cache_keys(self):
+        import hashlib
+
+        hash_zones = hashlib.sha256(f"{CACHE_VERSION}|{len(self.zones)}|{self.formula_dist}|{self.triangulation}|"
+                                    f"{self.tile_size}|{self.graph}|{self.graph_k}|{self.graph_max_length}".encode())
+        for column in ["XCoord", "YCoord", self.attr_central_level, self.attr_is_from_zone, self.attr_is_to_zone,
+                       "IsActive"]:
+            hash_zones.update(np.ascontiguousarray(self.zones[column].values, dtype=np.float64).tobytes())
+
+        dict_keys = {}
+        for vfs in self.vfs:
+            hash_vfs = hash_zones.copy()
+            hash_vfs.update(f"|{self.vfs[vfs]}|{self.nachbarschaftsgrad_vfs[vfs]}|{self.anz_versorger_vfs[vfs]}".encode())
+            dict_keys[vfs] = hash_vfs.hexdigest()
+
+        return dict_keys
+
+
+    ## Berechnet die VFS parallel in einem Prozesspool (je VFS eine Aufgabe).
+    # Die benötigten Bezirksattribute werden je Prozess einmalig beim Start übergeben (nicht je Aufgabe). Jeder Prozess
+    # rechnet mit einem LuftlinienCalculator ohne Visum (siehe _init_worker) und gibt die obere Dreiecksmatrix zurück.
+    # Die Ergebnisse werden in der Reihenfolge der VFS (aufsteigend nach Attributwert) übernommen und sind damit
+    # unabhängig von der Laufzeit der Prozesse.
+    # Anmerkung: unter Windows werden die Prozesse neu gestartet (spawn), das aufrufende Skript benötigt daher eine
+    # if __name__ == "__main__" Abfrage. Innerhalb des Visum-Skriptmenüs ist nur die sequentielle Berechnung möglich.
+    # Der Abbruch (cancel_token) wird beim Warten auf die Prozesse geprüft, noch nicht gestartete Aufgaben werden dann
+    # verworfen.
+    # @param n_jobs: Anzahl Prozesse, None = Anzahl Kerne. Es werden höchstens so viele Prozesse wie VFS gestartet
+    # @param list_vfs: Liste der zu berechnenden VFS. Falls nicht gegeben, werden alle VFS der Instanz berechnet
+    #  @return Keine Rückgabe. Die Ergebnisse werden intern gespeichert.
+    def calculate_main_parallel(self, n_jobs=None, list_vfs=None):
+        import os
+        from concurrent.futures import ProcessPoolExecutor, wait
 
+        if list_vfs is None:
+            list_vfs = self.vfs.keys()
+        list_vfs = sorted(list_vfs, key=self.vfs.get)
+        if n_jobs is None:
+            n_jobs = os.cpu_count() or 1
+        n_jobs = max(1, min(n_jobs, len(list_vfs)))
+
+        # benötigte Bezirksattribute
+        columns = list(dict.fromkeys(["No", "Name", "XCoord", "YCoord", self.attr_central_level,
+                                      self.attr_is_from_zone, self.attr_is_to_zone, "IsActive"]))
+        zones = self.zones[columns]
+
+        params = dict(attr_vfs=self.attr_central_level, dict_vfs=self.vfs,
+                      max_entfernung=self.nachbarschaftsgrad_vfs, anz_versorger=self.anz_versorger_vfs,
+                      attr_quelle=self.attr_is_from_zone, attr_ziel=self.attr_is_to_zone,
+                      formula_distance=self.formula_dist, triangulation=self.triangulation,
+                      graph=self.graph, graph_k=self.graph_k, graph_max_length=self.graph_max_length,
+                      tile_size=self.tile_size, tile_jobs=self.tile_jobs)
+        logging.info(f"Parallele Berechnung von {len(list_vfs)} VFS mit {n_jobs} Prozessen")
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(zones, params)) as pool:
+            futures = [pool.submit(_calculate_vfs_worker, vfs) for vfs in list_vfs]
+            try:
+                # Ergebnisse in der Reihenfolge von list_vfs
+                for i, (vfs, future) in enumerate(zip(list_vfs, futures)):
+                    while not wait([future], timeout=0.2).done:
+                        self.check_cancelled()
+                    self.matrizen_VFS[vfs] = future.result()
+                    self.report_progress("calculate_main", vfs, i + 1, len(list_vfs))
+            except CalculationCancelled:
+                for future in futures:
+                    future.cancel()
+                raise
+
+
+    ## Gibt die aktiven Bezirke einer Zentralitätsstufe zurück (Zentralität <= Attributwert, aktiv).
+    # Bezirke mit identischen Koordinaten führen zum Abbruch, da die Delaunay Triangulation dann nicht zuverlässig ist.
+    # @param value_vfs: Attributwert der VFS
+    # @return: DataFrame mit den aktiven Bezirken (Index der Bezirkstabelle)
+    def get_active_zones(self, value_vfs):
         # Filtere Bezirksdaten, die die Bedingungen erfüllen
         # Sind Aktiv todo Erweiterung Filterung nach attr_filter
         # TypNr <= VFS
@@ -385,110 +2178,315 @@ class LuftlinienCalculator:
             duplicate_zones = active_zones[active_zones.duplicated(subset=["XCoord", "YCoord"], keep=False)]
             duplicate_zones_string = ', '.join(duplicate_zones["No"].apply(lambda x: str(int(x))) + "/" + duplicate_zones["Name"])
             raise ValueError(f"Abbruch: Bezirke mit den identischen Koordinaten (NUMMER/NAME):{duplicate_zones_string}")
-        elif len(active_zones) < 3:
+
+        return active_zones
+
+
+    ## Gibt die Kanten der Delaunay Triangulation der aktiven Bezirke zurück.
+    # Falls vorhanden werden die Kanten aus calculate_delaunay_edges_nested übernommen, sonst wird trianguliert.
+    # @param vfs: Verbindungsfunktionsstufe (für die Protokollierung)
+    # @param value_vfs: Attributwert der VFS
+    # @param active_zones: aktive Bezirke (siehe get_active_zones)
+    # @return: Array (Anzahl Kanten x 2) mit den Indizes der Bezirkstabelle je Kante
+    def get_delaunay_edges(self, vfs, value_vfs, active_zones):
+        if value_vfs in self.delaunay_edges:
+            # Kanten aus der Triangulation der Stufe
+            edges = self.delaunay_edges[value_vfs]
+            logging.info(f"{vfs}: es wurden {len(edges)} Kanten aus der Triangulation der Stufe übernommen")
+        else:
+            # Delaunay Triangulation, Kanten (Indizes der aktiven Bezirke) -> Index in der Bezirkstabelle
+            edges = delaunay_edges(active_zones[["XCoord", "YCoord"]].values, self.triangulation == "spherical",
+                                   self.tile_size, self.tile_jobs, self.get_progress_callback("triangulation_tiles", vfs))
+            logging.info(f"{vfs}: es wurden {len(edges)} Kanten trianguliert")
+            edges = active_zones.index.values[edges]
+
+        return edges
+
+
+    ## Gibt die Kanten des Nachbarschaftsgraphen (siehe graph) der aktiven Bezirke zurück.
+    # Gabriel-Graph, Relative Neighbourhood Graph und längenbegrenzter Graph sind Teilgraphen der Delaunay
+    # Triangulation (siehe get_delaunay_edges), der k-Nächste-Nachbarn-Graph wird direkt über einen KD-Baum gebildet.
+    # Für sphärische Triangulation bzw. die Haversine Formel wird auf der Einheitskugel gesucht.
+    # @param vfs: Verbindungsfunktionsstufe (für die Protokollierung)
+    # @param value_vfs: Attributwert der VFS
+    # @param active_zones: aktive Bezirke (siehe get_active_zones)
+    # @return: Array (Anzahl Kanten x 2) mit den Indizes der Bezirkstabelle je Kante
+    def get_graph_edges(self, vfs, value_vfs, active_zones):
+        idx_zones = active_zones.index.values
+        array_points = active_zones[["XCoord", "YCoord"]].values
+        if self.graph == "knn":
+            edges = idx_zones[knn_edges(self.get_graph_points(array_points), self.graph_k)]
+            logging.info(f"{vfs}: es wurden {len(edges)} Kanten der {self.graph_k} nächsten Nachbarn gebildet")
+            return edges
+
+        edges = self.get_delaunay_edges(vfs, value_vfs, active_zones)
+        if self.graph == "delaunay":
+            return edges
+
+        # Index der Bezirkstabelle -> Position in den aktiven Bezirken (Index aufsteigend)
+        edges_active = np.searchsorted(idx_zones, edges)
+        if self.graph == "max_length":
+            length = calculate_edge_lengths(array_points, edges_active[:, 0], edges_active[:, 1], self.formula_dist)
+            edges_active = edges_active[length <= self.graph_max_length]
+        elif self.graph == "gabriel":
+            edges_active = gabriel_edges(self.get_graph_points(array_points), edges_active)
+        else:
+            edges_active = relative_neighbourhood_edges(self.get_graph_points(array_points), edges_active)
+
+        logging.info(f"{vfs}: {len(edges_active)} von {len(edges)} Kanten der Triangulation im Graph {self.graph}")
+        return idx_zones[edges_active]
+
+
+    ## Koordinaten für die Nachbarschaftsgraphen: Punkte auf der Einheitskugel bei sphärischer Triangulation oder
+    # Haversine Formel (Sehnendistanz, monoton zur Großkreisdistanz), sonst die x- & y-Koordinaten.
+    # @param array_points: Array mit den x- & y-Koordinaten
+    # @return: Array (Anzahl Punkte x 2 bzw. 3)
+    def get_graph_points(self, array_points):
+        if self.triangulation == "spherical" or self.formula_dist == "haversine":
+            return lonlat_to_unit_sphere(array_points[:, 0], array_points[:, 1])
+        return np.asarray(array_points, dtype=float)
+
+
+    ## Ermittelt für alle aktiven Quellbezirke, die selbst kein Versorgungszentrum sind, die nächstgelegenen
+    # Versorgungszentren in aufsteigender Entfernung.
+    # @param value_vfs: Attributwert der VFS
+    # @param active_zones: aktive Bezirke (siehe get_active_zones)
+    # @param anz_versorger: Anzahl der Versorgungszentren je Bezirk
+    # @param progress: optionale Funktion progress(done, total) je Block der Abfrage (siehe ProviderIndex.query)
+    # @return: Tupel (Indizes der Bezirke aufsteigend, Array Anzahl Bezirke x anz_versorger mit den Indizes der
+    # Versorgungszentren)
+    def get_ranked_providers(self, value_vfs, active_zones, anz_versorger, progress=None):
+        is_provider = ((self.zones[self.attr_central_level] < value_vfs)
+                       & (self.zones[self.attr_is_from_zone] > 0)).values
+        is_active_from_zone = np.zeros(len(self.zones), dtype=bool)
+        is_active_from_zone[active_zones.loc[active_zones[self.attr_is_from_zone] > 0, :].index] = True
+        idx_zones = np.flatnonzero(is_active_from_zone & ~is_provider)
+
+        idx_provider = self.get_provider_index(value_vfs).query(
+            self.zones.loc[idx_zones, ["XCoord", "YCoord"]].values, k=anz_versorger, progress=progress)
+
+        return idx_zones, idx_provider
+
+
+    ## Ergänzt die Verbindungen zu den Versorgungszentren.
+    # Jeder aktive Quellbezirk, der selbst kein Versorgungszentrum ist und an weniger als anz_versorger Zentren
+    # angeschlossen ist, wird mit den nächstgelegenen, noch nicht verbundenen Zentren verbunden.
+    # @param matrix: Adjazenzmatrix (obere Dreiecksmatrix, CSR)
+    # @param value_vfs: Attributwert der VFS
+    # @param anz_versorger: Anzahl der Versorgungszentren je Bezirk
+    # @param active_zones: aktive Bezirke (siehe get_active_zones)
+    # @param ranked_providers: optional vorab berechnete Rangfolge der Versorgungszentren mit mindestens anz_versorger
+    # Spalten (siehe get_ranked_providers). Falls None wird der räumliche Index abgefragt
+    # @param progress: optionale Funktion progress(done, total) je Block der Abfrage (siehe ProviderIndex.query)
+    # @return: Adjazenzmatrix (obere Dreiecksmatrix, CSR) inkl. der Versorgungsverbindungen
+    def connect_providers(self, matrix, value_vfs, anz_versorger, active_zones, ranked_providers=None, progress=None):
+        matrix_symm = upper_csr_to_symmetric(matrix)
+
+        # mögliche Versorgungszentren
+        is_provider = ((self.zones[self.attr_central_level] < value_vfs)
+                       & (self.zones[self.attr_is_from_zone] > 0)).values
+
+        # Bestimme für jeden Bezirk, an wie viele Versorgungszentren dieser bereits angeschlossen ist
+        # (Zeilensumme über die Spalten der Versorgungszentren)
+        no_provider = matrix_symm @ is_provider.astype(np.int64)
+
+        # Bezirke, die die Bedingung nicht erfüllen: aktive Quelle, selbst kein Versorgungszentrum und an zu
+        # wenige Versorgungszentren angeschlossen
+        is_active_from_zone = np.zeros(len(self.zones), dtype=bool)
+        is_active_from_zone[active_zones.loc[active_zones[self.attr_is_from_zone] > 0, :].index] = True
+        idx_zones = np.flatnonzero(is_active_from_zone & ~is_provider & (no_provider < anz_versorger))
+
+        # Für alle Bezirke, die die Bedingung nich erfüllen: Verbinde die nächsten k Versorgungszentren
+        # Auswahlkriterium: nächstgelegen. Unter den anz_versorger nächsten Zentren befinden sich mindestens
+        # die fehlenden, noch nicht verbundenen Zentren
+        if ranked_providers is None:
+            idx_provider = self.get_provider_index(value_vfs).query(
+                self.zones.loc[idx_zones, ["XCoord", "YCoord"]].values, k=anz_versorger, progress=progress)
+        else:
+            # Zeilen der vorab berechneten Rangfolge, die ersten anz_versorger Zentren
+            idx_ranked_zones, idx_ranked_provider = ranked_providers
+            idx_provider = idx_ranked_provider[np.searchsorted(idx_ranked_zones, idx_zones), :anz_versorger]
+
+        # falls bereits mit einem Versorgungszentrum verbunden -> Zentrum wird nicht erneut berücksichtigt
+        is_new = np.ones(idx_provider.shape, dtype=bool)
+        if idx_provider.size > 0:
+            idx_from = np.repeat(idx_zones, idx_provider.shape[1])
+            is_new = ~np.asarray(matrix_symm[idx_from, idx_provider.ravel()]).reshape(idx_provider.shape)
+
+        # je Bezirk die fehlende Anzahl an Versorgungszentren
+        no_missing = anz_versorger - no_provider[idx_zones]
+        is_selected = is_new & (np.cumsum(is_new, axis=1) <= no_missing[:, None])
+
+        list_from = np.broadcast_to(idx_zones[:, None], idx_provider.shape)[is_selected]
+        list_to = idx_provider[is_selected]
+
+        # Versorgungsverbindungen ergänzen (Oder-Verknüpfung)
+        return matrix + edges_to_upper_csr(list_from, list_to, len(self.zones))
+
+
+    ## Entfernt die Verbindungen zwischen Bezirken, die nicht als Quelle bzw. Ziel berücksichtigt werden.
+    # @param matrix: Adjazenzmatrix (obere Dreiecksmatrix, CSR)
+    # @return: Adjazenzmatrix (obere Dreiecksmatrix, CSR)
+    def mask_source_target(self, matrix):
+        from scipy import sparse
+
+        # Aufbau Maske mit aktiven und inaktiven OD Paaren
+        # Quelle und Ziel müssen aktiv sein und die transponierte Matrix davon (Symmetrie)
+        # Logik: Filtere OD-Paare mit Quelle & Ziel aktiv...
+        #
+        #  Quelle * Ziel  = Matrix
+        # (1 0).T * (1 1) = (1  1
+        #                    0  0)
+        #
+        # und symmetrisiere diese
+        # (1  1
+        #  1  0)
+
+        # Attribute Quelle und Ziel
+        vector_is_from_zone = self.zones[self.attr_is_from_zone].values.astype(bool)
+        vector_is_to_zone = self.zones[self.attr_is_to_zone].values.astype(bool)
+
+        # Maske nur für die vorhandenen Kanten (Zeilen- und Spaltenfilter), Aufwand O(Anzahl Kanten)
+        matrix = sparse.csr_matrix(matrix, dtype=bool, copy=True)
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        cols = matrix.indices
+        # symmetrisieren (Bool Oder-Verknüpfung): Wo OD-Relation, da DO-Relation
+        matrix.data &= ((vector_is_from_zone[rows] & vector_is_to_zone[cols])
+                        | (vector_is_to_zone[rows] & vector_is_from_zone[cols]))
+        matrix.eliminate_zeros()
+
+        return matrix
+
+
+    ## Parameterstudie über den Nachbarschaftsgrad (max_entfernung) und die Anzahl der Versorgungszentren
+    # (anz_versorger).
+    # Je VFS werden die Triangulation, die Entfernungen (Schritte, uint8) bis zum größten Nachbarschaftsgrad und die
+    # Rangfolge der nächstgelegenen Versorgungszentren bis zur größten Anzahl nur einmal berechnet. Jede Kombination
+    # (k, v) ergibt sich daraus über einen Schwellwert der Entfernung und die ersten v Zentren der Rangfolge.
+    # Die Ergebnisse der Instanz (matrizen_VFS) werden nicht verändert. Eine Kombination kann übernommen werden über
+    # calculator.matrizen_VFS.update(dict_results[(k, v)]).
+    # @param list_max_entfernung: Liste der Nachbarschaftsgrade k
+    # @param list_anz_versorger: Liste der Anzahlen Versorgungszentren v
+    # @param list_vfs: Liste der VFS. Falls nicht gegeben, werden alle VFS der Instanz verwendet
+    # @return: Tupel (dict_results, df_counts). dict_results: Dict (k, v) -> Dict VFS -> Adjazenzmatrix (obere
+    # Dreiecksmatrix, CSR). df_counts: DataFrame mit der Anzahl Verbindungen (ungerichtet) je Kombination (Zeilen, Index
+    # max_entfernung/anz_versorger) und VFS (Spalten)
+    def calculate_sweep(self, list_max_entfernung, list_anz_versorger, list_vfs=None):
+        from scipy import sparse
+
+        if list_vfs is None:
+            list_vfs = self.vfs.keys()
+        list_vfs = sorted(list_vfs, key=self.vfs.get)
+        list_max_entfernung = sorted(set(list_max_entfernung))
+        list_anz_versorger = sorted(set(list_anz_versorger))
+        max_k = list_max_entfernung[-1]
+        max_v = list_anz_versorger[-1]
+        n = len(self.zones)
+
+        logging.info(f"Parameterstudie für {len(list_max_entfernung)} x {len(list_anz_versorger)} Kombinationen")
+        self.check_cancelled()
+        self.calculate_delaunay_edges_nested()
+
+        dict_results = {(k, v): {} for k in list_max_entfernung for v in list_anz_versorger}
+        for vfs in list_vfs:
+            value_vfs = self.vfs[vfs]
+            active_zones = self.get_active_zones(value_vfs)
+            if len(active_zones) < 3:
+                logging.info(f"{vfs}: es sind zu wenige Bezirke aktiv")
+                for key in dict_results:
+                    dict_results[key][vfs] = sparse.csr_matrix((n, n), dtype=bool)
+                continue
+
+            # Entfernung (Schritte) bis zum größten Nachbarschaftsgrad
+            matrix_hops = sparse.csr_matrix((n, n), dtype=np.uint8)
+            if max_k > 0:
+                edges = self.get_graph_edges(vfs, value_vfs, active_zones)
+                matrix_hops = edges_to_upper_csr(edges[:, 0], edges[:, 1], n).astype(np.uint8)
+            if max_k > 1:
+                matrix_hops = calculate_hop_distances_k_steps(upper_csr_to_symmetric(matrix_hops), max_k,
+                                                              self.get_progress_callback("k_hop", vfs))
+
+            # Rangfolge der Versorgungszentren bis zur größten Anzahl
+            ranked_providers = None
+            if max_v > 0:
+                ranked_providers = self.get_ranked_providers(value_vfs, active_zones, max_v,
+                                                             self.get_progress_callback("providers", vfs))
+
+            for k in list_max_entfernung:
+                matrix_k = matrix_hops.copy()
+                matrix_k.data = matrix_k.data <= k
+                matrix_k.eliminate_zeros()
+                matrix_k = matrix_k.astype(bool)
+
+                for v in list_anz_versorger:
+                    matrix = matrix_k
+                    if v > 0:
+                        matrix = self.connect_providers(matrix, value_vfs, v, active_zones, ranked_providers)
+                    dict_results[(k, v)][vfs] = self.mask_source_target(matrix)
+
+            logging.info(f"Die Parameterstudie {vfs} ist abgeschlossen")
+            self.report_progress("calculate_sweep", vfs, list_vfs.index(vfs) + 1, len(list_vfs))
+
+        df_counts = pd.DataFrame({vfs: [dict_results[key][vfs].nnz for key in dict_results] for vfs in list_vfs},
+                                 index=pd.MultiIndex.from_tuples(dict_results.keys(),
+                                                                 names=["max_entfernung", "anz_versorger"]))
+
+        return dict_results, df_counts
+
+
+    ## Berechnet die Verbindungen einer VFS.
+    # @param vfs: die Verbindungsfunktionsstufe, für die Verbindungen ermittel werden
+    def calculate_vfs(self, vfs):
+
+        # Attributswert der Bezirke für die gewählte VFS
+        value_vfs = self.vfs[vfs]
+
+        # Attribute der VFS
+        k_nachbar = self.nachbarschaftsgrad_vfs[vfs]
+        anz_versorger = self.anz_versorger_vfs[vfs]
+
+        active_zones = self.get_active_zones(value_vfs)
+        if len(active_zones) < 3:
             logging.info(f"{vfs}: es sind zu wenige Bezirke aktiv")
         else:
             logging.info(f"{vfs}: Delauney Triangulation wird für {len(active_zones)} Bezirke durchgeführt")
 
             if k_nachbar > 0:
+                with self.measure_stage("triangulation", vfs) as counts:
+                    edges = self.get_graph_edges(vfs, value_vfs, active_zones)
 
-                # Delaunay Triangulation
-                tri = Delaunay(active_zones[["XCoord", "YCoord"]])
-                zone_orig_idx_triangles = active_zones.index.values[tri.simplices]
-                logging.info(f"{vfs}: es wurden {len(zone_orig_idx_triangles)} Dreiecke gebildet")
-
-                # Adjazenzmatrix ausfüllen
-                # Schleife über Dreiecke
-                for p1, p2, p3 in zone_orig_idx_triangles:
-                    # die drei Punkte des Dreiecks
-                    # folgende Abhängigkeiten sind einzufügen:
-                    # p1 - p2, p2 - p1, p1 - p3, p3 - p1, p3 - p2, p2 - p3
-                    self.matrizen_VFS[vfs][p1, p2] = 1
-                    self.matrizen_VFS[vfs][p1, p3] = 1
-                    self.matrizen_VFS[vfs][p2, p1] = 1
-                    self.matrizen_VFS[vfs][p2, p3] = 1
-                    self.matrizen_VFS[vfs][p3, p1] = 1
-                    self.matrizen_VFS[vfs][p3, p2] = 1
+                    # Adjazenzmatrix ausfüllen
+                    self.matrizen_VFS[vfs] = edges_to_upper_csr(edges[:, 0], edges[:, 1], len(self.zones))
+                    counts.update(zones=len(active_zones), edges=len(edges))
 
             # Nachbarschaften Grad n bestimmen
             if k_nachbar > 1:
                 logging.info(f"{vfs}: der Nachbarschaftsgrad muss berechnet werden")
-                adj_k_steps = self.calculate_reachability_max_steps(k_nachbar, vfs)
-                self.matrizen_VFS[vfs] = adj_k_steps
+                with self.measure_stage("k_hop", vfs) as counts:
+                    edges_before = self.matrizen_VFS[vfs].nnz
+                    adj_k_steps = self.calculate_reachability_max_steps(k_nachbar, vfs)
+                    self.matrizen_VFS[vfs] = adj_k_steps
+                    counts.update(edges=adj_k_steps.nnz, k_hop_expansions=adj_k_steps.nnz - edges_before)
 
             # Verbindungen mit Versorgungsfunktion
             if anz_versorger > 0:
-                # Erstelle für jeden Bezirk eine Liste der verbundenen Bezirke
-                df_list_zones = self.adj_matrix_to_set_of_connected_zones(vfs, use_zone_names=False)
-
-                # Tabelle der möglichen Versorgungszentren
-                provider = self.zones.loc[(self.zones[self.attr_central_level] < self.vfs[vfs])
-                                          & (self.zones[self.attr_is_from_zone] > 0), :]
-                # Menge der möglichen Versorgungszentren
-                set_names_provider = set(provider.index)
-
-                # Bestimme für jeden aktiven Bezirk, ob dieser bereits an ein Versorgungszentrum angeschlossen ist
-                df_list_zones = df_list_zones.loc[df_list_zones.index.isin(
-                    active_zones.loc[active_zones[self.attr_is_from_zone] > 0, :].index), :]
-                df_list_zones["no_provider"] = df_list_zones["set zones"].apply(set_names_provider.intersection).apply(
-                    len)
-                df_list_zones["provider"] = (df_list_zones.index.isin(set_names_provider)) \
-                                            | (df_list_zones["no_provider"] >= anz_versorger)
-
-                # Für alle Bezirke, die die Bedingung nich erfüllen: Verbinde die nächsten k Versorgungszentren
-                for zone in df_list_zones.index[df_list_zones["provider"] < True]:
-                    zone_data = self.zones.loc[zone, :]
-
-                    # falls bereits mit einem Versorgungszentrum verbunden -> Lösche das Zentrum aus der Menge der Punkte
-                    tmp_set_provider = set_names_provider - df_list_zones.loc[zone, "set zones"]
-                    provider_tmp = provider.loc[list(tmp_set_provider), :]
-
-                    # Bestimme die fehlende Anzahl an Versorgungszentren
-                    # Auswahlkriterium: nächstgelegen
-                    list_idx_provider = get_nearest_points_from_set(x_point=zone_data.loc["XCoord"],
-                                                                    y_point=zone_data.loc["YCoord"],
-                                                                    n=anz_versorger - df_list_zones.loc[
-                                                                        zone, "no_provider"],
-                                                                    array_points=provider_tmp[
-                                                                        ["XCoord", "YCoord"]].values,
-                                                                    formula=self.formula_dist)
-                    self.matrizen_VFS[vfs][zone, provider_tmp.index[list_idx_provider]] = 1
-                    self.matrizen_VFS[vfs][provider_tmp.index[list_idx_provider], zone] = 1
-                    # debugbefehl Entfernungen
-                    # distances = calculate_distance_coordinates(x1=zone_data.loc["XCoord"], y1=zone_data.loc["YCoord"],
-                    #                                            vec_x2=provider_tmp.loc[:, "XCoord"].values,
-                    #                                            vec_y2=provider_tmp.loc[:, "YCoord"].values)
+                with self.measure_stage("providers", vfs) as counts:
+                    edges_before = self.matrizen_VFS[vfs].nnz
+                    self.matrizen_VFS[vfs] = self.connect_providers(self.matrizen_VFS[vfs], value_vfs, anz_versorger,
+                                                                    active_zones,
+                                                                    progress=self.get_progress_callback("providers", vfs))
+                    counts.update(edges=self.matrizen_VFS[vfs].nnz,
+                                  providers_connected=self.matrizen_VFS[vfs].nnz - edges_before)
 
             # inaktive Quelle oder Ziel
+            with self.measure_stage("masking", vfs) as counts:
+                edges_before = self.matrizen_VFS[vfs].nnz
+                self.matrizen_VFS[vfs] = self.mask_source_target(self.matrizen_VFS[vfs])
+                counts.update(edges=self.matrizen_VFS[vfs].nnz, edges_removed=edges_before - self.matrizen_VFS[vfs].nnz)
 
-            # Aufbau Maske mit aktiven und inaktiven OD Paaren
-            # Quelle und Ziel müssen aktiv sein und die transponierte Matrix davon (Symmetrie)
-            # Logik: Filtere OD-Paare mit Quelle & Ziel aktiv...
-            #
-            #  Quelle * Ziel  = Matrix
-            # (1 0).T * (1 1) = (1  1
-            #                    0  0)
-            #
-            # und symmetrisiere diese
-            # (1  1
-            #  1  0)
-
-            # Attribute Quelle und Ziel
-            vector_is_from_zone = self.zones[self.attr_is_from_zone].values
-            vector_is_to_zone = self.zones[self.attr_is_to_zone].values
-            # über dyadisches Produkt ("outer product") verknüpfen
-            # Logik als Maske über existierende Matrix legen
-            idx_active = np.outer(vector_is_from_zone, vector_is_to_zone).astype(bool)
-            # symmetrisieren der Matrix (Bool Oder-Verknüpfung mit transponierter Matrix)
-            # Wo OD-Relation, da DO-Relation
-            idx_active_symm = idx_active + idx_active.T
-
-            # Adjazenzmatrix wird mit Maske multipliziert, um die Werte der aktiven Paare zu enthalten
-            self.matrizen_VFS[vfs] = self.matrizen_VFS[vfs] * idx_active_symm.astype(int)
-
-            # Symmetrietest
-            if np.sum(self.matrizen_VFS[vfs] - self.matrizen_VFS[vfs].T) > 0:
-                raise ValueError("Matrix ist nicht symmetrisch")
+            # Symmetrietest: die Symmetrie ist über die obere Dreiecksmatrix gegeben
+            if not is_upper_triangular(self.matrizen_VFS[vfs]):
+                raise ValueError("Matrix ist keine obere Dreiecksmatrix")
 
             # debugzwecke
             if self.debug_mode:
@@ -502,9 +2500,9 @@ class LuftlinienCalculator:
 
             logging.info(f"Die Berechnung {vfs} ist abgeschlossen")
 
-            df_zones_info = self.adj_matrix_to_set_of_connected_zones(vfs)
-            df_zones_info["set zones"] = df_zones_info["set zones"].str.join(",")
-            logging.info('\t' + df_zones_info.to_string().replace('\n', '\n\t'))
+            # Kennwerte der Verbindungen, die vollständige Tabelle je Bezirk nur im Loglevel DEBUG
+            logging.info("%s", LazyMessage(self.format_summary_vfs, vfs))
+            logging.debug("%s", LazyMessage(self.format_zones_info, vfs))
 
     ## Löscht Knoten in Visum, die keine Strecken anbinden.
     # Alle Knoten ohne Strecken werden gefiltert & die aktiven Knoten werden gelöscht.
@@ -531,6 +2529,9 @@ class LuftlinienCalculator:
         # Filter initialisieren
         self.visum.Filters.NodeFilter().Init()
 
+        # gelöschte Knoten werden beim nächsten Delta-Export ggf. wieder benötigt -> nächster Export vollständig
+        self.exported_links = self.exported_links.iloc[:0]
+
         logging.info(f"{n} isolierte Knoten wurden gelöscht")
 
 
@@ -539,264 +2540,505 @@ class LuftlinienCalculator:
     # Vorhandene Matrizen werden überschrieben.
     # @param visum: optionale Übergabe einer Visuminstanz. Default None
     # @param list_vfs: optionale Übergabe einer Menge an VFS. Default: None (alle des Objekts)
-    def export_matrix(self, list_vfs=None):
+    # @param file_format: Dateiformat ohne Visuminstanz. "dense": $O Format mit allen OD-Paaren (Default),
+    # "sparse": $O Format nur mit OD-Paaren ungleich 0, "npz": kompaktes Binärformat (siehe export_matrix_file_sparse)
+    # @param compress: falls True werden die Dateien im Format "sparse" mit gzip komprimiert (.mtx.gz)
+    # @param chunk_size: Anzahl der Bezirke (Zeilen), die je Block geschrieben werden
+    # @param distance: falls True wird je VFS zusätzlich die Matrix der Luftliniendistanzen der Verbindungen als Datei
+    # geschrieben (dünnbesetzt, Format "npz" bzw. sonst "sparse", Dateiname mit Zusatz _distance, siehe
+    # get_matrix_distance). Auch mit Visuminstanz wird die Distanzmatrix nur als Datei exportiert
+    def export_matrix(self, list_vfs=None, file_format="dense", compress=False, chunk_size=10000, distance=False):
 
         # Falls Visuminstanz erkannt: erstelle & exportiere Daten in Visum
         # Sonst: Speichere .mtx Datei
 
         if list_vfs is None:
             list_vfs = self.vfs.keys()
+        list_vfs = list(list_vfs)
+
+        with self.measure_stage("export_matrix") as counts:
+            list_paths = []
+            if distance:
+                list_paths = self.export_matrix_file_sparse(list_vfs, file_format="npz" if file_format == "npz"
+                                                            else "sparse", compress=compress, chunk_size=chunk_size,
+                                                            values="distance")
+                logging.info(f"{len(list_vfs)} Distanzmatrizen wurden exportiert")
+
+            if self.visum is None and file_format != "dense":
+                list_paths += self.export_matrix_file_sparse(list_vfs, file_format=file_format, compress=compress,
+                                                             chunk_size=chunk_size)
+                counts.update(matrices=len(list_vfs), bytes_written=sum(path.stat().st_size for path in list_paths))
+                logging.info(f"{len(list_vfs)} Matrizen wurden exportiert")
+                return
+
+            for vfs in list_vfs:
+                if self.visum is not None:
+                    # Benennung
+                    if self.anz_versorger_vfs[vfs] < 1:
+                        # Term mit Versorgungsfkt wird weggelassen
+                        name_matrix = f"RIN_{vfs}_n={self.nachbarschaftsgrad_vfs[vfs]}"
+                    else:
+                        # Term mit Versorgungsfkt wird hinzugefügt
+                        name_matrix = f"RIN_{vfs}_n={self.nachbarschaftsgrad_vfs[vfs]}_v={self.anz_versorger_vfs[vfs]}"
 
-        for vfs in list_vfs:
-            matrix = self.matrizen_VFS[vfs]
-            if self.visum is not None:
-                # Benennung
-                if self.anz_versorger_vfs[vfs] < 1:
-                    # Term mit Versorgungsfkt wird weggelassen
-                    name_matrix = f"RIN_{vfs}_n={self.nachbarschaftsgrad_vfs[vfs]}"
-                else:
-                    # Term mit Versorgungsfkt wird hinzugefügt
-                    name_matrix = f"RIN_{vfs}_n={self.nachbarschaftsgrad_vfs[vfs]}_v={self.anz_versorger_vfs[vfs]}"
-
-                if self.visum.Net.Matrices.Count < 1:
-                    # Erstelle Matrix
-                    matrix_instance = self.visum.Net.AddMatrix(-1, 2, 3)
-                    matrix_instance.SetAttValue("CODE", name_matrix)
-                    matrix_instance.SetAttValue("NAME", name_matrix)
-                else:
-                    # Suche existierende Matrizen mit der Benennung
-                    matrix_instances = self.visum.Net.Matrices.ItemsByRef(f'''Matrix([CODE]= "{name_matrix}") ''')
-
-                    if matrix_instances.Count < 1:
+                    if self.visum.Net.Matrices.Count < 1:
                         # Erstelle Matrix
                         matrix_instance = self.visum.Net.AddMatrix(-1, 2, 3)
                         matrix_instance.SetAttValue("CODE", name_matrix)
                         matrix_instance.SetAttValue("NAME", name_matrix)
-                    elif matrix_instances.Count > 1:
-                        logging.warning("Matrixcode ist mehrfach vorhanden")
-                        matrix_instance = matrix_instances.Iterator.Item
                     else:
-                        matrix_instance = matrix_instances.Iterator.Item
+                        # Suche existierende Matrizen mit der Benennung
+                        matrix_instances = self.visum.Net.Matrices.ItemsByRef(f'''Matrix([CODE]= "{name_matrix}") ''')
+
+                        if matrix_instances.Count < 1:
+                            # Erstelle Matrix
+                            matrix_instance = self.visum.Net.AddMatrix(-1, 2, 3)
+                            matrix_instance.SetAttValue("CODE", name_matrix)
+                            matrix_instance.SetAttValue("NAME", name_matrix)
+                        elif matrix_instances.Count > 1:
+                            logging.warning("Matrixcode ist mehrfach vorhanden")
+                            matrix_instance = matrix_instances.Iterator.Item
+                        else:
+                            matrix_instance = matrix_instances.Iterator.Item
+
+                    # Visum benötigt die vollständige (dichte) Matrix
+                    matrix_instance.SetValues(self.get_matrix_dense(vfs))
 
-                matrix_instance.SetValues(matrix)
-
-            else:
-                if self.path_output is None:
-                    path_mat = Path.cwd()
                 else:
-                    path_mat = self.path_output
+                    path_mat = self.get_path_matrix(vfs)
+                    df_mat = pd.DataFrame(self.get_matrix_dense(vfs),
+                                          columns=self.zones["No"].values.astype(int),
+                                          index=self.zones["No"].values.astype(int)
+                                          , dtype=int
+                                          ).stack().reset_index()
+
+                    with open(path_mat, "w", newline='\n') as f:
+                        f.write(MTX_HEADER)
+                        df_mat.to_csv(f, header=False, sep=" ", index=False)
+                    list_paths.append(path_mat)
+
+            counts.update(matrices=len(list_vfs), bytes_written=sum(path.stat().st_size for path in list_paths))
+            logging.info(f"{len(list_vfs)} Matrizen wurden exportiert")
+
+
+    ## Exportiert die Adjazenzmatrizen dünnbesetzt als Dateien, ohne eine vollständige Matrix aufzubauen.
+    # "sparse": $O Format, es werden nur die OD-Paare mit Wert 1 geschrieben (fehlende Paare entsprechen 0).
+    # Die Zeilen werden blockweise für alle VFS in einem Durchlauf in die jeweilige Datei geschrieben.
+    # "npz": komprimierte numpy Datei mit den CSR Arrays (indptr, indices), der Dimension (shape) und den
+    # Bezirksnummern (zone_no) der symmetrischen Matrix. Das Visum Binärformat wird nicht unterstützt.
+    # Mit values="distance" werden statt 1 die Luftliniendistanzen der Verbindungen geschrieben (siehe
+    # get_matrix_distance, npz zusätzlich mit dem Array data), der Dateiname erhält den Zusatz _distance.
+    # @param list_vfs: Liste der VFS, je VFS wird eine Datei geschrieben
+    # @param file_format: "sparse" oder "npz"
+    # @param compress: falls True werden die $O Dateien mit gzip komprimiert (.mtx.gz)
+    # @param chunk_size: Anzahl der Bezirke (Zeilen), die je Block geschrieben werden
+    # @param values: Matrixwerte, "connectivity" (1 je Verbindung) oder "distance" (Luftliniendistanz)
+    # @return: Liste der geschriebenen Dateien (Path)
+    def export_matrix_file_sparse(self, list_vfs, file_format="sparse", compress=False, chunk_size=10000,
+                                  values="connectivity"):
+        import gzip
+
+        zone_no = self.zones["No"].values.astype(np.int64)
+        if values == "connectivity":
+            dict_matrices = {vfs: self.get_matrix_symmetric(vfs) for vfs in list_vfs}
+            suffix = ""
+        elif values == "distance":
+            dict_matrices = {vfs: self.get_matrix_distance(vfs) for vfs in list_vfs}
+            suffix = "_distance"
+        else:
+            raise ValueError(f"Matrixwerte sind nicht implementiert: {values}")
+
+        if file_format == "npz":
+            list_paths = [self.get_path_matrix(vfs, f"{suffix}.npz") for vfs in list_vfs]
+            for path_mat, matrix in zip(list_paths, dict_matrices.values()):
+                arrays = dict(indptr=matrix.indptr, indices=matrix.indices, shape=np.array(matrix.shape),
+                              zone_no=zone_no)
+                if values == "distance":
+                    arrays["data"] = matrix.data
+                np.savez_compressed(path_mat, **arrays)
+            return list_paths
+        elif file_format != "sparse":
+            raise ValueError(f"Dateiformat ist nicht implementiert: {file_format}")
+
+        list_paths = [self.get_path_matrix(vfs, f"{suffix}.mtx.gz" if compress else f"{suffix}.mtx")
+                      for vfs in list_vfs]
+        with ExitStack() as stack:
+            # eine Datei je VFS
+            dict_files = {}
+            for vfs, path_mat in zip(list_vfs, list_paths):
+                if compress:
+                    f = stack.enter_context(gzip.open(path_mat, "wt", newline="\n"))
+                else:
+                    f = stack.enter_context(open(path_mat, "w", newline="\n"))
+                f.write(MTX_HEADER)
+                dict_files[vfs] = f
+
+            # ein Durchlauf über die Zeilenblöcke, je Block werden alle VFS geschrieben
+            for start in range(0, len(zone_no), chunk_size):
+                for vfs, matrix in dict_matrices.items():
+                    block = matrix[start:start + chunk_size].tocoo()
+                    if block.nnz == 0:
+                        continue
+                    if values == "distance":
+                        np.savetxt(dict_files[vfs],
+                                   np.column_stack([zone_no[block.row + start], zone_no[block.col], block.data]),
+                                   fmt=["%d", "%d", "%.6f"], delimiter=" ")
+                    else:
+                        np.savetxt(dict_files[vfs],
+                                   np.column_stack([zone_no[block.row + start], zone_no[block.col],
+                                                    np.ones(block.nnz, dtype=np.int64)]),
+                                   fmt="%d", delimiter=" ")
 
-                path_mat = path_mat / f"{vfs}_max_nachbar_{self.nachbarschaftsgrad_vfs[vfs]}_anz_versorgungszentren_{self.anz_versorger_vfs[vfs]}.mtx"
-                df_mat = pd.DataFrame(self.matrizen_VFS[vfs],
-                                      columns=self.zones["No"].values.astype(int),
-                                      index=self.zones["No"].values.astype(int)
-                                      , dtype=int
-                                      ).stack().reset_index()
+        return list_paths
 
-                with open(path_mat, "w", newline='\n') as f:
-                    str_header = '''$O
-* Universität Stuttgart
-*
-* Verbindungsfunktionsstufe 5
-*
-* symmetrische Matrix
-*
-* Parameter
-* Nachbarschaftsniveau Z-Z:
-* Nachbarschaftsniveau Z-Z+:
-*
-* Zeitbereich
-0 24
-*
-* Faktor
-*
-1.0
-*
-* VonBezirk NachBezirk Matrixwert
-'''
 
-                    f.write(str_header)
-                    df_mat.to_csv(f, header=False, sep=" ", index=False)
+    ## Dateipfad einer exportierten Matrix
+    # @param vfs: Name der VFS
+    # @param suffix: Dateiendung, default .mtx
+    # @return: Path
+    def get_path_matrix(self, vfs, suffix=".mtx"):
+        if self.path_output is None:
+            path_mat = Path.cwd()
+        else:
+            path_mat = Path(self.path_output)
 
-        logging.info(f"{len(list_vfs)} Matrizen wurden exportiert")
+        return path_mat / f"{vfs}_max_nachbar_{self.nachbarschaftsgrad_vfs[vfs]}_anz_versorgungszentren_{self.anz_versorger_vfs[vfs]}{suffix}"
 
 
     ## Erstellt die Infrastrukturobjekte als Vorbereitung für den Export der Infrastruktur in Form von dicts für Knoten, Strecken, Streckentypen.
     # Wird aufgerufen, falls beim Export ein Objekt nicht in den dicts vorhanden ist.
     # Verhindert die Mehrfachanlegung von Strecken und Knoten.
+    # Wurden bereits Strecken exportiert (exported_links), bleiben die Knoten- und Streckentypnummern erhalten und
+    # bereits exportierte Kanten behalten ihre Streckennummer. Neue Kanten werden im Anschluss fortlaufend nummeriert.
     #  @return Keine Rückgabe. Die Ergebnisse werden intern gespeichert.
     def extract_net(self):
 
-        # Erstelle eine Knotenliste
-        df_nodes = self.zones.copy()
-        # Überarbeiten
-        df_nodes = df_nodes.astype({'No': int, self.attr_central_level: int})
+        with self.measure_stage("extract_net") as counts:
+            # Erstelle eine Knotenliste
+            df_nodes = self.zones.copy()
+            # Überarbeiten
+            df_nodes = df_nodes.astype({'No': int, self.attr_central_level: int})
+
+            # Erstelle eine Zuordnung Bezirke -> Knoten
+            if self.visum is None:
+                no_node_start = 1
+                no_link_start = 1
+                no_linktype_start = 1
+            else:
+                no_link_max = int(self.visum.Net.AttValue(r"Max:Links\No") or 0)
+                no_linktype_max = int(self.visum.Net.AttValue(r"Max:LinkTypes\No") or 0)
+                no_node_max = int(self.visum.Net.AttValue(r"Max:Nodes\No") or 0)
+
+                no_node_start = no_node_max + 1
+                no_link_start = no_link_max + 1
+                no_linktype_start = no_linktype_max + 1
+
+            # Zuordnung der alten Nummerierung zur neuen
+            # dict_no_nodes kann verwendet werden, um Anbindungen zu überzeugen, da es die alten Nummern (von zones) mit den neuen Nummern (nodes) verknüpft
+            # dict[]
+            if len(self.exported_links) == 0:
+                self.dict_export_zone2node = dict(
+                    zip(df_nodes["No"].astype(int).drop_duplicates(), range(no_node_start, no_node_start + len(df_nodes) + 1)))
+
+                # Füge Streckentyp in dict hinzu dict[Name]=Nummer
+                self.dict_export_linktypes = dict(
+                    zip(self.vfs.keys(), range(no_linktype_start, no_linktype_start + len(self.vfs.keys()) + 1)))
+
+            # Erstelle Streckenliste: Kanten aller VFS als Indexpaare (obere Dreiecksmatrix) mit Bitmaske der VFS
+            list_vfs = list(self.vfs.keys())
+            idx_from, idx_to, mask_vfs = merge_upper_csr_edges([self.matrizen_VFS[vfs] for vfs in list_vfs])
+
+            # Übersetze Id in Knotennummer
+            node_no = df_nodes["No"].map(self.dict_export_zone2node).values.astype(np.int64)
+            from_node = node_no[idx_from]
+            to_node = node_no[idx_to]
+
+            # Übersetze kleinste VFS in TypeNo
+            array_linktypes = np.array([self.dict_export_linktypes[vfs] for vfs in list_vfs], dtype=np.int64)
+            type_no = array_linktypes[mask_to_min_vfs_position(mask_vfs, list_vfs)]
+
+            # Nummerierung je ungerichteter Kante (Hin- & Gegenrichtung erhalten dieselbe Nummer)
+            # bereits exportierte Kanten behalten ihre Nummer
+            key = idx_from * len(self.zones) + idx_to
+            link_no = np.zeros(len(key), dtype=np.int64)
+            is_new = np.ones(len(key), dtype=bool)
+            if len(self.exported_links) > 0:
+                keys_exported = self.exported_links["Key"].values
+                pos = np.minimum(np.searchsorted(keys_exported, key), len(keys_exported) - 1)
+                is_new = keys_exported[pos] != key
+                link_no[~is_new] = self.exported_links["No"].values[pos[~is_new]]
+                no_link_start = max(no_link_start, int(self.exported_links["No"].max()) + 1)
+            link_no[is_new] = np.arange(no_link_start, no_link_start + is_new.sum(), dtype=np.int64)
+
+            # Luftlinienlänge je ungerichteter Kante in km (Längeneinheit der Netzdatei)
+            length = self.get_edge_lengths(idx_from, idx_to) * NET_LENGTH_FACTOR[self.formula_dist]
+
+            df_edges = pd.DataFrame({"No": link_no,
+                                     "FromNodeNo": from_node,
+                                     "ToNodeNo": to_node,
+                                     "TypeNo": type_no,
+                                     "Length": length.round(6),
+                                     "Name": (pd.Series(np.minimum(from_node, to_node)).astype(str) + "_"
+                                              + pd.Series(np.maximum(from_node, to_node)).astype(str)).values,
+                                     "Key": key,
+                                     "VFSMask": mask_vfs})
+
+            # Gegenrichtung ergänzen, sortiert nach Von- und Nach-Bezirk
+            df_edges_back = df_edges.rename(columns={"FromNodeNo": "ToNodeNo", "ToNodeNo": "FromNodeNo"})
+            df_edges = pd.concat([df_edges, df_edges_back[df_edges.columns]], ignore_index=True)
+            order = np.lexsort((np.concatenate([idx_to, idx_from]), np.concatenate([idx_from, idx_to])))
+
+            self.edges = df_edges.iloc[order].reset_index(drop=True)
+            self.list_export_vfs = list_vfs
+            counts.update(edges=len(idx_from), links=len(self.edges))
+
+
+    ## Prüft, ob die Streckentabelle für den Export (self.edges) die aktuellen Verbindungen der VFS enthält.
+    # @param list_vfs: Liste der VFS, die exportiert werden sollen
+    # @return: True, falls extract_net nicht erneut ausgeführt werden muss
+    def is_export_net_current(self, list_vfs):
+        if len(self.edges) < 1 or not set(list_vfs).issubset(self.list_export_vfs):
+            return False
+
+        # Vergleich der Kanten (Integer Schlüssel) der aktuellen Ergebnisse mit der Streckentabelle
+        idx_from, idx_to, _ = merge_upper_csr_edges([self.matrizen_VFS[vfs] for vfs in list_vfs])
+        is_selected = (self.edges["VFSMask"].values & vfs_to_mask(list_vfs, self.list_export_vfs)) > 0
+
+        return np.array_equal(idx_from * len(self.zones) + idx_to, np.unique(self.edges["Key"].values[is_selected]))
 
-        # Erstelle eine Zuordnung Bezirke -> Knoten
-        if self.visum is None:
-            no_node_start = 1
-            no_link_start = 1
-            no_linktype_start = 1
-        else:
-            no_link_max = int(self.visum.Net.AttValue(r"Max:Links\No") or 0)
-            no_linktype_max = int(self.visum.Net.AttValue(r"Max:LinkTypes\No") or 0)
-            no_node_max = int(self.visum.Net.AttValue(r"Max:Nodes\No") or 0)
 
-            no_node_start = no_node_max + 1
-            no_link_start = no_link_max + 1
-            no_linktype_start = no_linktype_max + 1
+    ## Exportiert eine Netzdatei
+    # falls eine Visuminstanz übergeben wird, wird die Netdatei in Visum geladen
+    # @param visum: optionale Übergabe einer Visuminstanz. Default None
+    # @param links_additive: falls False werden die existierenden Strecken in Visum gelöscht
+    # @param list_vfs: Liste der VFS, die berücksichtigt werden sollen. Default: Alle des Objekts
+    def export_net(self, links_additive=True, list_vfs=None, create_connectors=True):
+
+        with self.measure_stage("export_net") as counts:
+            if list_vfs is None:
+                list_vfs = self.vfs.keys()
+
+            path_net = self.get_path_net(list_vfs)
 
-        # Zuordnung der alten Nummerierung zur neuen
-        # dict_no_nodes kann verwendet werden, um Anbindungen zu überzeugen, da es die alten Nummern (von zones) mit den neuen Nummern (nodes) verknüpft
-        # dict[]
-        self.dict_export_zone2node = dict(
-            zip(df_nodes["No"].astype(int).drop_duplicates(), range(no_node_start, no_node_start + len(df_nodes) + 1)))
+            # Check: Extract_net notwendig?
+            if not self.is_export_net_current(list_vfs):
+                self.extract_net()
 
-        # Füge Streckentyp in dict hinzu dict[Name]=Nummer
-        self.dict_export_linktypes = dict(
-            zip(self.vfs.keys(), range(no_linktype_start, no_linktype_start + len(self.vfs.keys()) + 1)))
 
-        # Erstelle Streckenliste
-        df_edges = self.adj_matrix_to_links()
-        # Neue Knotennummern
+            if len(self.edges) < 1:
+                logging.info("Keine Strecken zum Exportieren, Abbruch")
+                return
 
-        # Übersetze VFS in TypeNo
-        df_edges["TypeNo"].replace(self.dict_export_linktypes, inplace=True)
+            df_nodes = self.zones.copy()
 
-        # Übersetze Id in Bezirksnummer
-        df_edges["FromNodeNo"].replace(self.dict_export_zone2node, inplace=True)
-        df_edges["ToNodeNo"].replace(self.dict_export_zone2node, inplace=True)
+            if "TypeNo" not in df_nodes.columns.tolist():
+                df_nodes["TypeNo"] = df_nodes[self.attr_central_level]
 
-        # Hinzufügen einer Nummer
-        # 1. Identifikation der Hin- & Gegenrichtung
-        df_edges["No"] = df_edges[["FromNodeNo", "ToNodeNo"]].min(axis=1).astype(str) + "_" + df_edges[
-            ["FromNodeNo", "ToNodeNo"]].max(axis=1).astype(str)
+            # Überarbeiten
+            df_nodes = df_nodes.astype({'No': int, 'TypeNo': int})
+            df_nodes.loc[:, 'Name'] = 'LLT ' + df_nodes['No'].astype(int).astype(str) + ' ' + df_nodes['Name']
+            df_nodes["CODE"] = df_nodes["No"].astype(int)
+            # Bezirksnummer -> Knotennummer
+            df_nodes["No"] = df_nodes["No"].map(self.dict_export_zone2node).astype(np.int64)
+            df_nodes = df_nodes[['No', 'Name', 'XCoord', 'YCoord', 'TypeNo', 'CODE']]
 
-        # 2. Nummerierung
-        self.dict_export_links_vfs= dict(zip(df_edges["No"].drop_duplicates(), range(no_link_start, no_link_start + int(len(df_edges) / 2) + 1)))
+            # Auswahl der Strecken der gewünschten VFS über die Bitmaske
+            df_edges = self.edges.loc[(self.edges["VFSMask"].values & vfs_to_mask(list_vfs, self.list_export_vfs)) > 0, :]
 
-        # Test: für jede Strecke existiert eine Nummer
-        if len(self.dict_export_links_vfs) != len(df_edges["No"].drop_duplicates()):
-            logging.error("Streckennummerierung passt nicht zur Streckeanzahl")
+            if self.visum is not None:
+                list_tsys_net = pd.DataFrame(self.visum.Net.TSystems.GetMultipleAttributes(["Code"])).squeeze().values.tolist()
+            else:
+                list_tsys_net = []
+            df_linktypes = pd.DataFrame.from_dict(self.dict_export_linktypes, orient="index").reset_index()
+            df_linktypes.columns = ["Name","No"]
+            df_linktypes["TSysSet"] = ",".join(list_tsys_net)
+            df_linktypes["Rank"] = df_linktypes["No"]
 
-        df_edges.loc[:, "Name"] = df_edges["No"]
-        df_edges["No"].replace(self.dict_export_links_vfs, inplace=True)
 
-        self.edges = df_edges
+            if create_connectors:
+                # Anbindungen vorbereiten von dict_no_nodes
+                df_conn = pd.DataFrame(list(self.dict_export_zone2node.items()), columns=["ZONENO", "NODENO"])
+                # Duplicate rows for Directions O/D
+                df_conn = pd.concat([df_conn] * 2, ignore_index=True)
+                # Sort the DataFrame so
+                df_conn.sort_values(by=["ZONENO", "NODENO"], inplace=True)
+                # Reset index
+                df_conn.reset_index(drop=True, inplace=True)
+                # Add DIRECTION column
+                df_conn["DIRECTION"] = ["O", "D"] * (len(df_conn) // 2)
+                # Add TSYSSET for IV-Sys
+                if self.visum is not None:
+                    tsys_net = pd.DataFrame(self.visum.Net.TSystems.GetMultipleAttributes(["CODE", "TYPE"]),
+                                            columns=["CODE", "TYPE"])
+                    list_ivtsys_net = tsys_net[tsys_net['TYPE'] != 'PUT']["CODE"].to_list()
+                else:
+                    list_ivtsys_net = []
+                df_conn["TSYSSET"] = ",".join(list_ivtsys_net)
+
+            # Schreibe .net Datei
+            with open(path_net, mode="w", newline="\n") as f:
+                f.write(NET_HEADER)
+                write_object_to_net("Node", df_nodes, f)
+                write_object_to_net("Link type", df_linktypes, f)
+                write_object_to_net("Link", df_edges[["No", "FromNodeNo", "ToNodeNo", "TypeNo", "Length", "Name"]], f)
+                if create_connectors:
+                    # Schreibe Tabelle: Connectors in die Net-Datei
+                    write_object_to_net("Connector", df_conn, f)
+            counts.update(links=len(df_edges), bytes_written=path_net.stat().st_size)
+
+            # Falls Visuminstanz übergeben: lade die .net Datei
+            if self.visum is not None:
+                # Konfliktmanagement
+                controller = self.visum.IO.CreateAddNetReadController()
 
+                if links_additive is not True:
+                    self.visum.Net.Links.RemoveAll(OnlyActive=True)
 
-    ## Exportiert eine Netzdatei
-    # falls eine Visuminstanz übergeben wird, wird die Netdatei in Visum geladen
-    # @param visum: optionale Übergabe einer Visuminstanz. Default None
-    # @param links_additive: falls False werden die existierenden Strecken in Visum gelöscht
-    # @param list_vfs: Liste der VFS, die berücksichtigt werden sollen. Default: Alle des Objekts
-    def export_net(self, links_additive=True, list_vfs=None, create_connectors=True):
+                self.visum.IO.LoadNet(path_net, ReadAdditive=True)
 
+                if self.visum.Net.Links.Count < len(df_edges):
+                    logging.warning("Fehler beim Import der Netzdatei")
+
+            # exportierte Strecken merken (ohne links_additive wurden die bisherigen Strecken gelöscht)
+            self.set_exported_links(df_edges, keep_exported=links_additive)
+
+            logging.info(f"die Netzdatei von {len(list_vfs)} VFS wurde nach Visum exportiert")
+
+
+    ## Dateipfad einer exportierten Netzdatei
+    # falls kein Dateipfad übergeben ist: Verwende Visumdateipfad, falls eine Visuminstanz existiert, ansonsten verwende
+    # den aktuellen Pfad
+    # @param list_vfs: Liste der exportierten VFS
+    # @param suffix: Namenszusatz, z.B. "_delta"
+    # @return: Path
+    def get_path_net(self, list_vfs, suffix=""):
         if self.path_output is None:
-            # falls kein Dateipfad übergeben ist: Verwende Visumdateipfad, falls eine Visuminstanz existiert, ansonsten verwende den aktuellen Pfad
             if self.visum is not None:
                 path_net = Path(self.visum.GetPath(1))
             else:
                 path_net = Path.cwd()
         else:
-            path_net = self.path_output
+            path_net = Path(self.path_output)
+
+        return path_net / f"{'_'.join(list_vfs)}{suffix}.net"
+
 
+    ## Aktualisiert die zuletzt exportierten Strecken (exported_links).
+    # @param df_edges: exportierte Strecken (Hin- und Gegenrichtung) mit den Spalten Key, No, FromNodeNo, ToNodeNo, TypeNo
+    # @param keep_exported: falls True bleiben die bisher exportierten Strecken erhalten (Vereinigung)
+    # @param keys_removed: optionale Schlüssel der Strecken, die aus den bisher exportierten Strecken entfernt wurden
+    def set_exported_links(self, df_edges, keep_exported=True, keys_removed=None):
+        df_links = df_edges.drop_duplicates("Key")[["Key", "No", "FromNodeNo", "ToNodeNo", "TypeNo"]]
+        if keep_exported:
+            df_exported = self.exported_links
+            if keys_removed is not None:
+                df_exported = df_exported.loc[~df_exported["Key"].isin(keys_removed), :]
+            df_links = pd.concat([df_exported, df_links], ignore_index=True).drop_duplicates("Key", keep="last")
+
+        self.exported_links = df_links.sort_values("Key").reset_index(drop=True)
+
+
+    ## Delta-Export der Strecken nach Visum: Gegenüber dem letzten Export (exported_links) werden nur neue Strecken
+    # eingefügt und nicht mehr vorhandene Strecken gelöscht. Strecken mit geändertem Streckentyp werden gelöscht und mit
+    # derselben Nummer neu eingefügt. Knoten, Streckentypen und Anbindungen bleiben unverändert.
+    # Nach dem Delta-Export entsprechen die exportierten Strecken den Verbindungen der gewählten VFS (wie beim Export
+    # mit links_additive=False). Ohne vorherigen Export wird vollständig exportiert (export_net).
+    # Ohne Visuminstanz wird nur die Netzdatei mit den neuen Strecken geschrieben, die zu löschenden Strecken werden
+    # zurückgegeben.
+    # @param list_vfs: Liste der VFS, die berücksichtigt werden sollen. Default: Alle des Objekts
+    # @return: Tupel (DataFrame neue Strecken (Hin- und Gegenrichtung), DataFrame gelöschte Strecken (je Kante eine Zeile))
+    def export_net_delta(self, list_vfs=None):
         if list_vfs is None:
             list_vfs = self.vfs.keys()
+        list_vfs = list(list_vfs)
 
-        path_net = path_net / f"{'_'.join(list_vfs)}.net"
+        if len(self.exported_links) == 0:
+            logging.info("Delta-Export: bisher wurden keine Strecken exportiert, es wird vollständig exportiert")
+            self.export_net(list_vfs=list_vfs)
+            return self.edges.loc[self.edges["Key"].isin(self.exported_links["Key"]), :], self.exported_links.iloc[:0]
 
-        # Check: Extract_net notwendig?
-        # Erstelle Streckenliste
-        df_edges = self.adj_matrix_to_links(list_vfs)
-        set_zones = set(df_edges['FromNodeNo']).union(set(df_edges['ToNodeNo']))
+        with self.measure_stage("export_net_delta") as counts:
+            if not self.is_export_net_current(list_vfs):
+                self.extract_net()
 
-        if (len(set_zones - set(self.dict_export_zone2node.keys())) > 0) | (len(df_edges) > len(self.edges)):
-            self.extract_net()
+            # Strecken der gewünschten VFS über die Bitmaske
+            df_edges = self.edges.loc[(self.edges["VFSMask"].values & vfs_to_mask(list_vfs, self.list_export_vfs)) > 0, :]
 
+            # Vergleich je Kante (Key) mit dem letzten Export
+            df_compare = df_edges.drop_duplicates("Key")[["Key", "TypeNo"]].merge(
+                self.exported_links[["Key", "TypeNo"]], on="Key", how="outer", suffixes=("", "_exported"), indicator=True)
+            is_changed = (df_compare["_merge"] == "both") & (df_compare["TypeNo"] != df_compare["TypeNo_exported"])
+            keys_added = df_compare.loc[(df_compare["_merge"] == "left_only") | is_changed, "Key"]
+            keys_removed = df_compare.loc[(df_compare["_merge"] == "right_only") | is_changed, "Key"]
 
-        if len(self.edges) < 1:
-            logging.info("Keine Strecken zum Exportieren, Abbruch")
-            return
+            df_added = df_edges.loc[df_edges["Key"].isin(keys_added), :]
+            df_removed = self.exported_links.loc[self.exported_links["Key"].isin(keys_removed), :]
 
-        df_nodes = self.zones.copy()
-
-        if "TypeNo" not in df_nodes.columns.tolist():
-            df_nodes["TypeNo"] = df_nodes[self.attr_central_level]
-
-        # Überarbeiten
-        df_nodes = df_nodes.astype({'No': int, 'TypeNo': int})
-        df_nodes.loc[:, 'Name'] = 'LLT ' + df_nodes['No'].astype(int).astype(str) + ' ' + df_nodes['Name']
-        df_nodes["CODE"] = df_nodes["No"].astype(int)
-        df_nodes["No"].replace(self.dict_export_zone2node, inplace=True)
-        df_nodes = df_nodes[['No', 'Name', 'XCoord', 'YCoord', 'TypeNo', 'CODE']]
-
-        df_edges = self.edges.loc[self.edges["ListTypeNo"].apply(lambda x: bool(set(x).intersection(list_vfs))), :]
-
-        list_tsys_net = pd.DataFrame(self.visum.Net.TSystems.GetMultipleAttributes(["Code"])).squeeze().values.tolist()
-        df_linktypes = pd.DataFrame.from_dict(self.dict_export_linktypes, orient="index").reset_index()
-        df_linktypes.columns = ["Name","No"]
-        df_linktypes["TSysSet"] = ",".join(list_tsys_net)
-        df_linktypes["Rank"] = df_linktypes["No"]
-
-
-        if create_connectors:
-            # Anbindungen vorbereiten von dict_no_nodes
-            df_conn = pd.DataFrame(list(self.dict_export_zone2node.items()), columns=["ZONENO", "NODENO"])
-            # Duplicate rows for Directions O/D
-            df_conn = pd.concat([df_conn] * 2, ignore_index=True)
-            # Sort the DataFrame so
-            df_conn.sort_values(by=["ZONENO", "NODENO"], inplace=True)
-            # Reset index
-            df_conn.reset_index(drop=True, inplace=True)
-            # Add DIRECTION column
-            df_conn["DIRECTION"] = ["O", "D"] * (len(df_conn) // 2)
-            # Add TSYSSET for IV-Sys
-            tsys_net = pd.DataFrame(self.visum.Net.TSystems.GetMultipleAttributes(["CODE", "TYPE"]),
-                                    columns=["CODE", "TYPE"])
-            list_ivtsys_net = tsys_net[tsys_net['TYPE'] != 'PUT']["CODE"].to_list()
-            df_conn["TSYSSET"] = ",".join(list_ivtsys_net)
-
-        # Schreibe .net Datei
-        with open(path_net, mode="w", newline="\n") as f:
-            header = '''$VISION
-* Universität Stuttgart Fakultät 2 Bau+Umweltingenieurwissenschaften Stuttgart
-* 08/23/22
-* 
-* Table: Version block
-* 
-$VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT
-13;Net;ENG;KM
+            # Netzdatei mit den neuen Strecken
+            path_net = self.get_path_net(list_vfs, "_delta")
+            with open(path_net, mode="w", newline="\n") as f:
+                f.write(NET_HEADER)
+                write_object_to_net("Link", df_added[["No", "FromNodeNo", "ToNodeNo", "TypeNo", "Length", "Name"]], f)
 
-'''
+            if self.visum is not None:
+                if len(df_removed) > 0:
+                    self.remove_links(df_removed)
 
-            f.write(header)
-            write_object_to_net("Node", df_nodes, f)
-            write_object_to_net("Link type", df_linktypes, f)
-            write_object_to_net("Link", df_edges[["No", "FromNodeNo", "ToNodeNo", "TypeNo", "Name"]], f)
-            if create_connectors:
-                # Schreibe Tabelle: Connectors in die Net-Datei
-                write_object_to_net("Connector", df_conn, f)
+                if len(df_added) > 0:
+                    controller = self.visum.IO.CreateAddNetReadController()
+                    self.visum.IO.LoadNet(path_net, ReadAdditive=True)
+
+            self.set_exported_links(df_added, keep_exported=True, keys_removed=keys_removed)
+            counts.update(links_added=len(keys_added), links_removed=len(keys_removed),
+                          bytes_written=path_net.stat().st_size)
 
-        # Falls Visuminstanz übergeben: lade die .net Datei
-        if self.visum is not None:
-            # Konfliktmanagement
-            controller = self.visum.IO.CreateAddNetReadController()
+        logging.info(f"Delta-Export {len(list_vfs)} VFS: {len(keys_added)} Strecken eingefügt, "
+                     f"{len(keys_removed)} Strecken gelöscht")
 
-            if links_additive is not True:
-                self.visum.Net.Links.RemoveAll(OnlyActive=True)
+        return df_added, df_removed
 
-            self.visum.IO.LoadNet(path_net, ReadAdditive=True)
 
-            if self.visum.Net.Links.Count < len(df_edges):
-                logging.warning("Fehler beim Import der Netzdatei")
+    ## Löscht Strecken in Visum gemeinsam statt einzeln: die Strecken werden über ein temporäres Streckenattribut
+    # markiert, gefiltert und mit RemoveAll gelöscht (wenige COM-Aufrufe statt einer Abfrage je Strecke).
+    # Der Streckenfilter wird dabei initialisiert.
+    # @param df_links: zu löschende Strecken mit den Spalten FromNodeNo und ToNodeNo (die Gegenrichtung wird ebenfalls
+    # gelöscht)
+    #  @return Keine Rückgabe. Die Visuminstanz wird verändert.
+    def remove_links(self, df_links):
+        str_remove = "RIN_Loeschen"
+        try:
+            self.visum.Net.Links.AddUserDefinedAttribute(str_remove, str_remove, str_remove, 1)
+        except:
+            pass
 
-        logging.info(f"die Netzdatei von {len(list_vfs)} VFS wurde nach Visum exportiert")
+        # Markierung aller Strecken (beide Richtungen) über die Knotennummern
+        array_from = np.array(self.visum.Net.Links.GetMultiAttValues("FromNodeNo"), dtype=np.int64)
+        array_to = np.array(self.visum.Net.Links.GetMultiAttValues("ToNodeNo"), dtype=np.int64)
+        from_node = df_links["FromNodeNo"].values.astype(np.int64)
+        to_node = df_links["ToNodeNo"].values.astype(np.int64)
+        keys_remove = pd.MultiIndex.from_arrays([np.concatenate([from_node, to_node]),
+                                                 np.concatenate([to_node, from_node])])
+        is_remove = pd.MultiIndex.from_arrays([array_from[:, 1], array_to[:, 1]]).isin(keys_remove)
+        self.visum.Net.Links.SetMultiAttValues(str_remove, np.column_stack([array_from[:, 0], is_remove.astype(int)]))
+
+        # Löschen über den Streckenfilter
+        filter = self.visum.Filters.LinkFilter()
+        filter.Init()
+        filter.AddCondition("OP_NONE", False, str_remove, "EqualVal", 1)
+        filter.UseFilter = True
+        self.visum.Net.Links.RemoveAll(OnlyActive=True)
+        filter.Init()
+
+        self.visum.Net.Links.DeleteUserDefinedAttribute(str_remove)
 
 
     ## Exportiert die Verbindungen sowie die Anzahl der Verbindungen als Bezirk UDAs nach Visum
     #  @return Keine Rückgabe. Die Visuminstanz wird verändert.
     def export_zones_uda_connections(self, vfs):
+        if self.visum is None:
+            logging.warning("Export Bezirksattribute: es ist keine Visuminstanz verknüpft")
+            return
+
         # Erstelle UDA wenn nicht vorhanden
 
         str_no_conn = f"RIN_Anz_Verbindungen_{vfs}".replace(" ", "")
@@ -812,35 +3054,44 @@ $VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT
         except:
             pass
 
-        # Lade Verbindungen
-        df_zones = self.adj_matrix_to_set_of_connected_zones(vfs).reset_index()
-        df_zones["No"] = df_zones.Name.replace(self.zones.set_index("Name")["No"].astype(int).to_dict())
-        df_zones.set_index("No", inplace=True)
+        # Lade Verbindungen, Zuordnung der Bezirksnummern über den Index der Bezirkstabelle
+        indptr, indices = self.get_neighbour_lists(vfs)
+        list_names = neighbour_lists_to_labels(indptr, indices, self.zones["Name"].values.astype(str))
+        df_zones = pd.DataFrame({str_conn: [",".join(x) for x in list_names], "no zones": np.diff(indptr)},
+                                index=pd.Index(self.zones["No"].values.astype(int), name="No"))
 
         # Schreibe das Ergebnis nach Visum
         df_format = pd.DataFrame(self.visum.Net.Zones.GetMultiAttValues("No"), columns=["Idx", "No"]).set_index("No")
 
         df_format = df_format.join(df_zones)
-        df_format[str_conn] = df_format["set zones"].str.join(",")
 
         self.visum.Net.Zones.SetMultiAttValues(str_no_conn, df_format.loc[:, ["Idx", "no zones"]].values)
         self.visum.Net.Zones.SetMultiAttValues(str_conn, df_format.loc[:, ["Idx", str_conn]].values)
 
 
     ## Initialisiert die Adjazenzmatrizen
+    # Je VFS wird nur die obere Dreiecksmatrix dünnbesetzt (CSR) gespeichert, da das Ergebnis symmetrisch ist.
     #  @return Keine Rückgabe. Die Ergebnisse werden intern gespeichert.
     def init_results(self):
+        from scipy import sparse
+
         dict_vfs = {}
         for vfs in self.vfs:
-            dict_vfs[vfs] = np.zeros([len(self.zones), len(self.zones)], dtype=bool)
+            dict_vfs[vfs] = sparse.csr_matrix((len(self.zones), len(self.zones)), dtype=bool)
 
-        ## Dict mit den resultierenden Adjazenzmatrizen der Verbindungsfunktionsstufen
+        ## Dict mit den resultierenden Adjazenzmatrizen (obere Dreiecksmatrix, scipy.sparse CSR) der Verbindungsfunktionsstufen
         self.matrizen_VFS = dict_vfs
+        ## Dict mit den Delaunay-Kanten (Index der Bezirkstabelle) je Attributwert (siehe calculate_delaunay_edges_nested)
+        self.delaunay_edges = {}
 
 
     ## Filtert die Strecken der eingefügten Streckentypen in Visum.
     #  @return Keine Rückgabe. Die Visuminstanz wird verändert.
     def filter_links_vfs(self):
+        if self.visum is None:
+            logging.warning("Streckenfilter: es ist keine Visuminstanz verknüpft")
+            return
+
         filter = self.visum.Filters.LinkFilter()
         filter.Init()
         filter.AddCondition("OP_NONE", False, "TypeNo", "ContainedIn", ",".join(str(x) for x in self.dict_export_linktypes.values()))
@@ -849,6 +3100,10 @@ $VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT
     ## Filtert die Bezirke, für die das gegebene Attribut größer 0 ist.
     #  @return Keine Rückgabe. Die Visuminstanz wird verändert.
     def filter_zones_source_targets(self, filterFromZones: bool = True):
+        if self.visum is None:
+            logging.warning("Bezirksfilter: es ist keine Visuminstanz verknüpft")
+            return
+
         filter = self.visum.Filters.ZoneFilter()
         filter.Init()
         if filterFromZones:
@@ -864,8 +3119,40 @@ $VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT
     #  @return Keine Rückgabe. Die Visuminstanz wird verändert.
     def delete_added_links(self):
         # Achtung: Löscht Streckentypen NICHT
+        if self.visum is None:
+            logging.warning("Strecken löschen: es ist keine Visuminstanz verknüpft")
+            return
+
         self.filter_links_vfs()
         self.visum.Net.Links.RemoveAll(OnlyActive=True)
         self.visum.Filters.LinkFilter().Init()
 
+        # keine exportierten Strecken mehr vorhanden
+        self.exported_links = self.exported_links.iloc[:0]
+
+
+
+
+# ====== Parallele Berechnung (Prozesspool) =====
+
+## LuftlinienCalculator des Prozesses (siehe _init_worker)
+_worker_calculator = None
+
+
+## Initialisiert einen Prozess des Prozesspools: erstellt einen LuftlinienCalculator ohne Visum aus den übergebenen
+# Bezirksattributen. Der Calculator bleibt für alle Aufgaben des Prozesses erhalten, damit auch die räumlichen Indizes
+# der Versorgungszentren wiederverwendet werden.
+# @param zones: DataFrame mit den Bezirksattributen (inkl. IsActive)
+# @param params: Parameter des Konstruktors
+def _init_worker(zones, params):
+    global _worker_calculator
+
+    _worker_calculator = LuftlinienCalculator(zones, use_filter=True, **params)
+
 
+## Berechnet eine VFS im Prozess des Prozesspools.
+# @param vfs: die Verbindungsfunktionsstufe
+# @return: Adjazenzmatrix (obere Dreiecksmatrix, CSR) der VFS
+def _calculate_vfs_worker(vfs):
+    _worker_calculator.calculate_vfs(vfs)
+    return _worker_calculator.matrizen_VFS[vfs]